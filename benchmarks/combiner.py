@@ -0,0 +1,65 @@
+"""Benchmark the map output a combiner keeps out of the shuffle.
+
+Partition and sort the word count map output of tests/testdata/input_large,
+read from an in-memory stream, as a Worker map task does, then combine
+each partition with tests/testdata/exec/wc_sum.sh, as with
+mapreduce-submit --combiner.  Report the records and bytes a reducer
+would fetch with and without the combiner, and the seconds combining
+took.
+
+$ python benchmarks/combiner.py --partitions 8
+"""
+import io
+import os
+import time
+import tempfile
+from pathlib import Path
+import click
+from mapreduce.worker.mapoutput import SortBuffer, read_blocks
+from mapreduce.worker.partition import partition_md5
+from mapreduce.worker.runner import TaskRunner
+from mapreduce.worker.__main__ import combine_commands, count_lines
+from mapoutput import map_output
+
+COMBINER = Path(__file__).parent.parent/"tests/testdata/exec/wc_sum.sh"
+
+
+def measure(data, partitions):
+    """Return the records and bytes of sorted partitions before and after.
+
+    Also return the seconds combining took.
+    """
+    with tempfile.TemporaryDirectory() as tmpdir:
+        paths = [os.path.join(tmpdir, f"part{index:05d}")
+                 for index in range(partitions)]
+        writer = SortBuffer(paths, partition_md5, 64 << 20)
+        for lines in read_blocks(io.BytesIO(data)):
+            writer.write_lines(lines)
+        writer.finish()
+        before = (writer.records, sum(map(os.path.getsize, paths)))
+        start = time.perf_counter()
+        with TaskRunner(1) as runner:
+            runner.run_processes(combine_commands(COMBINER, paths))
+        seconds = time.perf_counter() - start
+        combined = [f"{path}.combined" for path in paths]
+        after = (sum(map(count_lines, combined)),
+                 sum(map(os.path.getsize, combined)))
+        return before, after, seconds
+
+
+@click.command()
+@click.option("--partitions", default=8, help="Partitions, i.e. reducers")
+def main(partitions):
+    """Print the shuffled records and bytes with and without a combiner."""
+    data, _ = map_output()
+    before, after, seconds = measure(data, partitions)
+    print(f"{partitions} partitions, combined in {seconds:.2f} s")
+    print(f"{'map output':<16} {'records':>10} {'bytes':>12}")
+    print(f"{'uncombined':<16} {before[0]:>10,} {before[1]:>12,}")
+    print(f"{'combined':<16} {after[0]:>10,} {after[1]:>12,}")
+    print(f"{'reduction':<16} {before[0] / after[0]:>9.1f}x "
+          f"{before[1] / after[1]:>11.1f}x")
+
+
+if __name__ == "__main__":
+    main()
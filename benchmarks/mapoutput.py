@@ -0,0 +1,92 @@
+"""Benchmark the Worker's map output path in records per second.
+
+Partition the word count map output of tests/testdata/input_large, read
+from an in-memory stream, into partition files, as the Worker did with
+text lines and one write per line, and as it does with blocks of bytes.
+
+$ python benchmarks/mapoutput.py --partitions 8
+"""
+import io
+import time
+import hashlib
+import tempfile
+from contextlib import ExitStack
+from functools import lru_cache
+from pathlib import Path
+import click
+from mapreduce.worker.mapoutput import PartitionWriter, read_blocks
+from mapreduce.worker.partition import partition_md5
+
+INPUT_DIR = Path(__file__).parent.parent/"tests/testdata/input_large"
+
+
+def map_output():
+    """Return the word count map output of the large input and its lines."""
+    records = [
+        word + b"\t1\n"
+        for path in sorted(INPUT_DIR.iterdir())
+        for word in path.read_bytes().split()
+    ]
+    return b"".join(records), len(records)
+
+
+@lru_cache(maxsize=1024)
+def hash_key(key):
+    """Cache and return the hash of the key, as the Worker used to."""
+    return int(hashlib.md5(key.encode("utf-8")).hexdigest(), base=16)
+
+
+def partition_text(data, files):
+    """Partition like the Worker before blocks, one text line at a time."""
+    for line in io.TextIOWrapper(io.BytesIO(data), encoding="utf-8"):
+        files[hash_key(line.partition("\t")[0]) % len(files)].write(line)
+
+
+def partition_blocks(data, files):
+    """Partition like the Worker does, a block of bytes at a time."""
+    writer = PartitionWriter(files, partition_md5)
+    for lines in read_blocks(io.BytesIO(data)):
+        writer.write_lines(lines)
+    writer.flush()
+
+
+def records_per_second(function, data, records, partitions, mode):
+    """Return the records partitioned per second into new files."""
+    with tempfile.TemporaryDirectory() as tmpdir, ExitStack() as stack:
+        files = [
+            stack.enter_context(open(
+                f"{tmpdir}/part{index:05d}", mode,
+                **({} if "b" in mode else {"encoding": "utf-8"}),
+            ))
+            for index in range(partitions)
+        ]
+        start = time.perf_counter()
+        function(data, files)
+        for outfile in files:
+            outfile.flush()
+        return records / (time.perf_counter() - start)
+
+
+@click.command()
+@click.option("--partitions", default=8, help="Partitions, i.e. reducers")
+@click.option("--repeat", default=3, help="Runs to take the best of")
+def main(partitions, repeat):
+    """Print the records per second of the text and block paths."""
+    data, records = map_output()
+    print(f"{records} records, {len(data)} bytes")
+    print(f"{'partitions':<11} {'text lines/s':>14} {'blocks/s':>14} "
+          f"{'speedup':>8}")
+    for count in sorted({1, partitions}):
+        rates = []
+        for function, mode in ((partition_text, "w"),
+                               (partition_blocks, "wb")):
+            rates.append(max(
+                records_per_second(function, data, records, count, mode)
+                for _ in range(repeat)
+            ))
+        print(f"{count:<11} {rates[0]:>14,.0f} {rates[1]:>14,.0f} "
+              f"{rates[1] / rates[0]:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Benchmark sorting map output with sort processes or a sort buffer.
+
+Partition the word count map output of tests/testdata/input_large, read
+from an in-memory stream, and sort every partition: by writing it out
+and running the sort command on it, one partition at a time or as many
+at once as the Worker does by default, and in a sort buffer of a few
+budgets, as with mapreduce-worker --sort-buffer.  Report the seconds
+taken and the bytes written, and for the sort command the seconds spent
+sorting alone.  Linux only, as bytes written come from /proc.
+
+$ python benchmarks/mapsort.py --partitions 64
+"""
+import io
+import os
+import time
+import tempfile
+from contextlib import ExitStack
+import click
+from mapreduce.worker.mapoutput import PartitionWriter, SortBuffer, \
+    read_blocks
+from mapreduce.worker.partition import partition_md5
+from mapreduce.worker.runner import TaskRunner
+from mapreduce.worker.__main__ import sort_command, sort_processes
+from mapoutput import map_output
+
+
+def bytes_written():
+    """Return the bytes this process and its reaped children wrote."""
+    with open("/proc/self/io", encoding="utf-8") as infile:
+        for line in infile:
+            if line.startswith("wchar"):
+                return int(line.split()[1])
+    return 0
+
+
+def sort_commands(limit):
+    """Return a function sorting partitions with limit sort processes.
+
+    The function returns the seconds spent sorting.
+    """
+    def sort(data, paths):
+        with ExitStack() as stack:
+            writer = PartitionWriter(
+                [stack.enter_context(open(path, "wb")) for path in paths],
+                partition_md5,
+            )
+            for lines in read_blocks(io.BytesIO(data)):
+                writer.write_lines(lines)
+            writer.finish()
+        start = time.perf_counter()
+        with TaskRunner(1) as runner:
+            runner.run_processes([sort_command(path) for path in paths],
+                                 limit)
+        return time.perf_counter() - start
+    return sort
+
+
+def sort_buffer(budget):
+    """Return a function sorting partitions in a sort buffer."""
+    def sort(data, paths):
+        writer = SortBuffer(paths, partition_md5, budget)
+        for lines in read_blocks(io.BytesIO(data)):
+            writer.write_lines(lines)
+        writer.finish()
+        return None
+    return sort
+
+
+def measure(function, data, partitions):
+    """Return the seconds, sort seconds and bytes written sorting data."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        paths = [os.path.join(tmpdir, f"part{index:05d}")
+                 for index in range(partitions)]
+        written = bytes_written()
+        start = time.perf_counter()
+        sorting = function(data, paths)
+        return time.perf_counter() - start, sorting, bytes_written() - written
+
+
+@click.command()
+@click.option("--partitions", default=8, help="Partitions, i.e. reducers")
+@click.option("--repeat", default=3, help="Runs to take the best of")
+@click.option("--processes", default=None, type=int,
+              help="Sort processes at once, default as many as the Worker "
+              "runs on this machine")
+def main(partitions, repeat, processes):
+    """Print the time and bytes written by each way of sorting."""
+    data, records = map_output()
+    if processes is None:
+        processes = sort_processes({"memory": None, "slots": 1})
+    print(f"{records} records, {len(data)} bytes, {partitions} partitions")
+    print(f"{'sort':<24} {'seconds':>8} {'sorting':>8} {'MB written':>11}")
+    for label, function in (
+        ("sort command, 1 at once", sort_commands(1)),
+        (f"sort command, {processes} at once", sort_commands(processes)),
+        ("sort buffer 64 MB", sort_buffer(64 << 20)),
+        ("sort buffer 8 MB", sort_buffer(8 << 20)),
+        ("sort buffer 1 MB", sort_buffer(1 << 20)),
+    ):
+        results = [measure(function, data, partitions)
+                   for _ in range(repeat)]
+        seconds, sorting, written = min(results,
+                                        key=lambda result: result[0])
+        sorting = "" if sorting is None else f"{sorting:.2f}"
+        print(f"{label:<24} {seconds:>8.2f} {sorting:>8} "
+              f"{written / 1e6:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
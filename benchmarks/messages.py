@@ -0,0 +1,111 @@
+"""Benchmark Manager-Worker messages per second.
+
+Compare the one-shot protocol, where every JSON message opens a TCP
+connection of its own, with persistent channels in the JSON and binary
+encodings, for a finished message and a reduce task.
+
+$ python benchmarks/messages.py --count 5000 --paths 100
+"""
+import json
+import time
+import socket
+import threading
+import click
+from mapreduce.utils import listen_message, accept_message, Channel
+from mapreduce.utils import encode, decode
+
+
+def sample_messages(paths):
+    """Return a finished message and a reduce task with paths inputs."""
+    return {
+        "finished": {
+            "message_type": "finished",
+            "task_id": 3,
+            "worker_host": "localhost",
+            "worker_port": 6001,
+            "job_id": 0,
+            "stage": "mapping",
+        },
+        "reduce task": {
+            "message_type": "new_reduce_task",
+            "task_id": 0,
+            "executable": "tests/testdata/exec/wc_reduce.sh",
+            "input_paths": [
+                f"/tmp/mapreduce-shared-job00000-k2l9q0x1/"
+                f"maptask{task_id:05d}-part00000"
+                for task_id in range(paths)
+            ],
+            "output_directory": "output",
+        },
+    }
+
+
+def receive(server, count, mode):
+    """Receive count messages on a listening socket."""
+    if mode == "one-shot":
+        for _ in range(count):
+            clientsocket, _ = server.accept()
+            json.loads(listen_message(clientsocket))
+        return
+    clientsocket, _ = server.accept()
+    _, channel = accept_message(clientsocket)
+    received = 0
+    while received < count:
+        if channel.receive() is not None:
+            received += 1
+    channel.close()
+
+
+def send_rate(message, count, mode):
+    """Return messages per second sent and received over loopback TCP."""
+    with socket.create_server(("localhost", 0)) as server:
+        port = server.getsockname()[1]
+        receiver = threading.Thread(target=receive,
+                                    args=(server, count, mode))
+        receiver.start()
+        start = time.perf_counter()
+        if mode == "one-shot":
+            for _ in range(count):
+                with socket.create_connection(("localhost", port)) as sock:
+                    sock.sendall(json.dumps(message).encode("utf-8"))
+        else:
+            channel = Channel.connect("localhost", port)
+            channel.encoding = mode
+            for _ in range(count):
+                channel.send(message)
+        receiver.join()
+        elapsed = time.perf_counter() - start
+        if mode != "one-shot":
+            channel.close()
+    return count / elapsed
+
+
+def codec_rate(message, count, encoding):
+    """Return messages per second encoded and decoded, without sockets."""
+    start = time.perf_counter()
+    for _ in range(count):
+        decode(encode(message, encoding))
+    return count / (time.perf_counter() - start)
+
+
+@click.command()
+@click.option("--count", default=5000, help="Messages per measurement")
+@click.option("--paths", default=100, help="Input paths of the reduce task")
+def main(count, paths):
+    """Print messages per second for each protocol and encoding."""
+    print(f"{'message':<12} {'bytes json/binary':>18} {'protocol':<16} "
+          f"{'msgs/s':>10}")
+    for name, message in sample_messages(paths).items():
+        sizes = f"{len(encode(message))}/{len(encode(message, 'binary'))}"
+        for label, rate in (
+            ("one-shot json", send_rate(message, count, "one-shot")),
+            ("channel json", send_rate(message, count, "json")),
+            ("channel binary", send_rate(message, count, "binary")),
+            ("codec json", codec_rate(message, count, "json")),
+            ("codec binary", codec_rate(message, count, "binary")),
+        ):
+            print(f"{name:<12} {sizes:>18} {label:<16} {rate:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
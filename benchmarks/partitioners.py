@@ -0,0 +1,77 @@
+"""Benchmark map output partitioners in lines per second.
+
+Partition the word count map output of tests/testdata/input_large with
+each partitioner, in batches of a block's lines, and the same number of
+integer keys, the modulo partitioner's case.  The per-line MD5 the
+Worker used before partitioners, with a cache keyed on the Worker as
+well as the key, is the baseline.
+
+$ python benchmarks/partitioners.py --partitions 8
+"""
+import time
+import hashlib
+from functools import lru_cache
+from pathlib import Path
+import click
+from mapreduce.worker.partition import PARTITIONERS, md5_hash, numpy
+
+INPUT_DIR = Path(__file__).parent.parent/"tests/testdata/input_large"
+
+# About the lines in one block of word count map output
+BATCH = 4096
+
+
+def word_keys():
+    """Return the keys of the word count map output of the large input."""
+    return [
+        word
+        for path in sorted(INPUT_DIR.iterdir())
+        for line in path.read_bytes().splitlines()
+        for word in line.split()
+    ]
+
+
+@lru_cache(maxsize=1024)
+def hash_key(key):
+    """Cache and return the hash of the key, as the Worker used to."""
+    return int(hashlib.md5(key).hexdigest(), base=16)
+
+
+def per_line_md5(keys, num_partitions):
+    """Partition like the Worker before partitioners, one key at a time."""
+    return [hash_key(key) % num_partitions for key in keys]
+
+
+def lines_per_second(partitioner, keys, num_partitions):
+    """Return the keys partitioned per second, in batches of a block."""
+    start = time.perf_counter()
+    for index in range(0, len(keys), BATCH):
+        partitioner(keys[index:index + BATCH], num_partitions)
+    return len(keys) / (time.perf_counter() - start)
+
+
+@click.command()
+@click.option("--partitions", default=8, help="Partitions, i.e. reducers")
+@click.option("--repeat", default=3, help="Runs to take the best of")
+def main(partitions, repeat):
+    """Print the lines per second of every partitioner."""
+    words = word_keys()
+    integers = [b"%d" % (index * 7919) for index in range(len(words))]
+    print(f"{len(words)} lines, {partitions} partitions, "
+          f"NumPy {'present' if numpy is not None else 'absent'}")
+    print(f"{'partitioner':<14} {'word keys/s':>14} {'integer keys/s':>15}")
+    for name, partitioner in (("md5 per line", per_line_md5),
+                              *PARTITIONERS.items()):
+        rates = []
+        for keys in (words, integers):
+            hash_key.cache_clear()
+            md5_hash.cache_clear()
+            rates.append(max(
+                lines_per_second(partitioner, keys, partitions)
+                for _ in range(repeat)
+            ))
+        print(f"{name:<14} {rates[0]:>14,.0f} {rates[1]:>15,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""Benchmark Manager registrations, heartbeats and idle wake-ups.
+
+Start a Manager with threads and then one with --asyncio, and measure
+for each:
+
+- context switches per second while idle, i.e. timer wake-ups,
+- registrations per second, from fake Workers that count their acks,
+  and Manager CPU microseconds per registration,
+- Manager CPU microseconds per heartbeat.
+
+Where loopback connections are slow to set up, registrations per
+second measure the network more than the Manager, and the CPU cost per
+registration is the better measure of how many one core can take.
+
+Linux only, as the Manager's CPU time and context switches come from
+/proc.
+
+$ python benchmarks/registrations.py --registrations 2000
+"""
+import os
+import json
+import time
+import glob
+import shutil
+import socket
+import selectors
+import threading
+import subprocess
+import concurrent.futures
+import click
+
+
+def process_usage(pid):
+    """Return the CPU seconds and context switches of a process so far."""
+    with open(f"/proc/{pid}/stat", encoding="utf-8") as infile:
+        fields = infile.read().rsplit(")", 1)[1].split()
+    cpu = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    switches = 0
+    for path in glob.glob(f"/proc/{pid}/task/*/status"):
+        with open(path, encoding="utf-8") as infile:
+            for line in infile:
+                if "ctxt_switches" in line:
+                    switches += int(line.split()[1])
+    return cpu, switches
+
+
+def free_port():
+    """Return a port free for TCP and UDP on localhost."""
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+class FakeWorkers:
+    """Listening sockets that count the register_ack messages they get."""
+
+    def __init__(self, count):
+        """Open count listening sockets."""
+        self.selector = selectors.DefaultSelector()
+        # Each Worker has an address of its own, so the Manager's many
+        # short connections don't run out of loopback port pairs
+        self.addresses = []
+        for index in range(count):
+            server = socket.create_server((f"127.0.1.{index + 1}", 0),
+                                          backlog=128)
+            server.setblocking(False)
+            self.selector.register(server, selectors.EVENT_READ)
+            self.addresses.append(server.getsockname())
+        self.acks = 0
+        self.running = True
+        self.thread = threading.Thread(target=self.serve)
+        self.thread.start()
+
+    def serve(self):
+        """Accept and read messages until closed."""
+        while self.running:
+            for key, _ in self.selector.select(0.1):
+                clientsocket, _ = key.fileobj.accept()
+                with clientsocket:
+                    clientsocket.setblocking(True)
+                    chunks = []
+                    while data := clientsocket.recv(4096):
+                        chunks.append(data)
+                if json.loads(b"".join(chunks))["message_type"] == \
+                        "register_ack":
+                    self.acks += 1
+
+    def close(self):
+        """Stop serving and close the sockets."""
+        self.running = False
+        self.thread.join()
+        for key in list(self.selector.get_map().values()):
+            key.fileobj.close()
+        self.selector.close()
+
+
+def send(port, message, source="127.0.0.1"):
+    """Send a one-shot message to the Manager."""
+    with socket.create_connection(("localhost", port),
+                                  source_address=(source, 0)) as sock:
+        sock.sendall(json.dumps(message).encode("utf-8"))
+
+
+def measure(options, registrations, heartbeats, idle, senders):
+    """Return the measurements of a Manager started with options."""
+    port = free_port()
+    process = subprocess.Popen([
+        shutil.which("mapreduce-manager"), "--port", str(port),
+        "--loglevel", "warning", *options,
+    ])
+    workers = FakeWorkers(100)
+    try:
+        time.sleep(1)
+        results = {}
+
+        _, switches = process_usage(process.pid)
+        time.sleep(idle)
+        results["idle switches/s"] = \
+            (process_usage(process.pid)[1] - switches) / idle
+
+        # Workers register concurrently, as they do at cluster start
+        cpu, _ = process_usage(process.pid)
+        start = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(senders) as pool:
+            for index in range(registrations):
+                host, worker_port = \
+                    workers.addresses[index % len(workers.addresses)]
+                pool.submit(send, port, {
+                    "message_type": "register",
+                    "worker_host": host,
+                    "worker_port": worker_port,
+                }, host)
+        while workers.acks < registrations:
+            time.sleep(0.001)
+        results["registrations/s"] = \
+            registrations / (time.perf_counter() - start)
+        results["CPU us/registration"] = \
+            (process_usage(process.pid)[0] - cpu) / registrations * 1e6
+
+        cpu, _ = process_usage(process.pid)
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            for index in range(heartbeats):
+                host, worker_port = \
+                    workers.addresses[index % len(workers.addresses)]
+                sock.sendto(json.dumps({
+                    "message_type": "heartbeat",
+                    "worker_host": host,
+                    "worker_port": worker_port,
+                }).encode("utf-8"), ("localhost", port))
+                if index % 100 == 99:
+                    # Stay within the Manager's receive buffer
+                    time.sleep(0.005)
+        time.sleep(0.5)
+        results["CPU us/heartbeat"] = \
+            (process_usage(process.pid)[0] - cpu) / heartbeats * 1e6
+
+        send(port, {"message_type": "shutdown"})
+        process.wait(timeout=10)
+    finally:
+        workers.close()
+        process.kill()
+    return results
+
+
+@click.command()
+@click.option("--registrations", default=2000, help="Registrations to send")
+@click.option("--heartbeats", default=20000, help="Heartbeats to send")
+@click.option("--idle", default=2.0, help="Seconds to measure idle for")
+@click.option("--senders", default=16, help="Concurrent registering clients")
+def main(registrations, heartbeats, idle, senders):
+    """Print the measurements of a threaded and an asyncio Manager."""
+    print(f"{'manager':<10} {'idle switches/s':>16} {'registrations/s':>16} "
+          f"{'CPU us/registration':>20} {'CPU us/heartbeat':>17}")
+    for label, options in (("threads", ()), ("asyncio", ("--asyncio",))):
+        results = measure(options, registrations, heartbeats, idle, senders)
+        print(f"{label:<10} {results['idle switches/s']:>16.0f} "
+              f"{results['registrations/s']:>16.0f} "
+              f"{results['CPU us/registration']:>20.0f} "
+              f"{results['CPU us/heartbeat']:>17.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,61 +5,103 @@ import logging
 import json
 import time
 import socket
+import asyncio
 import threading
-import queue
-import shutil
-import copy
+import collections
 import click
-from mapreduce.utils import listen_message
+from mapreduce.utils import listen_message, accept_message
+from mapreduce.manager.job import JOB_DEFAULTS, Job
+from mapreduce.manager.detector import FailureDetector
+from mapreduce.manager.joblog import JobLog
+from mapreduce.manager.cache import MapCache
+from mapreduce.manager.stream import start_stream
+from mapreduce.manager.asyncserver import AsyncServer
+from mapreduce.manager.scheduler import SCHEDULERS, queue_shares
 
 
 # Configure logging
 LOGGER = logging.getLogger(__name__)
 
+# Attempts a task gets before the Manager gives up on it
+TASK_ATTEMPTS = 4
+
 
 class Manager:
     """Represent a MapReduce framework Manager node."""
 
-    def __init__(self, host, port):
+    def __init__(self, host, port, options=None):
         """Construct a Manager instance and start listening for messages."""
         # self.host = host
         # self.port = port
         self.signals = {"shutdown": False}
+        self.options = {
+            "max_jobs": 1,
+            "scheduler": "fifo",
+            "preempt": False,
+            "weights": {},
+            "heartbeat_timeout": 10,
+            "phi_threshold": 0,
+            "state_dir": None,
+            "cache_dir": None,
+            "cache_size": 1024,
+            "persistent": False,
+            "encoding": "binary",
+            "asyncio": False,
+            **(options or {}),
+        }
         self.workers = {}
-        self.job_queue = queue.Queue()
-        # self.job_count = 0
-        # self.finished_job_tasks = 0
-        self.job_info = {"job_count": 0, "finished_job_tasks": 0}
-        self.current_task = None
-        self.copy_task = None
-        self.havejob = False
-        thread_tcp_server = threading.Thread(target=self.manager_tcp_server,
-                                             args=(host, port))
-        thread_tcp_server.name = "manager_tcp_server"
-        thread_udp_server = threading.Thread(target=self.manager_udp_server,
-                                             args=(host, port))
-        thread_udp_server.name = "manager_udp_server"
-        thread_fault_tolerance = threading.Thread(
-            target=self.fault_tolerance_thread
-        )
-        thread_tcp_server.start()
-        thread_udp_server.start()
-        thread_fault_tolerance.start()
-        # formatter = logging.Formatter(
-        #     f"Manager:{port}:%(threadName)s [%(levelname)s] %(message)s"
-        # )
-        while not self.signals["shutdown"]:
-            if self.havejob is True:
-                self.run_job()
-                print("inside while", self.signals["shutdown"])
-                self.havejob = not self.job_queue.empty()
-                self.job_info["finished_job_tasks"] = 0
-            time.sleep(0.1)
-
-        print("run_job is done")
-        thread_tcp_server.join()
-        thread_udp_server.join()
-        thread_fault_tolerance.join()
+        # Queued job specs, running Job objects by job id, the job log,
+        # the map output cache and the threads of streams and channels
+        self.jobs = {
+            "count": 0,
+            "queue": collections.deque(),
+            "running": {},
+            "log": JobLog(self.options["state_dir"]),
+            "cache": None if self.options["cache_dir"] is None else
+            MapCache(self.options["cache_dir"],
+                     self.options["cache_size"] << 20),
+            "threads": [],
+            # Cancel messages for the losing attempts of finished tasks
+            "cancels": [],
+            # Record and byte counts of combined map output, by job id
+            "combined": collections.defaultdict(collections.Counter),
+        }
+        # Workers waiting for a task, once per free slot of a live Worker,
+        # so its length counts the free slots
+        self.ready = collections.deque()
+        self.detector = FailureDetector(self.options["heartbeat_timeout"],
+                                        self.options["phi_threshold"])
+        self.recover_jobs()
+        # Every scheduling event (job submitted, worker registered, task
+        # finished, worker died, shutdown) notifies this condition.
+        self.event = threading.Condition()
+        if self.options["asyncio"]:
+            asyncio.run(AsyncServer(self).serve(host, port))
+        else:
+            thread_tcp_server = threading.Thread(
+                target=self.manager_tcp_server, args=(host, port)
+            )
+            thread_tcp_server.name = "manager_tcp_server"
+            thread_udp_server = threading.Thread(
+                target=self.manager_udp_server, args=(host, port)
+            )
+            thread_udp_server.name = "manager_udp_server"
+            thread_fault_tolerance = threading.Thread(
+                target=self.fault_tolerance_thread
+            )
+            thread_tcp_server.start()
+            thread_udp_server.start()
+            thread_fault_tolerance.start()
+            # formatter = logging.Formatter(
+            #     f"Manager:{port}:%(threadName)s [%(levelname)s] %(message)s"
+            # )
+            self.dispatch_loop()
+
+            thread_tcp_server.join()
+            thread_udp_server.join()
+            thread_fault_tolerance.join()
+        for thread in self.jobs["threads"]:
+            thread.join()
         LOGGER.info(
             "Starting manager host=%s port=%s pwd=%s",
             host, port, os.getcwd(),
@@ -85,8 +127,18 @@ class Manager:
 
                 clientsocket.settimeout(0.1)
 
+                if self.options["persistent"]:
+                    message_str, channel = accept_message(clientsocket)
+                else:
+                    message_str, channel = listen_message(clientsocket), None
+                if channel is not None:
+                    self.jobs["threads"].append(channel.start(
+                        self.handle_message, self.signals
+                    ))
+                    continue
+
                 try:
-                    message_dict = json.loads(listen_message(clientsocket))
+                    message_dict = json.loads(message_str)
                 except json.JSONDecodeError:
                     LOGGER.warning(
                         "Invalid JSON message received and ignored."
@@ -97,7 +149,17 @@ class Manager:
 
                 if message_dict["message_type"] == "shutdown":
                     for worker_id, worker in self.workers.items():
-                        if worker["status"] != "dead":
+                        if worker["status"] != "dead" and \
+                                worker.get("channel") is not None:
+                            worker["status"] = "dead"
+                            try:
+                                worker["channel"].send(
+                                    {"message_type": "shutdown"}
+                                )
+                            except OSError:
+                                LOGGER.info("Channel to %s is closed",
+                                            worker_id)
+                        elif worker["status"] != "dead":
                             worker_host, worker_port = worker_id
                             worker["status"] = "dead"
                             try:
@@ -114,97 +176,114 @@ class Manager:
                             except ConnectionRefusedError:
                                 worker["status"] = "dead"
                                 LOGGER.info("ConnectionRefusedError")
-                    self.signals["shutdown"] = True
-                    print(self.signals["shutdown"])
+                    with self.event:
+                        self.signals["shutdown"] = True
+                        self.event.notify_all()
                     LOGGER.info("Manager shut down!")
                     break
-                if message_dict["message_type"] == "register":
-                    self.handle_register(message_dict)
-                    # check the dead worker alive now
-                    # worker_id = (
-                    #     message_dict["worker_host"],
-                    #     message_dict["worker_port"]
-                    # )
-                    # worker_host, worker_port = worker_id
-                    # try:
-                    #     with socket.socket(
-                    #         socket.AF_INET, socket.SOCK_STREAM
-                    #     ) as sock2:
-                    #         # connect to the server
-                    #         sock2.connect((worker_host, worker_port))
-                    #         ack_message = json.dumps(
-                    #             {"message_type": "register_ack"}
-                    #         )
-                    #         sock2.sendall(ack_message.encode('utf-8'))
-                    #         LOGGER.info(
-                    #             "Sent registration"
-                    #             " acknowledgment to worker %s.",
-                    #             worker_id
-                    #         )
-                    # except ConnectionRefusedError:
-                    #     self.con_err_refuse(worker_id)
-                    #     LOGGER.info("ConnectionRefusedError")
-
-                    # if worker_id in self.workers:
-                    #     if self.workers[worker_id]["status"] == "dead":
-                    #         self.workers[worker_id]["status"] = "ready"
-                    #         self.workers[worker_id]["current_stage"] = None
-                    #         LOGGER.info(
-                    #             "Recognized Dead worker%s is now alive",
-                    #             worker_id
-                    #         )
-                    #     elif self.workers[worker_id]["status"] == "busy":
-                    #         # reassign task
-                    #         task_id = (
-                    #             self.workers[worker_id]["current_task_id"]
-                    #         )
-                    #         # split into two cases
-                    #         self.append_failed_task(worker_id, task_id)
-                    #         self.workers[worker_id]["status"] = "ready"
-                    #         self.workers[worker_id]["current_stage"] = None
-                    #         LOGGER.info(
-                    #             "Unrecognized Dead worker%s is now alive",
-                    #             worker_id
-                    #         )
-                    # else:
-                    #     LOGGER.info("create a new worker object here!!!")
-                    #     self.workers[worker_id] = {
-                    #         "status": "ready",  # ready, busy, dead
-                    #         "current_task_id": None,
-                    #         "current_stage": None,
-                    #         "last_ping": time.time()
-                    #     }
-
-                    #     LOGGER.info("New worker registered: %s", worker_id)
-
-                elif message_dict["message_type"] == "new_manager_job":
-                    job = {
-                            "job_id": self.job_info['job_count'],
-                            "input_directory": message_dict["input_directory"],
-                            "output_directory":
-                            message_dict["output_directory"],
-                            "mapper_executable":
-                            message_dict["mapper_executable"],
-                            "reducer_executable":
-                            message_dict["reducer_executable"],
-                            "num_mappers": message_dict["num_mappers"],
-                            "num_reducers": message_dict["num_reducers"]
-                            }
-                    self.job_info['job_count'] += 1
-                    self.job_queue.put(job)
-                    LOGGER.info("Added Job with Job id: %s", job['job_id'])
-                    self.havejob = True
-                elif message_dict["message_type"] == "finished":
-                    worker_id = (
-                        message_dict["worker_host"],
-                        message_dict["worker_port"]
+                self.handle_message(message_dict)
+
+    def handle_message(self, message_dict, channel=None):
+        """Handle a message from a client, or from a Worker's channel."""
+        if message_dict["message_type"] == "register":
+            self.handle_register(message_dict, channel)
+        elif message_dict["message_type"] == "new_manager_job":
+            self.handle_new_job(message_dict)
+        elif message_dict["message_type"] == "new_streaming_job":
+            self.jobs["threads"].append(start_stream(
+                message_dict, self.handle_new_job, self.signals
+            ))
+        elif message_dict["message_type"] in ("finished", "failed"):
+            self.handle_finished(message_dict)
+
+    def handle_new_job(self, message_dict):
+        """Queue a new job and wake the dispatcher."""
+        with self.event:
+            job = {
+                    "job_id": self.jobs['count'],
+                    "input_directory": message_dict["input_directory"],
+                    "output_directory":
+                    message_dict["output_directory"],
+                    "mapper_executable":
+                    message_dict["mapper_executable"],
+                    "reducer_executable":
+                    message_dict["reducer_executable"],
+                    "num_mappers": message_dict["num_mappers"],
+                    "num_reducers": message_dict["num_reducers"],
+                    **{key: message_dict.get(key, default)
+                       for key, default in JOB_DEFAULTS.items()},
+                    }
+            self.jobs['count'] += 1
+            self.jobs['log'].append("submit", job_id=job['job_id'], spec=job)
+            self.jobs['queue'].append(job)
+            LOGGER.info("Added Job with Job id: %s", job['job_id'])
+            if job["incremental"] and self.jobs["cache"] is None:
+                LOGGER.warning("Job %s runs in full, incremental jobs need "
+                               "a Manager with --cache-dir", job['job_id'])
+            self.event.notify_all()
+
+    def handle_finished(self, message_dict):
+        """Free the Worker and wake the dispatcher.
+
+        A failed task runs again, unless it failed TASK_ATTEMPTS times.
+        Its job then fails, and the job's other tasks are cancelled.
+        """
+        worker_id = (
+            message_dict["worker_host"],
+            message_dict["worker_port"]
+        )
+        with self.event:
+            worker = self.workers.get(worker_id)
+            # Ignore duplicate and late messages: only a task the Worker
+            # is currently running can finish.
+            key = None if worker is None else \
+                find_task(worker, message_dict)
+            if key is None:
+                LOGGER.info("Ignored stale finished message %s", message_dict)
+                return
+            attempt = worker["tasks"].pop(key)
+            # The task's stage may be gone, e.g. a pre-merge that lost the
+            # race against the end of the Map Stage.
+            job = task_job(self.jobs["running"], key)
+            if message_dict["message_type"] == "failed":
+                if job is not None and not retry_task(job, key, attempt):
+                    job.cleanup()
+                    end_job(self.jobs, job, "failed")
+                    self.jobs["cancels"].extend(
+                        drop_job_tasks(self.workers, job.job_id, self.ready)
                     )
-                    self.job_info["finished_job_tasks"] += 1
-                    self.workers[worker_id]['status'] = "ready"
-                    # "task_id": int,
-
-    def handle_register(self, message_dict):
-        """Handle Register Message."""
+            elif job is not None and \
+                    job.finish(key[1], key[2], attempt) and \
+                    key[1] != "merging":
+                self.jobs["log"].append("finish", job_id=key[0],
+                                        stage=key[1], task_id=key[2])
+                if "combined" in message_dict:
+                    self.jobs["combined"][key[0]].update(
+                        message_dict["combined"]
+                    )
+                if job.spec["speculation"]:
+                    self.jobs["cancels"].extend(
+                        drop_attempts(self.workers, key, self.ready)
+                    )
+            worker["status"] = "ready"
+            self.ready.append(worker_id)
+            self.event.notify_all()
+
+    def set_ready(self, worker_id):
+        """Mark an idle Worker ready and queue each of its slots."""
+        worker = self.workers[worker_id]
+        worker["status"] = "ready"
+        worker["tasks"] = {}
+        drop_slots(self.ready, worker_id)
+        self.ready.extend([worker_id] * worker["slots"])
+        self.detector.watch(worker_id)
+
+    def handle_register(self, message_dict, channel=None):
+        """Handle Register Message.
+
+        A Worker registering over a channel gets its acknowledgment and
+        tasks on that channel instead of new connections.
+        """
         # check the dead worker alive now
         worker_id = (
                         message_dict["worker_host"],
@@ -212,55 +291,91 @@ class Manager:
                     )
         worker_host, worker_port = worker_id
         try:
-            with socket.socket(
-                socket.AF_INET, socket.SOCK_STREAM
-            ) as sock2:
-                # connect to the server
-                sock2.connect((worker_host, worker_port))
-                ack_message = json.dumps(
-                    {"message_type": "register_ack"}
-                )
-                sock2.sendall(ack_message.encode('utf-8'))
-                LOGGER.info(
-                    "Sent registration"
-                    " acknowledgment to worker %s.",
-                    worker_id
-                )
-        except ConnectionRefusedError:
-            self.con_err_refuse(worker_id)
+            if channel is not None:
+                # Agree on binary messages if both ends want them
+                encoding = "binary" if self.options["encoding"] == \
+                    message_dict.get("encoding") == "binary" else "json"
+                channel.send({"message_type": "register_ack",
+                              "encoding": encoding})
+                channel.encoding = encoding
+            else:
+                with socket.socket(
+                    socket.AF_INET, socket.SOCK_STREAM
+                ) as sock2:
+                    # connect to the server
+                    sock2.connect((worker_host, worker_port))
+                    ack_message = json.dumps(
+                        {"message_type": "register_ack"}
+                    )
+                    sock2.sendall(ack_message.encode('utf-8'))
+            LOGGER.info(
+                "Sent registration"
+                " acknowledgment to worker %s.",
+                worker_id
+            )
+        except OSError:
+            with self.event:
+                if worker_id in self.workers:
+                    self.con_err_refuse(worker_id)
             LOGGER.info("ConnectionRefusedError")
+            return
+
+        with self.event:
+            self.register_worker(worker_id, message_dict)
+            self.workers[worker_id]["channel"] = channel
+            self.event.notify_all()
 
+    def register_worker(self, worker_id, message_dict):
+        """Mark a registering Worker ready, reassigning any lost task."""
         if worker_id in self.workers:
-            if self.workers[worker_id]["status"] == "dead":
-                self.workers[worker_id]["status"] = "ready"
-                self.workers[worker_id]["current_stage"] = None
+            worker = self.workers[worker_id]
+            if worker["status"] == "dead":
                 LOGGER.info(
                     "Recognized Dead worker%s is now alive",
                     worker_id
                 )
-            elif self.workers[worker_id]["status"] == "busy":
-                # reassign task
-                task_id = (
-                    self.workers[worker_id]["current_task_id"]
-                )
-                # split into two cases
-                self.append_failed_task(worker_id, task_id)
-                self.workers[worker_id]["status"] = "ready"
-                self.workers[worker_id]["current_stage"] = None
+            elif worker["tasks"]:
+                # A restarted Worker lost whatever it was running
+                self.append_failed_tasks(worker_id)
                 LOGGER.info(
                     "Unrecognized Dead worker%s is now alive",
                     worker_id
                 )
         else:
-            LOGGER.info("create a new worker object here!!!")
+            LOGGER.info("New worker registered: %s", worker_id)
             self.workers[worker_id] = {
                 "status": "ready",  # ready, busy, dead
-                "current_task_id": None,
-                "current_stage": None,
-                "last_ping": time.time()
+                # Running tasks, (job id, stage, task id) -> attempt
+                "tasks": {},
             }
-
-            LOGGER.info("New worker registered: %s", worker_id)
+        self.detector.heartbeat(worker_id, time.time())
+        # Slots and memory may change when a Worker restarts
+        self.workers[worker_id]["slots"] = message_dict.get("slots", 1)
+        self.workers[worker_id]["memory"] = message_dict.get("memory")
+        self.jobs["log"].append("register", worker_id=list(worker_id),
+                                slots=self.workers[worker_id]["slots"],
+                                memory=self.workers[worker_id]["memory"])
+        self.set_ready(worker_id)
+
+    def recover_jobs(self):
+        """Restore Workers and jobs from the job log of a previous run.
+
+        Workers come back dead until their next heartbeat.  Running jobs
+        resume from the tasks they finished.
+        """
+        recovered = self.jobs["log"].recover()
+        for worker_id, worker in recovered["workers"].items():
+            self.workers[worker_id] = {"status": "dead", "tasks": {},
+                                       **worker}
+        self.jobs["count"] = recovered["count"]
+        self.jobs["queue"].extend(recovered["queued"])
+        for spec, tmpdir, finished in recovered["running"]:
+            if not os.path.isdir(tmpdir):
+                self.jobs["queue"].append(spec)
+                continue
+            job = Job(spec, durable=True, cache=self.jobs["cache"])
+            job.resume(tmpdir, finished)
+            self.jobs["running"][job.job_id] = job
 
     def manager_udp_server(self, host, port):
         """Construct a Manager instance and start listening for messages."""
@@ -277,209 +392,351 @@ class Manager:
                 except socket.timeout:
                     continue
                 message_str = message_bytes.decode("utf-8")
-                message_dict = json.loads(message_str)
-                if message_dict["message_type"] == "heartbeat":
-                    worker_host = message_dict["worker_host"]
-                    worker_port = message_dict["worker_port"]
-                    worker_id = (worker_host, worker_port)
-                    if worker_id not in self.workers:
-                        continue
-                    self.workers[worker_id]["last_ping"] = time.time()
-                    # it looks like we don't have the worker yet. WHY?
-                    # update the worker status if it was dead
-                    if self.workers[worker_id]["status"] == "dead":
-                        self.workers[worker_id]["status"] = "ready"
-                        LOGGER.info("Worker %s is alive again!", worker_id)
+                self.handle_heartbeat(json.loads(message_str))
+
+    def handle_heartbeat(self, message_dict):
+        """Note a Worker's heartbeat, reviving the Worker if it was dead."""
+        if message_dict["message_type"] != "heartbeat":
+            return
+        worker_id = (message_dict["worker_host"], message_dict["worker_port"])
+        with self.event:
+            if worker_id not in self.workers:
+                return
+            if self.detector.heartbeat(worker_id, time.time()):
+                # The fault tolerance thread must wake sooner
+                self.event.notify_all()
+            # update the worker status if it was dead
+            if self.workers[worker_id]["status"] == "dead":
+                self.set_ready(worker_id)
+                LOGGER.info("Worker %s is alive again!", worker_id)
+                self.event.notify_all()
 
     def fault_tolerance_thread(self):
-        """Construct a Manager instance and start listening for messages."""
-        while not self.signals["shutdown"]:
-            for worker_id, worker in self.workers.items():
-                if worker["last_ping"] is None:
-                    continue
-                if time.time() - worker["last_ping"] > 10 or \
-                        worker["status"] == "dead":
-                    # the worker is dead
-                    if worker["status"] == "busy":
-                        task_id = worker["current_task_id"]
-                        self.append_failed_task(worker_id, task_id)
-                        worker["status"] = "dead"
-                        LOGGER.info("worker is dead")
-
-                    worker["current_task_id"] = None
-                    worker["current_stage"] = None
-            time.sleep(0.1)
-
-    def run_job(self):
-        """Construct a Manager instance and start listening for messages."""
-        # while not self.signals["shutdown"]:
-        print("Signal in runjob top:", self.signals["shutdown"])
-        if self.job_queue:
-            # Wait for a job to be available in the queue or check periodically
-            job = self.job_queue.get()  # Adjust timeout as necessary
-            files = []
-            for filename in os.listdir(job['input_directory']):
-                file_path = os.path.join(job['input_directory'], filename)
-                if os.path.isfile(file_path):
-                    # Add the file to the list only if it is a regular file
-                    files.append(filename)
-            # Sort the list of files by name
-            sorted_files = sorted(files)
-
-            # a list of tuples [[0,[]], [1,[]], ...]
-            self.current_task = [[j, []] for j in range(job['num_mappers'])]
-
-            for i, file_name in enumerate(sorted_files):
-                mapper_index = i % job['num_mappers']
-                self.current_task[mapper_index][1].append(file_name)
-
-            # self.current_task = [[] for _ in range(job['num_mappers'])]
-            # for i, file_name in enumerate(sorted_files):
-            #     mapper_index = i % job['num_mappers']
-            #     self.current_task[mapper_index].append(file_name)
-
-            self.copy_task = copy.deepcopy(self.current_task)
-
-            LOGGER.info("Starting job %s", job['job_id'])
-            # delete output directory
-            output_directory = job["output_directory"]
-            if os.path.exists(output_directory):
-                shutil.rmtree(output_directory)
-                LOGGER.info(
-                    "Deleted existing output directory: %s",
-                    output_directory
-                )
+        """Mark Workers dead once their heartbeats stop.
 
-            # Create the output directory
-            os.makedirs(output_directory)
-            LOGGER.info("Created output directory: %s", output_directory)
-
-            # Create a shared directory for temporary intermediate files
-            prefix = f"mapreduce-shared-job{job['job_id']:05d}-"
-            with tempfile.TemporaryDirectory(prefix=prefix) as tmpdir:
-                LOGGER.info("Created tmpdir %s", tmpdir)
-
-                # run mapping job
-                while (not self.signals["shutdown"]) \
-                        and (self.job_info["finished_job_tasks"]
-                             != job['num_mappers']):
-                    if self.current_task:
-                        self.send_mapping_tasks(job, tmpdir)
-                    print("Stuck here 1")
-                    time.sleep(0.1)
-
-                self.copy_task.clear()
-                self.current_task.clear()
-                # create reduce tasks, this is overwritten by a new empty list
-                self.current_task = [[] for _ in range(job['num_reducers'])]
-                sorted_dir = sorted(os.listdir(tmpdir))
-                for partition_file in sorted_dir:
-                    # partition file is "123.txt"
-                    task_reduce_id = int(partition_file[-5:])
-                    file_path = os.path.join(tmpdir, partition_file)
-                    self.current_task[task_reduce_id].append(file_path)
-
-                self.copy_task = copy.deepcopy(self.current_task)
-
-                # run reducing job
-                while (not self.signals["shutdown"]) \
-                        and (self.job_info["finished_job_tasks"] !=
-                             job['num_mappers'] + job['num_reducers']):
-                    if self.current_task:
-                        self.send_reducing_tasks(job)
-                    print("Stuck here 2")
-                    time.sleep(0.1)
-
-                self.copy_task.clear()
-                self.current_task.clear()
-        time.sleep(0.1)
-
-    def send_mapping_tasks(self, job, tmpdir):
-        """Construct a Manager instance and start listening for messages."""
-        try:  # a list of tuples [[0,[]], [1,[]], ...]
-            for worker_id, worker in self.workers.items():
-                if worker['status'] == "ready":
-                    task_map_id = self.current_task[0][0]
-                    worker['current_task_id'] = task_map_id
-                    worker['current_stage'] = "mapping"
-                    worker['status'] = "busy"
-                    with socket.socket(
-                        socket.AF_INET, socket.SOCK_STREAM
-                    ) as sock4:
-                        worker_host, worker_port = worker_id
-                        sock4.connect((worker_host, worker_port))
-                        input_paths = []
-                        for file in self.current_task[0][1]:
-                            # the list of files for the first task
-                            input_paths.append(
-                                str(job['input_directory']) + '/' + str(file)
-                            )
-                        context = {
-                                    "message_type": "new_map_task",
-                                    "task_id": task_map_id,
-                                    "input_paths": input_paths,
-                                    "executable": job['mapper_executable'],
-                                    "output_directory": tmpdir,
-                                    "num_partitions": job['num_reducers']
-                                }
-                        message = json.dumps(context)
-                        sock4.sendall(message.encode('utf-8'))
-                    self.current_task.pop(0)
+        Rather than polling, sleep until the detector's next possible
+        expiry or until an event adds a Worker to watch.
+        """
+        with self.event:
+            while not self.signals["shutdown"]:
+                for worker_id in self.detector.expired(time.time()):
+                    if self.workers[worker_id]["status"] != "dead":
+                        LOGGER.info("Worker %s is dead", worker_id)
+                        self.con_err_refuse(worker_id)
+                self.event.wait(self.detector.wait_time(time.time()))
+
+    def dispatch_loop(self):
+        """Start jobs and dispatch tasks as events arrive, until shutdown."""
+        while True:
+            with self.event:
+                # Stragglers show up with time rather than with events
+                speculating = any(job.spec["speculation"]
+                                  for job in self.jobs["running"].values())
+                self.event.wait_for(self.has_work,
+                                    timeout=1 if speculating else None)
+                if self.signals["shutdown"]:
                     break
+            # Send outside the lock so a slow Worker never stalls the
+            # TCP and UDP threads.
+            for worker_id, message in self.dispatch():
+                self.send_task(worker_id, message)
+
+        # Durable jobs resume when the Manager starts again
+        for job in self.jobs["running"].values():
+            if not job.durable:
+                job.cleanup()
+
+    def dispatch(self):
+        """Start admitted jobs, advance running ones and assign tasks.
+
+        Return the (worker id, message) pairs to send.
+        """
+        with self.event:
+            specs = []
+            spec = self.next_job()
+            while spec is not None:
+                self.jobs["queue"].remove(spec)
+                specs.append(spec)
+                if len(self.jobs["running"]) + len(specs) > \
+                        self.options["max_jobs"]:
+                    LOGGER.info("Job %s preempts queued tasks",
+                                spec["job_id"])
+                spec = self.next_job(specs)
+        # Planning and directory setup may touch many files, so do it
+        # outside the lock.
+        started = []
+        for spec in specs:
+            job = Job(spec, durable=self.jobs["log"].path is not None,
+                      cache=self.jobs["cache"])
+            job.start()
+            started.append(job)
+        with self.event:
+            for job in started:
+                self.jobs["log"].append("start", job_id=job.job_id,
+                                        tmpdir=job.tmpdir)
+                self.jobs["running"][job.job_id] = job
+            self.advance_jobs()
+            cancels = self.jobs["cancels"]
+            self.jobs["cancels"] = []
+            return cancels + self.assign_tasks()
+
+    def has_work(self):
+        """Return True if the dispatcher has something to do."""
+        running = self.jobs["running"].values()
+        return (
+            self.signals["shutdown"]
+            or self.jobs["cancels"]
+            or self.next_job() is not None
+            or any(job.needs_update() for job in running)
+            or can_start(self.workers, self.ready, running)
+        )
 
-        except ConnectionRefusedError:
-            worker["status"] = "dead"
-            LOGGER.info("ConnectionRefusedError")
-
-    def send_reducing_tasks(self, job):
-        """Construct a Manager instance and start listening for messages."""
+    def next_job(self, admitted=()):
+        """Return the queued job spec to start next, or None.
+
+        A job starts while fewer than max_jobs run.  With preemption, a
+        strict priority job also starts ahead of time when it outranks
+        a running one, whose queued tasks then wait behind it.  Each
+        outranked job makes room for one job past max_jobs.
+        """
+        preempt = self.options["preempt"] and \
+            self.options["scheduler"] == "priority"
+        running = [job.spec for job in self.jobs["running"].values()]
+        running.extend(admitted)
+        if not self.jobs["queue"] or (
+                len(running) >= self.options["max_jobs"] and not preempt):
+            return None
+        # Only the fair scheduler reads the shares, which take a walk
+        # over every running task
+        shares = {} if self.options["scheduler"] != "fair" else \
+            queue_shares(queue_usage(self.workers, self.jobs["running"]),
+                         self.options["weights"])
+        spec = min(self.jobs["queue"],
+                   key=lambda spec: SCHEDULERS[self.options["scheduler"]](
+                       spec, shares))
+        if len(running) < self.options["max_jobs"]:
+            return spec
+        outranked = sum(spec["priority"] > other["priority"]
+                        for other in running)
+        if outranked > len(running) - self.options["max_jobs"]:
+            return spec
+        return None
+
+    def advance_jobs(self):
+        """Start merges and next stages of jobs whose tasks completed."""
+        for job in list(self.jobs["running"].values()):
+            job.update()
+            if job.stage == "done":
+                end_job(self.jobs, job, "done")
+                if job.spec["deadline"] and \
+                        time.time() > job.spec["deadline"]:
+                    LOGGER.warning("Job %s missed its deadline", job.job_id)
+
+    def assign_tasks(self):
+        """Pair pending tasks of the running jobs with free Worker slots."""
+        assignments = []
+        skipped = []
+        usage = queue_usage(self.workers, self.jobs["running"])
+        while self.ready:
+            worker_id = self.ready.popleft()
+            worker = self.workers[worker_id]
+            # Skip Workers that died or filled up since being queued
+            if worker['status'] != "ready":
+                continue
+            # Never put a backup next to the attempt it backs up
+            shares = queue_shares(usage, self.options["weights"])
+            job = next((job for job in sorted(
+                self.jobs["running"].values(),
+                key=lambda job: SCHEDULERS[self.options["scheduler"]](
+                    job.spec, shares),
+            ) if job.has_pending(running_ids(worker, job.job_id))), None)
+            if job is None:
+                skipped.append(worker_id)
+                continue
+            stage, task_id, attempt = job.start_task(
+                running_ids(worker, job.job_id)
+            )
+            message = job.message(stage, task_id, attempt)
+            worker['tasks'][(job.job_id, stage, task_id)] = attempt
+            usage[job.spec["queue"]] += 1
+            if len(worker['tasks']) >= worker['slots']:
+                worker['status'] = "busy"
+            if worker['slots'] > 1:
+                message.update(job_id=job.job_id, stage=stage)
+            assignments.append((worker_id, message))
+        self.ready.extend(skipped)
+        return assignments
+
+    def send_task(self, worker_id, message):
+        """Send a task message, reassigning the task if the Worker is gone."""
+        channel = self.workers[worker_id].get("channel")
         try:
-            for worker_id, worker in self.workers.items():
-                if worker['status'] == "ready":
-                    extract_id = self.current_task[0][0]
-                    task_reduce_id = int(extract_id[-5:])
-                    worker['current_task_id'] = task_reduce_id
-                    worker['current_stage'] = "reducing"
-                    worker['status'] = "busy"
-                    LOGGER.info("HEY there")
-                    LOGGER.info(self.current_task[0])
-                    with socket.socket(
-                        socket.AF_INET, socket.SOCK_STREAM
-                    ) as sock5:
-                        worker_host, worker_port = worker_id
-                        sock5.connect((worker_host, worker_port))
-                        context = {
-                                    "message_type": "new_reduce_task",
-                                    "task_id": task_reduce_id,
-                                    "executable": job['reducer_executable'],
-                                    "input_paths": self.current_task[0],
-                                    "output_directory":
-                                    job['output_directory'],
-                                }
-                        message = json.dumps(context)
-                        sock5.sendall(message.encode('utf-8'))
-                    self.current_task.pop(0)
-                    break
-        except ConnectionRefusedError:
-            worker["status"] = "dead"
-            LOGGER.info("ConnectionRefusedError")
+            if channel is not None:
+                channel.send(message)
+            else:
+                with socket.socket(socket.AF_INET,
+                                   socket.SOCK_STREAM) as sock:
+                    worker_host, worker_port = worker_id
+                    sock.connect((worker_host, worker_port))
+                    sock.sendall(json.dumps(message).encode('utf-8'))
+        except OSError as error:
+            # Any connection failure means the Worker is gone, don't wait
+            # for its heartbeats to stop.
+            with self.event:
+                self.con_err_refuse(worker_id)
+                self.event.notify_all()
+            LOGGER.info("Worker %s is dead: %s", worker_id, error)
 
     def con_err_refuse(self, worker_id):
-        """Construct a Manager instance and start listening for messages."""
-        if self.workers[worker_id]["status"] == "busy":
-            task_id = self.workers[worker_id]["current_task_id"]
-            self.append_failed_task(worker_id, task_id)
+        """Mark a Worker dead and reassign the tasks it was running."""
+        if self.workers[worker_id]["tasks"]:
+            self.append_failed_tasks(worker_id)
+            self.event.notify_all()
         self.workers[worker_id]["status"] = "dead"
+        drop_slots(self.ready, worker_id)
+
+    def append_failed_tasks(self, worker_id):
+        """Put a failed Worker's tasks back in their pending queues."""
+        worker = self.workers[worker_id]
+        for key, attempt in worker["tasks"].items():
+            job = task_job(self.jobs["running"], key)
+            if job is not None:
+                job.tables[key[1]].requeue(key[2], attempt)
+        worker["tasks"] = {}
+
+
+def task_job(running, key):
+    """Return the running job of a task if its stage is still active."""
+    job_id, stage, _ = key
+    job = running.get(job_id)
+    if job is None or stage not in job.tables:
+        return None
+    return job
+
+
+def drop_attempts(workers, key, ready):
+    """Free the slots of the other attempts of a finished task.
+
+    Return the (worker id, message) pairs cancelling them, so a losing
+    backup stops at once instead of running to the end.
+    """
+    cancels = []
+    for worker_id, worker in workers.items():
+        if key not in worker["tasks"] or worker["status"] == "dead":
+            continue
+        del worker["tasks"][key]
+        worker["status"] = "ready"
+        ready.append(worker_id)
+        message = {"message_type": "cancel_task", "task_id": key[2]}
+        if worker["slots"] > 1:
+            message.update(job_id=key[0], stage=key[1])
+        cancels.append((worker_id, message))
+    return cancels
+
+
+def retry_task(job, key, attempt):
+    """Run the task of a failed attempt again, unless it failed too often.
+
+    Return False if the job fails with the task.  A pre-merge that
+    failed too often is dropped instead, as its reducer merges anyway.
+    """
+    if job.tables[key[1]].fail(key[2], attempt, TASK_ATTEMPTS):
+        LOGGER.warning("Task %s attempt %s failed", key, attempt)
+        return True
+    if key[1] == "merging":
+        LOGGER.warning("Task %s failed %s times, dropping it", key,
+                       TASK_ATTEMPTS)
+        return True
+    LOGGER.error("Task %s failed %s times, job %s failed", key,
+                 TASK_ATTEMPTS, job.job_id)
+    return False
+
+
+def drop_job_tasks(workers, job_id, ready):
+    """Free the slots of a job's running tasks.
+
+    Return the (worker id, message) pairs cancelling them.
+    """
+    keys = {key for worker in workers.values() for key in worker["tasks"]
+            if key[0] == job_id}
+    return [cancel for key in sorted(keys)
+            for cancel in drop_attempts(workers, key, ready)]
+
+
+def end_job(jobs, job, event):
+    """Stop running a job that is "done" or "failed", logging the event."""
+    jobs["log"].append(event, job_id=job.job_id)
+    del jobs["running"][job.job_id]
+    log_combined(job.job_id, jobs["combined"].pop(job.job_id, None))
+
+
+def running_ids(worker, job_id):
+    """Return the ids of a job's tasks running on a Worker."""
+    return {key[2] for key in worker["tasks"] if key[0] == job_id}
+
+
+def can_start(workers, ready, running):
+    """Return True if a free slot has a task of a running job to start.
+
+    A Worker whose only candidates are backups of its own attempts has
+    nothing to start, so it must not keep the dispatcher busy.  The
+    Workers with free slots are only looked at for such backups.
+    """
+    if not ready:
+        return False
+    for job in running:
+        if any(table.has_pending() for table in job.tables.values()):
+            return True
+        if job.straggler() is not None and any(
+            job.straggler(running_ids(workers[worker_id], job.job_id))
+            is not None for worker_id in set(ready)
+        ):
+            return True
+    return False
+
+
+def drop_slots(ready, worker_id):
+    """Remove the free slots of a Worker from the ready queue."""
+    for _ in range(ready.count(worker_id)):
+        ready.remove(worker_id)
+
+
+def log_combined(job_id, combined):
+    """Log how much a job's combiner shrank its map output, if it ran."""
+    if not combined:
+        return
+    LOGGER.info(
+        "Job %s combined map output from %d records, %d bytes to %d "
+        "records, %d bytes (%.1fx fewer bytes)", job_id,
+        combined["records_in"], combined["bytes_in"],
+        combined["records_out"], combined["bytes_out"],
+        combined["bytes_in"] / max(combined["bytes_out"], 1),
+    )
 
-    def append_failed_task(self, worker_id, task_id):
-        """Construct a Manager instance and start listening for messages."""
-        if self.workers[worker_id]["current_stage"] == "mapping":
-            for task in self.copy_task:
-                if task[0] == task_id:
-                    self.current_task.append(task)
-                    break
-        elif self.workers[worker_id]["current_stage"] == "reducing":
-            self.current_task.append(self.copy_task[task_id])
+
+def queue_usage(workers, running):
+    """Return the number of running tasks of each queue."""
+    usage = collections.Counter()
+    for worker in workers.values():
+        for job_id, _, _ in worker["tasks"]:
+            if job_id in running:
+                usage[running[job_id].spec["queue"]] += 1
+    return usage
+
+
+def find_task(worker, message_dict):
+    """Return the (job id, stage, task id) a finished message is for.
+
+    Multi-slot Workers echo the job id and stage of a task, so tasks with
+    the same id from different jobs or stages are told apart.
+    """
+    for key in worker["tasks"]:
+        job_id, stage, task_id = key
+        if task_id == message_dict["task_id"] and \
+                message_dict.get("job_id", job_id) == job_id and \
+                message_dict.get("stage", stage) == stage:
+            return key
+    return None
 
 
 @click.command()
@@ -488,7 +745,40 @@ class Manager:
 @click.option("--logfile", "logfile", default=None)
 @click.option("--loglevel", "loglevel", default="info")
 @click.option("--shared_dir", "shared_dir", default=None)
-def main(host, port, logfile, loglevel, shared_dir):
+@click.option("--max-jobs", "max_jobs", default=1,
+              help="Number of jobs to run at once")
+@click.option("--scheduler", "scheduler", default="fifo",
+              type=click.Choice(sorted(SCHEDULERS)),
+              help="Order in which jobs start and get free Worker slots")
+@click.option("--preempt", "preempt", is_flag=True,
+              help="With --scheduler priority, start a job that outranks "
+              "a running one even when --max-jobs are running")
+@click.option("--queue-weight", "weights", multiple=True,
+              help="Fair share weight of a queue as NAME=WEIGHT")
+@click.option("--heartbeat-timeout", "heartbeat_timeout", default=10.0,
+              help="Seconds without a heartbeat before a Worker is dead")
+@click.option("--state-dir", "state_dir", default=None,
+              help="Directory for the job log, so a restarted Manager "
+              "resumes queued and running jobs")
+@click.option("--cache-dir", "cache_dir", default=None,
+              help="Directory for cached map outputs of jobs that ask "
+              "for caching")
+@click.option("--cache-size", "cache_size", default=1024,
+              help="Disk budget of the map output cache in MB")
+@click.option("--persistent", "persistent", is_flag=True,
+              help="Accept persistent channels from Workers started with "
+              "--persistent, next to one-shot connections")
+@click.option("--encoding", "encoding", default="binary",
+              type=click.Choice(["binary", "json"]),
+              help="Encoding of channel messages, json for debugging")
+@click.option("--asyncio", "asyncio", is_flag=True,
+              help="Serve TCP and UDP, dispatch tasks and detect failures "
+              "on one asyncio event loop instead of threads")
+@click.option("--phi-threshold", "phi_threshold", default=0.0,
+              type=click.FloatRange(0, 15),
+              help="Declare a Worker dead once its phi-accrual suspicion "
+              "passes this level, e.g. 8, default=0 (timeout only)")
+def main(host, port, logfile, loglevel, shared_dir, **options):
     """Run Manager."""
     tempfile.tempdir = shared_dir
     if logfile:
@@ -502,7 +792,11 @@ def main(host, port, logfile, loglevel, shared_dir):
     root_logger = logging.getLogger()
     root_logger.addHandler(handler)
     root_logger.setLevel(loglevel.upper())
-    Manager(host, port)
+    options["weights"] = {
+        name: float(weight)
+        for name, weight in (item.split("=", 1) for item in options["weights"])
+    }
+    Manager(host, port, options)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,394 @@
+"""MapReduce framework Manager event loop."""
+import json
+import time
+import socket
+import asyncio
+import logging
+import threading
+from mapreduce.utils import encode, decode
+from mapreduce.utils.network import CHANNEL_MAGIC, FRAME_HEADER
+
+
+# Configure logging
+LOGGER = logging.getLogger(__name__)
+
+# Seconds to wait at shutdown for messages still on their way to Workers
+SHUTDOWN_TIMEOUT = 5
+
+# Seconds to wait for a Worker to accept a one-shot connection
+CONNECT_TIMEOUT = 5
+
+
+async def wait_event(event, timeout):
+    """Wait until an event is set or timeout seconds pass, None for ever.
+
+    A timeout sets the event itself, which is cheaper than wait_for's
+    extra task on every wait.
+    """
+    if timeout is None:
+        await event.wait()
+        return
+    timer = asyncio.get_running_loop().call_later(timeout, event.set)
+    try:
+        await event.wait()
+    finally:
+        timer.cancel()
+
+
+class LoopCondition(threading.Condition):
+    """A condition that also sets asyncio events when notified.
+
+    The Manager notifies its condition on every scheduling event, from
+    the event loop or from stream and job start threads.  The loop's
+    tasks wait on the events instead, so they sleep until there is
+    something to do.
+    """
+
+    def __init__(self, loop, events):
+        """Construct a condition waking events of a running loop."""
+        super().__init__()
+        self.loop = loop
+        self.events = events
+        self.thread = threading.get_ident()
+
+    def notify_all(self):
+        """Wake threads waiting on the condition and set the events."""
+        super().notify_all()
+        if threading.get_ident() == self.thread:
+            self.wake()
+        elif not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.wake)
+
+    def wake(self):
+        """Set the events, on the loop's thread."""
+        for event in self.events:
+            event.set()
+
+
+class Connection:
+    """Send messages to a Worker over one-shot connections, in order.
+
+    Each message opens a connection of its own, as Manager.send_task
+    does, but from a task of the event loop, so an unreachable Worker
+    never holds up accept.  Each message waits for the one before it,
+    so a Worker gets its acknowledgment before its first task.
+    """
+
+    def __init__(self, worker_id, failed, addresses=None):
+        """Construct a sender calling failed(worker_id, self, error).
+
+        Worker addresses are looked up once and kept in addresses, which
+        the senders to all Workers may share.
+        """
+        self.worker_id = worker_id
+        self.failed = failed
+        self.addresses = {} if addresses is None else addresses
+        # One-shot messages are always JSON
+        self.encoding = "json"
+        # Task delivering the last message sent
+        self.last = None
+
+    def send(self, message_dict):
+        """Queue a message to deliver on a new connection."""
+        self.last = asyncio.create_task(self.deliver(
+            json.dumps(message_dict).encode("utf-8"), self.last
+        ))
+
+    async def deliver(self, message_bytes, previous):
+        """Deliver a message once the previous one was delivered."""
+        if previous is not None:
+            await previous
+        loop = asyncio.get_running_loop()
+        try:
+            if self.worker_id not in self.addresses:
+                self.addresses[self.worker_id] = (await loop.getaddrinfo(
+                    *self.worker_id, family=socket.AF_INET,
+                    type=socket.SOCK_STREAM
+                ))[0][4]
+            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+                sock.setblocking(False)
+                await asyncio.wait_for(
+                    loop.sock_connect(sock, self.addresses[self.worker_id]),
+                    CONNECT_TIMEOUT,
+                )
+                await loop.sock_sendall(sock, message_bytes)
+        except (OSError, asyncio.TimeoutError) as error:
+            self.failed(self.worker_id, self, error)
+
+    async def finish(self):
+        """Wait until every message sent is delivered."""
+        if self.last is not None:
+            await self.last
+
+
+class ManagerProtocol(asyncio.Protocol):
+    """Read a one-shot message, or serve a channel, on a connection.
+
+    A one-shot message is handled once the peer closes its end.  A
+    connection starting with the channel magic is a persistent channel
+    carrying the frames of mapreduce.utils.Channel, and the protocol is
+    the channel the Manager answers on.  Sending only queues a frame in
+    the transport, so it never blocks the loop.
+    """
+
+    def __init__(self, server):
+        """Construct a protocol passing messages to an AsyncServer."""
+        super().__init__()
+        self.server = server
+        self.transport = None
+        self.buffer = bytearray()
+        # None until the first bytes tell a channel from a message
+        self.persistent = None
+        self.encoding = "json"
+        # Set once the connection is closed
+        self.closed = asyncio.get_running_loop().create_future()
+
+    def connection_made(self, transport):
+        """Keep the transport of a new connection."""
+        self.transport = transport
+
+    def data_received(self, data):
+        """Buffer a message, or handle the complete frames of a channel."""
+        self.buffer.extend(data)
+        if self.persistent is None and len(self.buffer) >= len(CHANNEL_MAGIC):
+            self.persistent = \
+                self.server.manager.options["persistent"] and \
+                self.buffer.startswith(CHANNEL_MAGIC)
+            if self.persistent:
+                del self.buffer[:len(CHANNEL_MAGIC)]
+                self.server.channels.add(self)
+        while self.persistent and len(self.buffer) >= FRAME_HEADER.size:
+            (size,) = FRAME_HEADER.unpack_from(self.buffer)
+            end = FRAME_HEADER.size + size
+            if len(self.buffer) < end:
+                return
+            payload = bytes(self.buffer[FRAME_HEADER.size:end])
+            del self.buffer[:end]
+            try:
+                message_dict = decode(payload)
+            except ValueError:
+                # A corrupt frame
+                self.close()
+                return
+            self.server.manager.handle_message(message_dict, self)
+
+    def eof_received(self):
+        """Handle a one-shot message and close the connection."""
+        if not self.persistent:
+            self.server.handle_message(bytes(self.buffer))
+        return False
+
+    def connection_lost(self, exc):
+        """Forget a closed channel."""
+        self.server.channels.discard(self)
+        if not self.closed.done():
+            self.closed.set_result(None)
+
+    def send(self, message_dict):
+        """Send a message, raising OSError if the connection is gone."""
+        if self.transport.is_closing():
+            raise ConnectionResetError("Channel is closed")
+        payload = encode(message_dict, self.encoding)
+        self.transport.write(FRAME_HEADER.pack(len(payload)) + payload)
+
+    def close(self):
+        """Close the connection once the frames sent are written."""
+        self.transport.close()
+
+    async def finish(self):
+        """Close the connection and wait until the frames sent are written."""
+        self.close()
+        await self.closed
+
+
+class AsyncServer:
+    """Run a Manager's networking on one asyncio event loop.
+
+    TCP and UDP are served concurrently, and the dispatcher and failure
+    detector run as tasks of the same loop.  Nothing sleeps on a timer
+    while idle: the dispatcher waits for a scheduling event and the
+    detector for the next possible expiry.  Messages to Workers are
+    written by tasks too, so accept never waits on an outbound connect.
+    The Manager's own handlers update its state, under its condition,
+    as the threaded Manager does.
+    """
+
+    def __init__(self, manager):
+        """Construct a server for a Manager."""
+        self.manager = manager
+        # Events the Manager's condition sets, one per waiting task
+        self.events = {}
+        # Open persistent channels
+        self.channels = set()
+        # Task shutting down the Workers
+        self.stopping = None
+        # Addresses of Workers by id
+        self.addresses = {}
+
+    async def serve(self, host, port):
+        """Serve until shutdown, then clean up jobs that cannot resume."""
+        manager = self.manager
+        loop = asyncio.get_running_loop()
+        self.events = {"dispatch": asyncio.Event(), "detect": asyncio.Event()}
+        manager.event = LoopCondition(loop, self.events.values())
+        server = await loop.create_server(lambda: ManagerProtocol(self),
+                                          host, port, reuse_address=True)
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind((host, port))
+            sock.setblocking(False)
+            loop.add_reader(sock, self.receive_heartbeats, sock)
+            LOGGER.info("Event loop listening on %s:%s", host, port)
+            async with server:
+                detector = asyncio.create_task(self.detect())
+                await self.dispatch()
+                await detector
+                await self.stopping
+            loop.remove_reader(sock)
+
+        # Durable jobs resume when the Manager starts again
+        for job in manager.jobs["running"].values():
+            if not job.durable:
+                job.cleanup()
+
+    def handle_message(self, message_bytes):
+        """Handle a one-shot message."""
+        try:
+            message_dict = json.loads(message_bytes)
+        except ValueError:
+            LOGGER.warning("Invalid JSON message received and ignored.")
+            return
+        LOGGER.info("Received message: %s", message_dict)
+
+        if message_dict["message_type"] == "shutdown":
+            self.stopping = asyncio.create_task(self.shutdown())
+        elif message_dict["message_type"] == "register":
+            worker_id = (message_dict["worker_host"],
+                         message_dict["worker_port"])
+            self.manager.handle_register(
+                message_dict,
+                Connection(worker_id, self.failed, self.addresses),
+            )
+        else:
+            self.manager.handle_message(message_dict)
+
+    def receive_heartbeats(self, sock):
+        """Handle every heartbeat datagram waiting on a socket.
+
+        Draining the socket on each wake-up, rather than taking one
+        datagram per turn of the loop, keeps bursts of heartbeats cheap.
+        """
+        while True:
+            try:
+                message_bytes = sock.recv(4096)
+            except BlockingIOError:
+                return
+            try:
+                message_dict = json.loads(message_bytes)
+            except ValueError:
+                LOGGER.warning("Invalid heartbeat ignored.")
+                continue
+            self.manager.handle_heartbeat(message_dict)
+
+    def send(self, worker_id, message_dict):
+        """Send a message to a Worker and return the channel it went on."""
+        worker = self.manager.workers[worker_id]
+        if worker.get("channel") is None:
+            # A Worker recovered from the job log never registered
+            worker["channel"] = Connection(worker_id, self.failed,
+                                           self.addresses)
+        channel = worker["channel"]
+        try:
+            channel.send(message_dict)
+        except OSError as error:
+            self.failed(worker_id, channel, error)
+        return channel
+
+    def failed(self, worker_id, channel, error):
+        """Mark a Worker dead unless it registered again since."""
+        manager = self.manager
+        with manager.event:
+            worker = manager.workers.get(worker_id)
+            if worker is None or worker.get("channel") is not channel:
+                return
+            manager.con_err_refuse(worker_id)
+            manager.event.notify_all()
+        LOGGER.info("Worker %s is dead: %s", worker_id, error)
+
+    async def dispatch(self):
+        """Start jobs and dispatch tasks as events arrive, until shutdown.
+
+        Starting jobs and finishing stages touch many files, so those
+        rounds run on a thread.  Plain task assignments run on the loop,
+        which gets a turn after each round.
+        """
+        manager = self.manager
+        loop = asyncio.get_running_loop()
+        wakeup = self.events["dispatch"]
+        while not manager.signals["shutdown"]:
+            wakeup.clear()
+            with manager.event:
+                running = manager.jobs["running"].values()
+                # Stragglers show up with time rather than with events
+                speculating = any(job.spec["speculation"] for job in running)
+                idle = not manager.has_work()
+                blocking = manager.next_job() is not None or \
+                    any(job.needs_update() for job in running)
+            if manager.signals["shutdown"]:
+                break
+            if idle:
+                await wait_event(wakeup, 1 if speculating else None)
+                continue
+            if blocking:
+                assignments = await loop.run_in_executor(None,
+                                                         manager.dispatch)
+            else:
+                assignments = manager.dispatch()
+                if not assignments:
+                    # Nothing to start after all, wait for an event
+                    # rather than starve the loop
+                    await wait_event(wakeup, 1 if speculating else None)
+                    continue
+            for worker_id, message in assignments:
+                self.send(worker_id, message)
+            # Let messages and heartbeats in between rounds
+            await asyncio.sleep(0)
+
+    async def detect(self):
+        """Mark Workers dead once their heartbeats stop, until shutdown."""
+        manager = self.manager
+        wakeup = self.events["detect"]
+        while not manager.signals["shutdown"]:
+            wakeup.clear()
+            with manager.event:
+                for worker_id in manager.detector.expired(time.time()):
+                    if manager.workers[worker_id]["status"] != "dead":
+                        LOGGER.info("Worker %s is dead", worker_id)
+                        manager.con_err_refuse(worker_id)
+                timeout = manager.detector.wait_time(time.time())
+            await wait_event(wakeup, timeout)
+
+    async def shutdown(self):
+        """Shut down the Workers, then the Manager."""
+        manager = self.manager
+        channels = []
+        with manager.event:
+            for worker_id, worker in manager.workers.items():
+                if worker["status"] != "dead":
+                    worker["status"] = "dead"
+                    channels.append(
+                        self.send(worker_id, {"message_type": "shutdown"})
+                    )
+        # Close the persistent channels of dead Workers too
+        channels.extend(self.channels.difference(channels))
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(channel.finish() for channel in channels)),
+                SHUTDOWN_TIMEOUT,
+            )
+        except asyncio.TimeoutError:
+            LOGGER.warning("Some Workers were not told to shut down")
+        with manager.event:
+            manager.signals["shutdown"] = True
+            manager.event.notify_all()
+        LOGGER.info("Manager shut down!")
@@ -0,0 +1,136 @@
+"""MapReduce framework Manager cache of map task outputs."""
+import os
+import json
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+import collections
+
+
+# Configure logging
+LOGGER = logging.getLogger(__name__)
+
+
+def file_digest(path):
+    """Return the SHA-256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as infile:
+        for chunk in iter(lambda: infile.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def map_digest(spec):
+    """Return the digest of a job's mapper, and of its combiner if any."""
+    digest = file_digest(spec["mapper_executable"])
+    if spec.get("combiner_executable"):
+        digest += file_digest(spec["combiner_executable"])
+    return digest
+
+
+def task_key(spec, groups, mapper_digest):
+    """Return the cache key of a map task.
+
+    The key covers the mapper's and combiner's content, the partitioning
+    and, for every input split, its range and the device, inode, size
+    and modification time of its file, so any change to an input makes a
+    new key.
+    """
+    inputs = []
+    for group in groups:
+        inputs.append([])
+        for path, offset, length in group:
+            stat = os.stat(path)
+            inputs[-1].append([offset, length, stat.st_dev, stat.st_ino,
+                               stat.st_size, stat.st_mtime_ns])
+    return hashlib.sha256(json.dumps([
+        mapper_digest,
+        spec["num_reducers"],
+        spec.get("partitioner", "md5"),
+        inputs,
+    ]).encode("utf-8")).hexdigest()
+
+
+class MapCache:
+    """Content-addressed store of sorted map task partition files.
+
+    Each entry is a directory named by its task key and holding one
+    "partNNNNN" file per partition.  Entries are hard linked in and out
+    of job tmpdirs where possible, and the least recently used entries
+    are evicted once the cache grows past its budget in bytes.  Jobs
+    share one cache, so every method takes the cache's lock.
+    """
+
+    def __init__(self, cache_dir, budget):
+        """Construct a cache in cache_dir, indexing existing entries."""
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+        self.budget = budget
+        self.lock = threading.Lock()
+        # Entry sizes from least to most recently used
+        self.entries = collections.OrderedDict()
+        found = []
+        for entry in os.scandir(cache_dir):
+            if entry.is_dir() and not entry.name.startswith("."):
+                found.append((entry.stat().st_mtime, entry.name, sum(
+                    part.stat().st_size for part in os.scandir(entry.path)
+                )))
+        for _, key, size in sorted(found):
+            self.entries[key] = size
+
+    def fetch(self, key, tmpdir, task_id):
+        """Place a cached map output in tmpdir, returning True on a hit."""
+        with self.lock:
+            if key not in self.entries:
+                return False
+            entry = os.path.join(self.cache_dir, key)
+            for name in sorted(os.listdir(entry)):
+                # name is "part00123".  A resumed job has the hits of its
+                # first start in tmpdir already.
+                target = os.path.join(tmpdir, f"maptask{task_id:05d}-{name}")
+                if not os.path.exists(target):
+                    link_or_copy(os.path.join(entry, name), target)
+            self.entries.move_to_end(key)
+            os.utime(entry)
+            return True
+
+    def store(self, key, tmpdir, task_id):
+        """Add the map output of a finished task to the cache."""
+        with self.lock:
+            if key in self.entries:
+                return
+            # Build the entry aside so a reader never sees half of it
+            staging = tempfile.mkdtemp(prefix=".", dir=self.cache_dir)
+            prefix = f"maptask{task_id:05d}-"
+            size = 0
+            for name in os.listdir(tmpdir):
+                if name.startswith(prefix):
+                    target = os.path.join(staging, name[len(prefix):])
+                    link_or_copy(os.path.join(tmpdir, name), target)
+                    size += os.stat(target).st_size
+            os.rename(staging, os.path.join(self.cache_dir, key))
+            self.entries[key] = size
+            self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until within the budget.
+
+        The caller holds the lock.
+        """
+        total = sum(self.entries.values())
+        while total > self.budget and self.entries:
+            key, size = self.entries.popitem(last=False)
+            shutil.rmtree(os.path.join(self.cache_dir, key),
+                          ignore_errors=True)
+            total -= size
+            LOGGER.info("Evicted cached map output %s", key)
+
+
+def link_or_copy(source, target):
+    """Hard link source to target, copying across file systems."""
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
@@ -0,0 +1,106 @@
+"""MapReduce framework Manager failure detection."""
+import heapq
+import statistics
+import collections
+
+
+# Heartbeat intervals remembered per Worker
+WINDOW = 100
+
+# Intervals needed before suspicion replaces the fixed timeout
+MIN_SAMPLES = 5
+
+# Floor of the interval standard deviation, as a fraction of the mean,
+# so perfectly regular heartbeats do not make the detector trigger-happy
+MIN_STD_RATIO = 0.1
+
+
+class FailureDetector:
+    """Find Workers whose heartbeats stopped without scanning them all.
+
+    A min-heap holds the (expiry, worker id) entry scheduled for each
+    watched Worker.  Heartbeats only record a time, and an entry that
+    comes due for a Worker that has pinged since is pushed again with
+    its new expiry.  So the Manager wakes about once per timeout per
+    Worker, however many Workers there are.
+
+    With a nonzero threshold, the detector is phi-accrual: it learns the
+    mean and deviation of each Worker's heartbeat intervals and declares
+    the Worker dead once phi = -log10(P(no heartbeat for this long))
+    would exceed the threshold.  The fixed timeout stays an upper bound.
+    """
+
+    def __init__(self, timeout, threshold=0):
+        """Construct a detector declaring death after timeout seconds."""
+        self.timeout = timeout
+        self.threshold = threshold
+        self.last_ping = {}
+        self.intervals = {}
+        self.expiries = []
+        # Expiry of the live heap entry of each watched Worker
+        self.watched = {}
+
+    def heartbeat(self, worker_id, now):
+        """Record a heartbeat, returning True if the next check moved up."""
+        last = self.last_ping.get(worker_id)
+        # A gap longer than the timeout was an outage, not an interval
+        if self.threshold and last is not None and \
+                now - last <= self.timeout:
+            self.intervals.setdefault(
+                worker_id, collections.deque(maxlen=WINDOW)
+            ).append(now - last)
+        self.last_ping[worker_id] = now
+        if worker_id in self.watched and \
+                self.expiry(worker_id) < self.watched[worker_id]:
+            self.schedule(worker_id)
+            return True
+        return False
+
+    def watch(self, worker_id):
+        """Start checking a live Worker, unless it is already watched."""
+        if worker_id not in self.watched:
+            self.schedule(worker_id)
+
+    def schedule(self, worker_id):
+        """Push a heap entry for a Worker's current expiry."""
+        expiry = self.expiry(worker_id)
+        self.watched[worker_id] = expiry
+        heapq.heappush(self.expiries, (expiry, worker_id))
+
+    def expiry(self, worker_id):
+        """Return the time at which a Worker will be declared dead."""
+        last = self.last_ping[worker_id]
+        intervals = self.intervals.get(worker_id, ())
+        if not self.threshold or len(intervals) < MIN_SAMPLES:
+            return last + self.timeout
+        mean = statistics.fmean(intervals)
+        std = max(statistics.pstdev(intervals, mean), mean * MIN_STD_RATIO)
+        delay = statistics.NormalDist(mean, std).inv_cdf(
+            1 - 10 ** -self.threshold
+        )
+        return last + min(delay, self.timeout)
+
+    def expired(self, now):
+        """Return the watched Workers that have expired by now.
+
+        Expired Workers are no longer watched until watch() is called
+        again, e.g. once they come back.
+        """
+        expired = []
+        while self.expiries and self.expiries[0][0] <= now:
+            expiry, worker_id = heapq.heappop(self.expiries)
+            if self.watched.get(worker_id) != expiry:
+                # Replaced by an earlier entry
+                continue
+            del self.watched[worker_id]
+            if self.expiry(worker_id) > now:
+                self.schedule(worker_id)
+            else:
+                expired.append(worker_id)
+        return expired
+
+    def wait_time(self, now):
+        """Return the seconds until the next check, or None if idle."""
+        if not self.expiries:
+            return None
+        return max(self.expiries[0][0] - now, 0)
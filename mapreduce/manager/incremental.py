@@ -0,0 +1,152 @@
+"""MapReduce framework Manager incremental jobs."""
+import os
+import json
+import hashlib
+import logging
+from mapreduce.manager.planner import input_files, plan_job
+from mapreduce.manager.cache import link_or_copy, map_digest
+
+
+# Configure logging
+LOGGER = logging.getLogger(__name__)
+
+
+def file_state(path):
+    """Return the size, modification time and inode of a file."""
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+
+
+class Manifest:
+    """The input files and retained map outputs of an incremental job.
+
+    When a run of the job finishes, the partition files of each of its
+    map tasks are kept as a "run", and the manifest records the state of
+    the input files the task read.  The next run over the same input and
+    output directories, or of the same stream, maps only the files that
+    are new, changed or shared a run with a changed or removed file.  Its
+    reducers merge the new partition files with the runs still valid.
+
+    A change of mapper, combiner, reducer count or partitioner discards
+    every run.
+    """
+
+    def __init__(self, root, spec):
+        """Construct the manifest of a job, kept in a directory of root."""
+        self.spec = spec
+        self.directory = os.path.join(root, hashlib.sha256(json.dumps([
+            str(spec["input_directory"]),
+            str(spec["output_directory"]) if spec["stream"] is None
+            else spec["stream"]["directory"],
+        ]).encode("utf-8")).hexdigest())
+        # What the runs depend on besides their input files
+        self.config = None
+        # Valid retained runs and the new map tasks, each a dict of the
+        # input files it read and their state
+        self.runs = {}
+        self.tasks = []
+
+    def load(self):
+        """Return the runs of the stored manifest, if its config matches."""
+        try:
+            with open(os.path.join(self.directory, "manifest.json"),
+                      encoding="utf-8") as infile:
+                manifest = json.load(infile)
+        except FileNotFoundError:
+            return {}
+        if manifest["config"] != self.config:
+            LOGGER.info("Job %s changed, discarding %s retained runs",
+                        self.spec["job_id"], len(manifest["runs"]))
+            return {}
+        return {int(run): files for run, files in manifest["runs"].items()}
+
+    def plan(self, tmpdir):
+        """Return the map tasks of the changed inputs.
+
+        The partition files of the valid runs are linked into tmpdir as
+        "retainedNNNNN-partNNNNN".
+        """
+        input_directory = self.spec["input_directory"]
+        files = {
+            name: file_state(os.path.join(input_directory, name))
+            for name in input_files(input_directory)
+        }
+        self.config = [
+            map_digest(self.spec),
+            self.spec["num_reducers"],
+            self.spec.get("partitioner", "md5"),
+        ]
+        self.runs = self.load()
+
+        # A run is stale once a file it read changed, and the other files
+        # of a stale run are mapped again, which makes their runs stale
+        remap = set()
+        stale = True
+        while stale:
+            stale = [
+                run for run, run_files in self.runs.items()
+                if any(files.get(name) != state or name in remap
+                       for name, state in run_files.items())
+            ]
+            for run in stale:
+                remap.update(name for name in self.runs.pop(run)
+                             if name in files)
+        retained = {name for run_files in self.runs.values()
+                    for name in run_files}
+
+        map_tasks = [
+            groups for groups in plan_job(self.spec, exclude=retained)
+            if groups
+        ]
+        self.tasks = [{
+            name: files[name] for name in sorted({
+                os.path.basename(path)
+                for group in groups for path, _, _ in group
+            })
+        } for groups in map_tasks]
+        LOGGER.info("Job %s reuses %s runs and maps %s of %s files",
+                    self.spec["job_id"], len(self.runs),
+                    len(files) - len(retained), len(files))
+
+        for name in os.listdir(self.directory) \
+                if os.path.isdir(self.directory) else ():
+            # name is "run00042-part00123".  A resumed job has its runs
+            # in tmpdir already.
+            target = os.path.join(tmpdir, "retained" + name[3:])
+            if name.startswith("run") and int(name[3:8]) in self.runs \
+                    and not os.path.exists(target):
+                link_or_copy(os.path.join(self.directory, name), target)
+        return map_tasks
+
+    def commit(self, tmpdir):
+        """Retain the map outputs in tmpdir and store the new manifest."""
+        os.makedirs(self.directory, exist_ok=True)
+        # Number new runs after the stale ones still on disk, too
+        run = max((int(name[3:8]) for name in os.listdir(self.directory)
+                   if name.startswith("run")), default=-1) + 1
+        for task_id, task_files in enumerate(self.tasks):
+            prefix = f"maptask{task_id:05d}-"
+            for name in os.listdir(tmpdir):
+                if name.startswith(prefix):
+                    link_or_copy(
+                        os.path.join(tmpdir, name),
+                        os.path.join(self.directory,
+                                     f"run{run:05d}-{name[len(prefix):]}"),
+                    )
+            self.runs[run] = task_files
+            run += 1
+
+        path = os.path.join(self.directory, "manifest.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as outfile:
+            json.dump({
+                "config": self.config,
+                "runs": self.runs,
+            }, outfile)
+            outfile.flush()
+            os.fsync(outfile.fileno())
+        os.replace(path + ".tmp", path)
+
+        # Drop the runs of the old manifest that went stale
+        for name in os.listdir(self.directory):
+            if name.startswith("run") and int(name[3:8]) not in self.runs:
+                os.unlink(os.path.join(self.directory, name))
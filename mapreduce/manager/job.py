@@ -0,0 +1,375 @@
+"""MapReduce framework Manager job."""
+import os
+import logging
+import shutil
+import tempfile
+from contextlib import ExitStack
+from mapreduce.manager.tasks import TaskTable
+from mapreduce.manager.planner import plan_job
+from mapreduce.manager.cache import map_digest, task_key
+from mapreduce.manager.incremental import Manifest
+from mapreduce.manager.stream import publish_snapshot
+
+
+# Configure logging
+LOGGER = logging.getLogger(__name__)
+
+# Optional fields of a job spec and their defaults, for jobs submitted
+# without them
+JOB_DEFAULTS = {
+    "planner": "round_robin",
+    "partitioner": "md5",
+    "combiner_executable": None,
+    "split_size": 0,
+    "combine_size": 0,
+    "slow_start": 0,
+    "speculation": 0,
+    "priority": 0,
+    "queue": "default",
+    "deadline": None,
+    "cache": False,
+    "incremental": False,
+    "stream": None,
+}
+
+
+class Job:
+    """A MapReduce job moving through its map and reduce stages.
+
+    Every job owns a shared tmpdir for intermediate files and one task
+    table per active stage, so several jobs can be in flight at once.
+    With slow start, a "merging" table of background pre-merge tasks runs
+    next to the tail of the "mapping" table.
+
+    With speculation, a straggler gets a backup attempt.  Every attempt
+    then writes to a directory of its own, and the first one to finish
+    is committed by moving its files into place.
+
+    A durable job's tmpdir outlives the Manager process, so a restarted
+    Manager can resume the job from the map outputs already in it.
+
+    With a map output cache, map tasks whose output is cached are done
+    before they start, and the others add their output once finished.
+    An incremental job keeps a manifest in the cache directory and maps
+    only the inputs that changed since its last run.  A batch of a
+    streaming job publishes its output as the stream's latest snapshot.
+    """
+
+    def __init__(self, spec, durable=False, cache=None):
+        """Construct a job from the fields of its new_manager_job message."""
+        self.spec = spec
+        self.durable = durable
+        # The map output cache, the cache keys of map tasks to store,
+        # the job's hit and miss counts and its incremental manifest
+        self.cache = {
+            "store": cache,
+            "keys": {},
+            "hits": 0,
+            "misses": 0,
+            "manifest": Manifest(os.path.join(cache.cache_dir, ".incremental"),
+                                 spec)
+            if cache is not None and spec["incremental"] else None,
+        }
+        self.stage = None  # mapping, reducing, done
+        self.tables = {}
+        self.tmpdir = None
+        self.stack = ExitStack()
+
+    @property
+    def job_id(self):
+        """Return the job id."""
+        return self.spec["job_id"]
+
+    @property
+    def tasks(self):
+        """Return the task table of the current stage."""
+        return self.tables[self.stage]
+
+    def start(self):
+        """Plan the map tasks and create the output and shared directories."""
+        job = self.spec
+        LOGGER.info("Starting job %s", job['job_id'])
+        # delete output directory
+        output_directory = job["output_directory"]
+        if os.path.exists(output_directory):
+            shutil.rmtree(output_directory)
+            LOGGER.info(
+                "Deleted existing output directory: %s",
+                output_directory
+            )
+
+        # Create the output directory
+        os.makedirs(output_directory)
+        LOGGER.info("Created output directory: %s", output_directory)
+
+        # Create a shared directory for temporary intermediate files
+        prefix = f"mapreduce-shared-job{job['job_id']:05d}-"
+        if self.durable:
+            self.tmpdir = tempfile.mkdtemp(prefix=prefix)
+            self.stack.callback(shutil.rmtree, self.tmpdir, True)
+        else:
+            self.tmpdir = self.stack.enter_context(
+                tempfile.TemporaryDirectory(prefix=prefix)
+            )
+        LOGGER.info("Created tmpdir %s", self.tmpdir)
+        map_tasks = plan_job(job) if self.cache["manifest"] is None else \
+            self.cache["manifest"].plan(self.tmpdir)
+        self.set_stage("mapping", map_tasks)
+        fetch_cached(self, map_tasks)
+
+    def resume(self, tmpdir, finished):
+        """Pick a durable job up again after a Manager restart.
+
+        finished lists the (stage, task id) of every task that finished
+        before, whose outputs are in tmpdir or the output directory.
+        """
+        LOGGER.info("Resuming job %s from %s", self.job_id, tmpdir)
+        self.tmpdir = tmpdir
+        self.stack.callback(shutil.rmtree, self.tmpdir, True)
+        # Attempts that never finished, whose numbers start over now
+        shutil.rmtree(os.path.join(tmpdir, "attempts"), ignore_errors=True)
+        map_tasks = plan_job(self.spec) if self.cache["manifest"] is None \
+            else self.cache["manifest"].plan(self.tmpdir)
+        self.set_stage("mapping", map_tasks)
+        fetch_cached(self, map_tasks, {
+            task_id for stage, task_id in finished if stage == "mapping"
+        })
+        for stage in ("mapping", "reducing"):
+            if self.stage == stage:
+                self.tasks.restore({
+                    task_id for done_stage, task_id in finished
+                    if done_stage == stage
+                })
+            while self.stage != "done" and self.tasks.is_complete():
+                self.advance()
+
+    def has_pending(self, exclude=()):
+        """Return True if any active stage has a task or backup waiting.
+
+        Stragglers in exclude do not count, as for start_task().
+        """
+        return any(table.has_pending() for table in self.tables.values()) \
+            or self.straggler(exclude) is not None
+
+    def straggler(self, exclude=()):
+        """Return the id of a current stage task worth a backup, or None."""
+        if self.stage not in ("mapping", "reducing"):
+            return None
+        return self.tasks.straggler(self.spec["speculation"], exclude)
+
+    def start_task(self, exclude=()):
+        """Start the next attempt and return its (stage, task id, attempt).
+
+        Tasks of the current stage go first, background merges next and
+        backups of stragglers not in exclude last.  Return None if there
+        is nothing to start.
+        """
+        stages = [self.stage] + [
+            stage for stage in self.tables if stage != self.stage
+        ]
+        for stage in stages:
+            if self.tables[stage].has_pending():
+                return (stage, *self.tables[stage].start())
+        task_id = self.straggler(exclude)
+        if task_id is None:
+            return None
+        return (self.stage, *self.tasks.start(task_id))
+
+    def finish(self, stage, task_id, attempt):
+        """Record a finished attempt, committing the output of the winner.
+
+        Return True if this attempt finished the task.
+        """
+        won = self.tables[stage].finish(task_id, attempt)
+        if self.spec["speculation"] and stage != "merging":
+            attempt_dir = self.attempt_dir(stage, task_id, attempt)
+            if won:
+                destination = self.tmpdir if stage == "mapping" else \
+                    self.spec["output_directory"]
+                for name in sorted(os.listdir(attempt_dir)):
+                    os.replace(os.path.join(attempt_dir, name),
+                               os.path.join(destination, name))
+                LOGGER.info("Committed %s task %s attempt %s",
+                            stage, task_id, attempt)
+            shutil.rmtree(attempt_dir, ignore_errors=True)
+        if won and stage == "mapping" and task_id in self.cache["keys"]:
+            self.cache["store"].store(self.cache["keys"].pop(task_id),
+                                      self.tmpdir, task_id)
+        return won
+
+    def needs_update(self):
+        """Return True if update() has merges or a new stage to start."""
+        return self.tasks.is_complete() or self.slow_start_due()
+
+    def slow_start_due(self):
+        """Return True once enough map tasks are done to start merging."""
+        return (
+            self.stage == "mapping"
+            and "merging" not in self.tables
+            and bool(self.spec["slow_start"])
+            and not self.tasks.is_complete()
+            and len(self.tasks.done) >=
+            self.spec["slow_start"] * len(self.tasks.tasks)
+        )
+
+    def update(self):
+        """Start background merges or the next stage as tasks complete."""
+        if self.slow_start_due():
+            self.start_merges()
+        while self.stage != "done" and self.tasks.is_complete():
+            self.advance()
+
+    def start_merges(self):
+        """Pre-merge the partition files of the map tasks done so far."""
+        # Files of running map tasks may still be on their way in
+        partitions = self.partition_files(self.tasks.done)
+        merge_dir = os.path.join(self.tmpdir, "premerge")
+        os.makedirs(merge_dir, exist_ok=True)
+        self.tables["merging"] = TaskTable()
+        for partition, paths in enumerate(partitions):
+            # Merging a single run gains nothing
+            if len(paths) > 1:
+                self.tables["merging"].add(partition, paths)
+        LOGGER.info("Slow start: pre-merging %s partitions of job %s",
+                    len(self.tables["merging"].tasks), self.job_id)
+
+    def partition_files(self, task_ids=None):
+        """Return the map output files in tmpdir, grouped by partition.
+
+        With task_ids, the files of other map tasks are left out.
+        """
+        partitions = [[] for _ in range(self.spec['num_reducers'])]
+        for partition_file in sorted(os.listdir(self.tmpdir)):
+            # partition file is "maptask00000-part00123", or a retained
+            # run of an incremental job
+            if task_ids is not None and \
+                    partition_file.startswith("maptask") and \
+                    int(partition_file[7:12]) not in task_ids:
+                continue
+            if partition_file.startswith(("maptask", "retained")):
+                file_path = os.path.join(self.tmpdir, partition_file)
+                partitions[int(partition_file[-5:])].append(file_path)
+        return partitions
+
+    def advance(self):
+        """Move on to the next stage once every task of this one is done."""
+        if self.stage == "mapping":
+            # create reduce tasks from the partition files
+            reduce_tasks = self.partition_files()
+            merges = self.tables.pop("merging", None)
+            for partition in merges.done if merges else ():
+                merged = set(merges.payload(partition))
+                merged_path = os.path.join(self.tmpdir, "premerge",
+                                           f"premerge-part{partition:05d}")
+                reduce_tasks[partition] = [merged_path] + [
+                    path for path in reduce_tasks[partition]
+                    if path not in merged
+                ]
+            self.set_stage("reducing", reduce_tasks)
+        else:
+            self.stage = "done"
+            if self.cache["manifest"] is not None:
+                self.cache["manifest"].commit(self.tmpdir)
+            if self.spec["stream"] is not None:
+                publish_snapshot(self.spec["output_directory"],
+                                 self.spec["stream"]["keep"])
+            self.cleanup()
+            LOGGER.info("Finished job %s", self.job_id)
+
+    def set_stage(self, stage, payloads):
+        """Start a stage with one pending task per payload."""
+        self.tables.pop(self.stage, None)
+        self.stage = stage
+        self.tables[stage] = TaskTable()
+        for task_id, payload in enumerate(payloads):
+            self.tables[stage].add(task_id, payload)
+
+    def cleanup(self):
+        """Remove the shared tmpdir."""
+        self.stack.close()
+
+    def attempt_dir(self, stage, task_id, attempt):
+        """Return the output directory of one attempt of a task."""
+        return os.path.join(self.tmpdir, "attempts",
+                            f"{stage}-task{task_id:05d}-attempt{attempt:02d}")
+
+    def message(self, stage, task_id, attempt=1):
+        """Return the task message for an attempt of an active stage."""
+        payload = self.tables[stage].payload(task_id)
+        if stage == "merging":
+            return {
+                "message_type": "new_merge_task",
+                "task_id": task_id,
+                "input_paths": payload,
+                "output_directory": os.path.join(self.tmpdir, "premerge"),
+            }
+        if stage == "mapping":
+            message = self.map_message(task_id, payload)
+        else:
+            message = self.reduce_message(task_id, payload)
+        if self.spec["speculation"]:
+            # Attempts of one task must not collide, see finish()
+            message["output_directory"] = \
+                self.attempt_dir(stage, task_id, attempt)
+            os.makedirs(message["output_directory"])
+        return message
+
+    def map_message(self, task_id, groups):
+        """Return the new_map_task message for a map task."""
+        job = self.spec
+        message = {
+            "message_type": "new_map_task",
+            "task_id": task_id,
+            "input_paths": list(dict.fromkeys(
+                path for group in groups for path, _, _ in group
+            )),
+            "executable": job['mapper_executable'],
+            "output_directory": self.tmpdir,
+            "num_partitions": job['num_reducers']
+        }
+        # Old job logs have no partitioner, and MD5 is the Worker default
+        if job.get("partitioner", "md5") != "md5":
+            message["partitioner"] = job["partitioner"]
+        if job.get("combiner_executable"):
+            message["combiner_executable"] = job["combiner_executable"]
+        if job["combine_size"]:
+            message["input_groups"] = [
+                [list(split) for split in group] for group in groups
+            ]
+        elif job["split_size"]:
+            message["input_splits"] = [list(group[0]) for group in groups]
+        return message
+
+    def reduce_message(self, task_id, input_paths):
+        """Return the new_reduce_task message for a reduce task."""
+        return {
+            "message_type": "new_reduce_task",
+            "task_id": task_id,
+            "executable": self.spec['reducer_executable'],
+            "input_paths": input_paths,
+            "output_directory": self.spec['output_directory'],
+        }
+
+
+def fetch_cached(job, map_tasks, finished=()):
+    """Skip the map tasks of a job whose output is cached.
+
+    The map tasks in finished have their output in tmpdir already.
+    """
+    if job.cache["store"] is None or not job.spec["cache"]:
+        return
+    mapper_digest = map_digest(job.spec)
+    hits = set()
+    for task_id, groups in enumerate(map_tasks):
+        if task_id in finished:
+            continue
+        key = task_key(job.spec, groups, mapper_digest)
+        if job.cache["store"].fetch(key, job.tmpdir, task_id):
+            hits.add(task_id)
+        else:
+            job.cache["keys"][task_id] = key
+    job.tasks.restore(hits)
+    job.cache["hits"] = len(hits)
+    job.cache["misses"] = len(job.cache["keys"])
+    LOGGER.info("Job %s map output cache: %s hits, %s misses",
+                job.job_id, job.cache["hits"], job.cache["misses"])
@@ -0,0 +1,115 @@
+"""MapReduce framework Manager write-ahead job log."""
+import os
+import json
+import collections
+
+
+class JobLog:
+    """Append-only JSON-lines log of job and Worker events.
+
+    Each record is fsync'd before the Manager acts on the event, so a
+    restarted Manager can replay the log to rebuild its job queue, its
+    running jobs and its known Workers.  Without a state directory the
+    log records nothing.
+
+    Records are {"event": "register", "worker_id", "slots", "memory"},
+    {"event": "submit", "job_id", "spec"}, {"event": "start", "job_id",
+    "tmpdir"}, {"event": "finish", "job_id", "stage", "task_id"},
+    {"event": "done", "job_id"} and {"event": "failed", "job_id"}.
+    """
+
+    def __init__(self, state_dir=None):
+        """Construct a log in state_dir, or a log that records nothing."""
+        self.path = None
+        if state_dir is not None:
+            os.makedirs(state_dir, exist_ok=True)
+            self.path = os.path.join(state_dir, "jobs.log")
+
+    def append(self, event, **fields):
+        """Durably append a record."""
+        if self.path is None:
+            return
+        with open(self.path, "a", encoding="utf-8") as outfile:
+            outfile.write(json.dumps({"event": event, **fields}) + "\n")
+            outfile.flush()
+            os.fsync(outfile.fileno())
+
+    def records(self):
+        """Return the records in the log, without a torn last line."""
+        records = []
+        if self.path is None or not os.path.exists(self.path):
+            return records
+        with open(self.path, encoding="utf-8") as infile:
+            for line in infile:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # The Manager died in the middle of this write
+                    break
+        return records
+
+    def recover(self):
+        """Replay the log and return the state it describes.
+
+        Return a dict with the known Workers by id, the specs of queued
+        jobs, (spec, tmpdir, finished tasks) of running jobs and the next
+        job id.  The log is then compacted to the records of unfinished
+        jobs.
+        """
+        records = self.records()
+        state = {"workers": {}, "specs": {}, "tmpdirs": {}, "count": 0}
+        finished = collections.defaultdict(list)
+        for record in records:
+            if record["event"] == "register":
+                state["workers"][tuple(record["worker_id"])] = {
+                    "slots": record["slots"],
+                    "memory": record["memory"],
+                }
+            elif record["event"] == "submit":
+                state["specs"][record["job_id"]] = record["spec"]
+                state["count"] = max(state["count"], record["job_id"] + 1)
+            elif record["event"] == "start":
+                state["tmpdirs"][record["job_id"]] = record["tmpdir"]
+            elif record["event"] == "finish":
+                finished[record["job_id"]].append(
+                    (record["stage"], record["task_id"])
+                )
+            elif record["event"] in ("done", "failed"):
+                state["specs"].pop(record["job_id"], None)
+                state["count"] = max(state["count"], record["job_id"] + 1)
+        self.compact([
+            {"event": "register", "worker_id": list(worker_id), **worker}
+            for worker_id, worker in state["workers"].items()
+        ] + [
+            record for record in records
+            if record["event"] != "register" and
+            record["job_id"] in state["specs"]
+        ], state["count"])
+        return {
+            "workers": state["workers"],
+            "queued": [
+                spec for job_id, spec in sorted(state["specs"].items())
+                if job_id not in state["tmpdirs"]
+            ],
+            "running": [
+                (spec, state["tmpdirs"][job_id], finished[job_id])
+                for job_id, spec in sorted(state["specs"].items())
+                if job_id in state["tmpdirs"]
+            ],
+            "count": state["count"],
+        }
+
+    def compact(self, records, count):
+        """Atomically replace the log with records."""
+        if self.path is None:
+            return
+        # Keep job ids unique by remembering the last submitted job
+        if count and not any(record.get("job_id") == count - 1
+                             for record in records):
+            records.insert(0, {"event": "done", "job_id": count - 1})
+        with open(self.path + ".tmp", "w", encoding="utf-8") as outfile:
+            for record in records:
+                outfile.write(json.dumps(record) + "\n")
+            outfile.flush()
+            os.fsync(outfile.fileno())
+        os.replace(self.path + ".tmp", self.path)
@@ -0,0 +1,136 @@
+"""MapReduce framework Manager input planning.
+
+A split is a (path, offset, length) tuple covering whole lines of one
+input file.  A group is a list of splits that stream through a single
+mapper process.  A plan is a list of map tasks, each a list of groups.
+"""
+import os
+import heapq
+
+
+def input_files(input_directory):
+    """Return the sorted names of the regular files in a directory."""
+    files = []
+    for filename in os.listdir(input_directory):
+        file_path = os.path.join(input_directory, filename)
+        if os.path.isfile(file_path):
+            # Add the file to the list only if it is a regular file
+            files.append(filename)
+    return sorted(files)
+
+
+def input_splits(input_directory, split_size=0, exclude=()):
+    """Return the splits of every input file, in filename order.
+
+    Files larger than split_size are cut into line-aligned splits of
+    about split_size bytes.  A split_size of 0 keeps every file whole.
+    Files named in exclude are skipped.
+    """
+    splits = []
+    for file_name in input_files(input_directory):
+        if file_name in exclude:
+            continue
+        path = str(input_directory) + '/' + str(file_name)
+        size = os.stat(path).st_size
+        if split_size and size > split_size:
+            splits.extend(
+                (path, offset, length)
+                for offset, length in line_aligned_splits(path, split_size)
+            )
+        else:
+            splits.append((path, 0, size))
+    return splits
+
+
+def line_aligned_splits(path, split_size):
+    """Cut a file into (offset, length) ranges that end on a newline.
+
+    Each range ends at the first newline at or after the next multiple
+    of split_size, so no line is ever divided between two map tasks.
+    """
+    size = os.stat(path).st_size
+    ranges = []
+    offset = 0
+    with open(path, "rb") as infile:
+        while offset < size:
+            end = offset + split_size
+            if end < size:
+                infile.seek(end - 1)
+                infile.readline()
+                end = infile.tell()
+            ranges.append((offset, end - offset))
+            offset = end
+    return ranges
+
+
+def combine_splits(splits, combine_size=0):
+    """Pack consecutive small splits into groups of up to combine_size bytes.
+
+    A combine_size of 0 puts every split in a group of its own.
+    """
+    if not combine_size:
+        return [[split] for split in splits]
+    groups = []
+    group = []
+    size = 0
+    for split in splits:
+        if group and size + split[2] > combine_size:
+            groups.append(group)
+            group = []
+            size = 0
+        group.append(split)
+        size += split[2]
+    if group:
+        groups.append(group)
+    return groups
+
+
+def group_size(group):
+    """Return the number of input bytes in a group."""
+    return sum(length for _, _, length in group)
+
+
+def plan_round_robin(groups, num_mappers):
+    """Assign groups to map tasks round-robin in filename order."""
+    map_tasks = [[] for _ in range(num_mappers)]
+    for i, group in enumerate(groups):
+        map_tasks[i % num_mappers].append(group)
+    return map_tasks
+
+
+def plan_balanced(groups, num_mappers):
+    """Balance input bytes across map tasks.
+
+    Groups are placed largest first on the task with the fewest bytes so
+    far (greedy bin packing).  Tasks are numbered from the heaviest to the
+    lightest, so the dispatcher hands out the biggest task first.
+    """
+    heap = [(0, index) for index in range(num_mappers)]
+    bins = [[] for _ in range(num_mappers)]
+    for group in sorted(groups, key=lambda group: (-group_size(group),
+                                                   group)):
+        total, index = heapq.heappop(heap)
+        bins[index].append(group)
+        heapq.heappush(heap, (total + group_size(group), index))
+    totals = dict((index, total) for total, index in heap)
+    order = sorted(range(num_mappers), key=lambda index: -totals[index])
+    return [sorted(bins[index]) for index in order]
+
+
+PLANNERS = {
+    "round_robin": plan_round_robin,
+    "balanced": plan_balanced,
+}
+
+
+def plan_job(spec, exclude=()):
+    """Return the map tasks of a job from its spec, skipping exclude."""
+    plan = PLANNERS.get(spec["planner"], plan_round_robin)
+    return plan(
+        combine_splits(
+            input_splits(spec["input_directory"], spec["split_size"],
+                         exclude),
+            spec["combine_size"],
+        ),
+        spec["num_mappers"],
+    )
@@ -0,0 +1,45 @@
+"""MapReduce framework Manager scheduling policies.
+
+A policy is a sort key over job specs.  Queued jobs with the smallest
+key start first, and running jobs with the smallest key get the next
+free Worker slot.  shares maps each queue to its running tasks divided
+by its weight.
+"""
+import math
+
+
+def fifo(spec, _shares):
+    """Serve jobs in submission order."""
+    return spec["job_id"]
+
+
+def fair_share(spec, shares):
+    """Serve the queue using the smallest share of the cluster first."""
+    return shares.get(spec["queue"], 0), spec["job_id"]
+
+
+def priority(spec, _shares):
+    """Serve jobs with a higher priority first."""
+    return -spec["priority"], spec["job_id"]
+
+
+def earliest_deadline(spec, _shares):
+    """Serve the job with the nearest deadline first, then the rest."""
+    deadline = spec["deadline"]
+    return math.inf if deadline is None else deadline, spec["job_id"]
+
+
+def queue_shares(usage, weights):
+    """Return running tasks per unit of weight for each queue."""
+    return {
+        queue: count / weights.get(queue, 1)
+        for queue, count in usage.items()
+    }
+
+
+SCHEDULERS = {
+    "fifo": fifo,
+    "fair": fair_share,
+    "priority": priority,
+    "deadline": earliest_deadline,
+}
@@ -0,0 +1,124 @@
+"""MapReduce framework Manager streaming jobs."""
+import os
+import time
+import shutil
+import logging
+import threading
+from mapreduce.manager.planner import input_files
+from mapreduce.manager.watcher import DirectoryWatcher
+
+
+# Configure logging
+LOGGER = logging.getLogger(__name__)
+
+# Seconds between checks for new files and shutdown
+POLL_INTERVAL = 0.5
+
+
+def next_batch(directory):
+    """Return the number of the first snapshot not yet in directory."""
+    return max((
+        int(name[len("snapshot"):]) for name in os.listdir(directory)
+        if name.startswith("snapshot")
+    ), default=-1) + 1
+
+
+def publish_snapshot(snapshot, keep=0):
+    """Point the "latest" link at a finished snapshot, pruning old ones.
+
+    A keep of 0 keeps every snapshot.
+    """
+    directory = os.path.dirname(snapshot)
+    link = os.path.join(directory, "latest")
+    if os.path.lexists(link + ".tmp"):
+        os.unlink(link + ".tmp")
+    os.symlink(os.path.basename(snapshot), link + ".tmp")
+    os.replace(link + ".tmp", link)
+    LOGGER.info("Published snapshot %s", snapshot)
+    if keep:
+        snapshots = sorted(name for name in os.listdir(directory)
+                           if name.startswith("snapshot"))
+        for name in snapshots[:-keep]:
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+
+class Stream:
+    """A job that runs again over the files arriving in its input directory.
+
+    Each batch is an incremental job writing a snapshot directory
+    "snapshotNNNNN" in the output directory.  The map outputs retained
+    from earlier batches are the running partial aggregates, which the
+    reducers merge with the map outputs of the new files.  A batch
+    starts once batch_files files changed, or interval seconds after the
+    last batch if any file did, and never before the last batch is
+    published as the "latest" link.
+    """
+
+    def __init__(self, message_dict, submit, signals):
+        """Construct a stream from its new_streaming_job message."""
+        self.spec = {
+            "interval": 10,
+            "batch_files": 0,
+            "keep_snapshots": 0,
+            **message_dict,
+        }
+        self.submit = submit
+        self.signals = signals
+        # Snapshot directory of the last batch submitted
+        self.snapshot = None
+
+    def published(self):
+        """Return True once the last batch submitted is published."""
+        return self.snapshot is None or os.path.realpath(
+            os.path.join(self.spec["output_directory"], "latest")
+        ) == os.path.realpath(self.snapshot)
+
+    def is_due(self, changed, last):
+        """Return True if the changed files make a new batch."""
+        return bool(changed) and (
+            time.time() - last >= self.spec["interval"] or
+            0 < self.spec["batch_files"] <= len(changed)
+        ) and self.published()
+
+    def run(self):
+        """Submit batches until the Manager shuts down."""
+        spec = self.spec
+        os.makedirs(spec["output_directory"], exist_ok=True)
+        batch = next_batch(spec["output_directory"])
+        with DirectoryWatcher(spec["input_directory"]) as watcher:
+            # The files already there make the first batch
+            changed = set(input_files(spec["input_directory"]))
+            last = 0
+            while not self.signals["shutdown"]:
+                changed.update(watcher.poll(POLL_INTERVAL))
+                if not self.is_due(changed, last):
+                    continue
+                self.snapshot = os.path.join(spec["output_directory"],
+                                             f"snapshot{batch:05d}")
+                LOGGER.info("Stream over %s: batch %s of %s changed files",
+                            spec["input_directory"], batch, len(changed))
+                self.submit({
+                    **{key: value for key, value in spec.items()
+                       if key not in ("interval", "batch_files",
+                                      "keep_snapshots")},
+                    "message_type": "new_manager_job",
+                    "output_directory": self.snapshot,
+                    "incremental": True,
+                    "stream": {
+                        "directory": spec["output_directory"],
+                        "keep": spec["keep_snapshots"],
+                    },
+                })
+                batch += 1
+                last = time.time()
+                changed.clear()
+
+
+def start_stream(message_dict, submit, signals):
+    """Start a thread running a stream and return the thread."""
+    thread = threading.Thread(
+        target=Stream(message_dict, submit, signals).run,
+        name="stream",
+    )
+    thread.start()
+    return thread
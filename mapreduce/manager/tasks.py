@@ -0,0 +1,135 @@
+"""MapReduce framework Manager task table."""
+import time
+import bisect
+import collections
+
+
+class TaskTable:
+    """Index the tasks of one stage by task id.
+
+    Each task records its state ("pending", "running" or "done"), the
+    number of attempts handed out, the start time of each live attempt
+    and the payload used to build its task message.  Pending task ids
+    wait in a FIFO, and finished task ids are collected in a set so that
+    a duplicate or late finished message can never be counted twice.
+
+    Running task ids are kept in start order next to the sorted runtimes
+    of finished tasks, so stragglers are found without a full scan.
+    """
+
+    def __init__(self):
+        """Construct an empty task table."""
+        self.tasks = {}
+        self.pending = collections.deque()
+        self.running = {}
+        self.runtimes = []
+        self.done = set()
+
+    def add(self, task_id, payload):
+        """Add a pending task."""
+        self.tasks[task_id] = {
+            "state": "pending",
+            "attempts": 0,
+            "live": {},
+            "payload": payload,
+        }
+        self.pending.append(task_id)
+
+    def has_pending(self):
+        """Return True if a task is waiting for a Worker."""
+        return bool(self.pending)
+
+    def start(self, task_id=None):
+        """Start an attempt and return its (task id, attempt number).
+
+        Without a task id the next pending task starts.  With one, a
+        backup attempt of that running task starts.
+        """
+        if task_id is None:
+            task_id = self.pending.popleft()
+            self.running[task_id] = time.time()
+        task = self.tasks[task_id]
+        task["state"] = "running"
+        task["attempts"] += 1
+        task["live"][task["attempts"]] = time.time()
+        return task_id, task["attempts"]
+
+    def restore(self, task_ids):
+        """Mark pending tasks done, e.g. replaying a job log."""
+        for task_id in task_ids:
+            self.tasks[task_id]["state"] = "done"
+            self.done.add(task_id)
+        self.pending = collections.deque(
+            task_id for task_id in self.pending if task_id not in task_ids
+        )
+
+    def payload(self, task_id):
+        """Return the payload of a task."""
+        return self.tasks[task_id]["payload"]
+
+    def requeue(self, task_id, attempt=None):
+        """Drop a failed attempt, putting the task back if none is left."""
+        task = self.tasks.get(task_id)
+        if task is None or task["state"] != "running":
+            return
+        task["live"].pop(attempt, None)
+        if attempt is not None and task["live"]:
+            return
+        task["live"].clear()
+        task["state"] = "pending"
+        del self.running[task_id]
+        self.pending.append(task_id)
+
+    def fail(self, task_id, attempt, limit):
+        """Drop an attempt that failed, requeueing the task up to limit.
+
+        Return False if the task is given up on: it had limit attempts
+        and none is left running, so it never starts again.
+        """
+        task = self.tasks.get(task_id)
+        if task is None or task["state"] != "running":
+            return True
+        if task["attempts"] < limit:
+            self.requeue(task_id, attempt)
+            return True
+        task["live"].pop(attempt, None)
+        return bool(task["live"])
+
+    def finish(self, task_id, attempt=None):
+        """Mark a task done, returning False if it was not running.
+
+        The first attempt to finish wins, later ones return False.
+        """
+        task = self.tasks.get(task_id)
+        if task is None or task["state"] != "running":
+            return False
+        started = task["live"].get(attempt, self.running[task_id])
+        bisect.insort(self.runtimes, time.time() - started)
+        task["state"] = "done"
+        task["live"].clear()
+        del self.running[task_id]
+        self.done.add(task_id)
+        return True
+
+    def straggler(self, factor, exclude=()):
+        """Return a task running factor times the median runtime, or None.
+
+        Only tasks with a single live attempt and not in exclude are
+        candidates, so a task is never backed up twice.
+        """
+        if not factor or not self.runtimes:
+            return None
+        limit = factor * self.runtimes[len(self.runtimes) // 2]
+        now = time.time()
+        for task_id, started in self.running.items():
+            if now - started <= limit:
+                # Later tasks started later still
+                break
+            if len(self.tasks[task_id]["live"]) == 1 and \
+                    task_id not in exclude:
+                return task_id
+        return None
+
+    def is_complete(self):
+        """Return True once every task is done."""
+        return len(self.done) == len(self.tasks)
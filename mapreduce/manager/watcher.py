@@ -0,0 +1,119 @@
+"""MapReduce framework Manager input directory watching."""
+import os
+import sys
+import time
+import select
+import struct
+import ctypes
+import ctypes.util
+import logging
+
+
+# Configure logging
+LOGGER = logging.getLogger(__name__)
+
+# inotify events of a file written, renamed in or out, or removed
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE
+
+# struct inotify_event without its variable length name
+EVENT = struct.Struct("iIII")
+
+
+def load_inotify():
+    """Return the C library if it provides inotify, else None."""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6",
+                           use_errno=True)
+    except OSError:
+        return None
+    return libc if hasattr(libc, "inotify_init1") else None
+
+
+class DirectoryWatcher:
+    """Report the names of files written, moved or removed in a directory.
+
+    On Linux, inotify reports each file once its writer closes it or
+    renames it into place.  Elsewhere, or if inotify is unavailable, the
+    directory is rescanned with os.scandir and each file's size and
+    modification time compared with the previous scan, so a file still
+    being written may be reported more than once.
+    """
+
+    def __init__(self, directory, use_inotify=True):
+        """Start watching a directory."""
+        self.directory = directory
+        self.inotify_fd = None
+        # (size, mtime) of each file at the last scan, without inotify
+        self.files = {}
+        libc = load_inotify() if use_inotify else None
+        if libc is not None:
+            inotify_fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if inotify_fd >= 0 and libc.inotify_add_watch(
+                    inotify_fd, os.fsencode(directory), WATCH_MASK) >= 0:
+                self.inotify_fd = inotify_fd
+            elif inotify_fd >= 0:
+                os.close(inotify_fd)
+        if self.inotify_fd is None:
+            LOGGER.info("Scanning %s for new files", directory)
+            self.files = self.scan()
+
+    def __enter__(self):
+        """Return the watcher."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Stop watching."""
+        self.close()
+
+    def scan(self):
+        """Return the (size, mtime) of each regular file by name."""
+        files = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    stat = entry.stat()
+                    files[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        return files
+
+    def poll(self, timeout):
+        """Wait up to timeout seconds and return the names that changed."""
+        if self.inotify_fd is None:
+            time.sleep(timeout)
+            files = self.scan()
+            changed = {
+                name for name in files.keys() | self.files.keys()
+                if files.get(name) != self.files.get(name)
+            }
+            self.files = files
+            return changed
+
+        changed = set()
+        readable, _, _ = select.select([self.inotify_fd], [], [], timeout)
+        if not readable:
+            return changed
+        buffer = os.read(self.inotify_fd, 1 << 16)
+        offset = 0
+        while offset < len(buffer):
+            _, mask, _, length = EVENT.unpack_from(buffer, offset)
+            offset += EVENT.size
+            if mask & IN_Q_OVERFLOW:
+                # Events were lost, so report every file
+                changed.update(self.scan())
+            name = buffer[offset:offset + length].rstrip(b"\0")
+            if name:
+                changed.add(os.fsdecode(name))
+            offset += length
+        return changed
+
+    def close(self):
+        """Release the inotify file descriptor."""
+        if self.inotify_fd is not None:
+            os.close(self.inotify_fd)
+            self.inotify_fd = None
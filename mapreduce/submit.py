@@ -12,6 +12,7 @@ $ mapreduce-submit --help
 """
 
 import sys
+import time
 import socket
 import json
 import click
@@ -57,6 +58,77 @@ import click
     "--nreducers", "num_reducers", default=2, type=int,
     help="Number of reducers, default=2",
 )
+@click.option(
+    "--planner", "planner", default="round_robin",
+    type=click.Choice(["round_robin", "balanced"]),
+    help="Input planner, balanced evens out bytes, default=round_robin",
+)
+@click.option(
+    "--partitioner", "partitioner", default="md5",
+    type=click.Choice(["md5", "crc32", "modulo"]),
+    help="Map output partitioner, crc32 is faster, modulo spreads "
+    "integer keys evenly, default=md5",
+)
+@click.option(
+    "--combiner", "combiner_executable", default=None,
+    help="Combiner executable run on each sorted map output partition "
+    "before the shuffle, default=none",
+    type=click.Path(file_okay=True, dir_okay=False),
+)
+@click.option(
+    "--split-size", "split_size", default=0, type=int,
+    help="Cut input files into line-aligned splits of about this many "
+    "bytes, default=0 (whole files)",
+)
+@click.option(
+    "--combine-size", "combine_size", default=0, type=int,
+    help="Stream small input files through one mapper in packs of up to "
+    "this many bytes, default=0 (one mapper per file)",
+)
+@click.option(
+    "--slow-start", "slow_start", default=0.0, type=float,
+    help="Pre-merge map outputs once this fraction of map tasks is done, "
+    "default=0 (merge only when reducing)",
+)
+@click.option(
+    "--speculation", "speculation", default=0.0, type=float,
+    help="Back up tasks running this many times the stage median, "
+    "default=0 (no backups)",
+)
+@click.option(
+    "--priority", "priority", default=0, type=int,
+    help="Job priority, higher runs first, default=0",
+)
+@click.option(
+    "--queue", "queue", default="default",
+    help="Fair share queue of the job, default=default",
+)
+@click.option(
+    "--deadline", "deadline", default=None, type=float,
+    help="Seconds from now the job should finish in, default=none",
+)
+@click.option(
+    "--cache", "cache", is_flag=True,
+    help="Reuse cached map outputs, needs a Manager with --cache-dir",
+)
+@click.option(
+    "--incremental", "incremental", is_flag=True,
+    help="Map only the inputs changed since the last run over the same "
+    "directories, needs a Manager with --cache-dir",
+)
+@click.option(
+    "--stream", "stream", default=None, type=float,
+    help="Watch the input directory and rerun the job over new files at "
+    "most every STREAM seconds, writing versioned output snapshots",
+)
+@click.option(
+    "--batch-files", "batch_files", default=0,
+    help="With --stream, also rerun once this many files arrived",
+)
+@click.option(
+    "--keep-snapshots", "keep_snapshots", default=0,
+    help="With --stream, output snapshots to keep, default=0 (all)",
+)
 @click.option("--shutdown", "-s", is_flag=True, help="Shutdown the server.")
 def main(
     host: str,
@@ -67,25 +139,60 @@ def main(
     reducer_executable: str,
     num_mappers: int,
     num_reducers: int,
+    planner: str,
+    partitioner: str,
+    combiner_executable: str,
+    split_size: int,
+    combine_size: int,
+    slow_start: float,
+    speculation: float,
+    priority: int,
+    queue: str,
+    deadline: float,
+    cache: bool,
+    incremental: bool,
+    stream: float,
+    batch_files: int,
+    keep_snapshots: int,
     shutdown: bool,
 ) -> None:
     """Top level command line interface."""
     # We want a bunch of arguments, this is the top level CLI.
-    # pylint: disable=too-many-arguments
+    # pylint: disable=too-many-arguments,too-many-locals
     if shutdown:
         message = json.dumps({
             "message_type": "shutdown",
         })
     else:
-        message = json.dumps({
+        message = {
             "message_type": "new_manager_job",
             "input_directory": input_directory,
             "output_directory": output_directory,
             "mapper_executable": mapper_executable,
             "reducer_executable": reducer_executable,
             "num_mappers": num_mappers,
-            "num_reducers": num_reducers
-        })
+            "num_reducers": num_reducers,
+            "planner": planner,
+            "partitioner": partitioner,
+            "combiner_executable": combiner_executable,
+            "split_size": split_size,
+            "combine_size": combine_size,
+            "slow_start": slow_start,
+            "speculation": speculation,
+            "priority": priority,
+            "queue": queue,
+            "deadline": None if deadline is None else time.time() + deadline,
+            "cache": cache,
+            "incremental": incremental,
+        }
+        if stream is not None:
+            message.update({
+                "message_type": "new_streaming_job",
+                "interval": stream,
+                "batch_files": batch_files,
+                "keep_snapshots": keep_snapshots,
+            })
+        message = json.dumps(message)
 
     # Send the data to the port that Manager is on
     try:
@@ -106,6 +213,19 @@ def main(
         print("reducer executable  ", reducer_executable)
         print("num mappers         ", num_mappers)
         print("num reducers        ", num_reducers)
+        print("planner             ", planner)
+        print("partitioner         ", partitioner)
+        print("combiner executable ", combiner_executable)
+        print("split size          ", split_size)
+        print("combine size        ", combine_size)
+        print("slow start          ", slow_start)
+        print("speculation         ", speculation)
+        print("priority            ", priority)
+        print("queue               ", queue)
+        print("deadline            ", deadline)
+        print("cache               ", cache)
+        print("incremental         ", incremental)
+        print("stream              ", stream)
 
 
 if __name__ == "__main__":
@@ -1,2 +1,4 @@
 """MapReduce framework Utility."""
-from mapreduce.utils.network import listen_message
+from mapreduce.utils.network import listen_message, accept_message, Channel
+from mapreduce.utils.files import input_stream
+from mapreduce.utils.codec import encode, decode
@@ -0,0 +1,159 @@
+"""MapReduce framework Utility."""
+
+import os
+import json
+import struct
+
+
+# First byte of a binary payload, where JSON has "{"
+BINARY_VERSION = 1
+
+# Binary header: version, message type index, bitmap of fields present
+HEADER = struct.Struct("!BBH")
+INTEGER = struct.Struct("!q")
+LENGTH = struct.Struct("!I")
+
+# Fields of each message type with a binary form, in wire order, and
+# their kind: "i" integer, "s" string, "p" list of paths, "j" any JSON
+SCHEMAS = {
+    "register": (
+        ("worker_host", "s"), ("worker_port", "i"), ("slots", "i"),
+        ("memory", "i"), ("encoding", "s"),
+    ),
+    "register_ack": (("encoding", "s"),),
+    "shutdown": (),
+    "finished": (
+        ("task_id", "i"), ("worker_host", "s"), ("worker_port", "i"),
+        ("job_id", "i"), ("stage", "s"), ("combined", "j"),
+    ),
+    "new_map_task": (
+        ("task_id", "i"), ("input_paths", "p"), ("executable", "s"),
+        ("output_directory", "s"), ("num_partitions", "i"),
+        ("input_groups", "j"), ("input_splits", "j"), ("job_id", "i"),
+        ("stage", "s"), ("partitioner", "s"), ("combiner_executable", "s"),
+    ),
+    "new_reduce_task": (
+        ("task_id", "i"), ("executable", "s"), ("input_paths", "p"),
+        ("output_directory", "s"), ("job_id", "i"), ("stage", "s"),
+    ),
+    "new_merge_task": (
+        ("task_id", "i"), ("input_paths", "p"), ("output_directory", "s"),
+        ("job_id", "i"), ("stage", "s"),
+    ),
+    "cancel_task": (("task_id", "i"), ("job_id", "i"), ("stage", "s")),
+    "failed": (
+        ("task_id", "i"), ("worker_host", "s"), ("worker_port", "i"),
+        ("job_id", "i"), ("stage", "s"),
+    ),
+}
+MESSAGE_TYPES = list(SCHEMAS)
+
+
+def encode(message_dict, encoding="json"):
+    """Return the payload of a message in an encoding.
+
+    A message the binary encoding cannot carry, e.g. with a field its
+    schema lacks, is encoded as JSON instead.
+    """
+    if encoding == "binary":
+        try:
+            return encode_binary(message_dict)
+        except (KeyError, TypeError, AttributeError, OverflowError,
+                struct.error):
+            pass
+    return json.dumps(message_dict).encode("utf-8")
+
+
+def decode(payload):
+    """Return the message in a payload of either encoding."""
+    if payload[0] == BINARY_VERSION:
+        return decode_binary(payload)
+    return json.loads(payload)
+
+
+def encode_binary(message_dict):
+    """Return the binary payload of a message, raising if it has none."""
+    schema = SCHEMAS[message_dict["message_type"]]
+    present = 0
+    parts = [b""]
+    for bit, (field, kind) in enumerate(schema):
+        if field not in message_dict:
+            continue
+        present |= 1 << bit
+        value = message_dict[field]
+        if kind == "i":
+            if not isinstance(value, int) or isinstance(value, bool):
+                raise TypeError(f"{field} is not an integer")
+            parts.append(INTEGER.pack(value))
+        elif kind == "p":
+            parts.extend(encode_paths(value))
+        else:
+            parts.append(encode_string(
+                value if kind == "s" else json.dumps(value)
+            ))
+    if bin(present).count("1") != len(message_dict) - 1:
+        raise KeyError("Message has fields without a binary form")
+    parts[0] = HEADER.pack(BINARY_VERSION,
+                           MESSAGE_TYPES.index(message_dict["message_type"]),
+                           present)
+    return b"".join(parts)
+
+
+def decode_binary(payload):
+    """Return the message in a binary payload."""
+    _, type_index, present = HEADER.unpack_from(payload)
+    message_type = MESSAGE_TYPES[type_index]
+    message_dict = {"message_type": message_type}
+    offset = HEADER.size
+    for bit, (field, kind) in enumerate(SCHEMAS[message_type]):
+        if not present & (1 << bit):
+            continue
+        if kind == "i":
+            (message_dict[field],) = INTEGER.unpack_from(payload, offset)
+            offset += INTEGER.size
+        elif kind == "p":
+            message_dict[field], offset = decode_paths(payload, offset)
+        else:
+            value, offset = decode_string(payload, offset)
+            message_dict[field] = value if kind == "s" else json.loads(value)
+    return message_dict
+
+
+def encode_string(value):
+    """Return a length-prefixed UTF-8 string."""
+    data = value.encode("utf-8")
+    return LENGTH.pack(len(data)) + data
+
+
+def decode_string(payload, offset):
+    """Return the string at offset and the offset after it."""
+    (length,) = LENGTH.unpack_from(payload, offset)
+    start = offset + LENGTH.size
+    return bytes(payload[start:start + length]).decode("utf-8"), \
+        start + length
+
+
+def encode_paths(paths):
+    """Return a path list with the directory common to all paths interned.
+
+    The common directory is sent once and then the rest of each path, so
+    the many map outputs in a reduce task's shared tmpdir cost little
+    more than their file names.
+    """
+    common = os.path.commonprefix(paths)
+    prefix = common[:common.rfind("/") + 1]
+    return (
+        LENGTH.pack(len(paths)),
+        encode_string(prefix),
+        encode_string("\0".join([path[len(prefix):] for path in paths])),
+    )
+
+
+def decode_paths(payload, offset):
+    """Return the path list at offset and the offset after it."""
+    (count,) = LENGTH.unpack_from(payload, offset)
+    prefix, offset = decode_string(payload, offset + LENGTH.size)
+    names, offset = decode_string(payload, offset)
+    if not count:
+        return [], offset
+    return [prefix + name for name in names.split("\0")], offset
@@ -0,0 +1,72 @@
+"""MapReduce framework Utility."""
+
+import os
+import threading
+from contextlib import contextmanager
+
+
+# Largest chunk handed to one sendfile() call
+SEND_CHUNK = 1 << 20
+
+
+@contextmanager
+def input_stream(ranges):
+    """Yield a readable file with byte ranges one after another, for a stdin.
+
+    ranges is a list of (path, offset, length) and a length of None means
+    the whole file.  A single whole file is opened directly.  Otherwise a
+    helper thread streams the ranges into a pipe with sendfile(), so the
+    data is never copied to disk or through Python.
+    """
+    if len(ranges) == 1 and ranges[0][2] is None:
+        with open(ranges[0][0], "rb") as infile:
+            yield infile
+        return
+    read_fd, write_fd = os.pipe()
+    feeder = threading.Thread(target=send_ranges, args=(ranges, write_fd))
+    feeder.start()
+    try:
+        # Closing our read end unblocks the feeder if the reader quits
+        with open(read_fd, "rb") as reader:
+            yield reader
+    finally:
+        feeder.join()
+
+
+def send_ranges(ranges, out_fd):
+    """Write byte ranges of files to out_fd, then close it.
+
+    A newline is added after a range that does not end with one, so the
+    last line of one file never runs into the first line of the next.
+    """
+    try:
+        for path, offset, length in ranges:
+            with open(path, "rb") as infile:
+                if length is None:
+                    length = os.fstat(infile.fileno()).st_size - offset
+                send_range(infile.fileno(), offset, length, out_fd)
+                if length and len(ranges) > 1 and \
+                        os.pread(infile.fileno(), 1,
+                                 offset + length - 1) != b"\n":
+                    os.write(out_fd, b"\n")
+    except BrokenPipeError:
+        pass
+    finally:
+        os.close(out_fd)
+
+
+def send_range(in_fd, offset, length, out_fd):
+    """Write length bytes of in_fd starting at offset to out_fd."""
+    while length > 0:
+        count = min(length, SEND_CHUNK)
+        try:
+            sent = os.sendfile(out_fd, in_fd, offset, count)
+        except BrokenPipeError:
+            raise
+        except OSError:
+            # No sendfile() into pipes on this platform
+            sent = os.write(out_fd, os.pread(in_fd, count, offset))
+        if sent == 0:
+            break
+        offset += sent
+        length -= sent
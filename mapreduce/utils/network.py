@@ -1,6 +1,16 @@
 """MapReduce framework Utility."""
 
 import socket
+import struct
+import threading
+from mapreduce.utils.codec import encode, decode
+
+
+# First bytes sent on a persistent channel, never the start of JSON
+CHANNEL_MAGIC = b"MRC1"
+
+# Frame header: payload length in bytes
+FRAME_HEADER = struct.Struct("!I")
 
 
 def listen_message(clientsocket):
@@ -20,3 +30,110 @@ def listen_message(clientsocket):
     message_bytes = b''.join(message_chunks)
     message_str = message_bytes.decode("utf-8")
     return message_str
+
+
+def accept_message(clientsocket):
+    """Read a one-shot message or open a channel on an accepted socket.
+
+    Return (message_str, None) for a one-shot message, which ends when
+    the peer closes, and (None, channel) for a persistent channel.
+    """
+    message_chunks = []
+    received = b""
+    while len(received) < len(CHANNEL_MAGIC):
+        try:
+            data = clientsocket.recv(4096)
+        except socket.timeout:
+            continue
+        if not data:
+            break
+        message_chunks.append(data)
+        received = b"".join(message_chunks)
+    if received.startswith(CHANNEL_MAGIC):
+        return None, Channel(clientsocket, received[len(CHANNEL_MAGIC):])
+    if len(received) < len(CHANNEL_MAGIC):
+        clientsocket.close()
+        return received.decode("utf-8"), None
+    return received.decode("utf-8") + listen_message(clientsocket), None
+
+
+class Channel:
+    """A persistent connection carrying length-prefixed messages both ways.
+
+    Each frame is a 4-byte big-endian payload length followed by the
+    payload, so any number of messages share one connection.  Several
+    threads may send on a channel at once, and one thread receives.
+
+    Messages are sent in the channel's encoding, JSON until the two ends
+    agree on the binary one, and frames of either encoding are received.
+    """
+
+    def __init__(self, sock, received=b""):
+        """Wrap a connected socket, with bytes already read from it."""
+        self.sock = sock
+        self.lock = threading.Lock()
+        self.buffer = bytearray(received)
+        self.encoding = "json"
+
+    @classmethod
+    def connect(cls, host, port, timeout=1):
+        """Open a channel to a server."""
+        sock = socket.create_connection((host, port))
+        sock.settimeout(timeout)
+        sock.sendall(CHANNEL_MAGIC)
+        return cls(sock)
+
+    def send(self, message_dict):
+        """Send a message, raising OSError if the connection is gone."""
+        payload = encode(message_dict, self.encoding)
+        with self.lock:
+            self.sock.sendall(FRAME_HEADER.pack(len(payload)) + payload)
+
+    def receive(self):
+        """Return the next message, or None if the socket timed out first.
+
+        Raise ConnectionError once the peer closed the connection.
+        """
+        while True:
+            if len(self.buffer) >= FRAME_HEADER.size:
+                (size,) = FRAME_HEADER.unpack_from(self.buffer)
+                end = FRAME_HEADER.size + size
+                if len(self.buffer) >= end:
+                    payload = bytes(self.buffer[FRAME_HEADER.size:end])
+                    del self.buffer[:end]
+                    return decode(payload)
+            try:
+                data = self.sock.recv(1 << 16)
+            except socket.timeout:
+                return None
+            if not data:
+                raise ConnectionError("Channel closed by peer")
+            self.buffer.extend(data)
+
+    def serve(self, handle, signals):
+        """Pass each message to handle(message, channel) until shutdown.
+
+        Return when the connection is lost or on shutdown.
+        """
+        try:
+            while not signals["shutdown"]:
+                message = self.receive()
+                if message is not None:
+                    handle(message, self)
+        except (OSError, ValueError):
+            # Lost connection or a corrupt frame
+            pass
+        finally:
+            self.close()
+
+    def start(self, handle, signals):
+        """Serve the channel on a thread of its own and return the thread."""
+        self.sock.settimeout(1)
+        thread = threading.Thread(target=self.serve, args=(handle, signals),
+                                  name="channel")
+        thread.start()
+        return thread
+
+    def close(self):
+        """Close the connection."""
+        self.sock.close()
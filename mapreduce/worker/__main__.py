@@ -6,14 +6,16 @@ import time
 import socket
 import threading
 import tempfile
-import hashlib
 import subprocess
 import shutil
 import heapq
 from contextlib import ExitStack
-from functools import lru_cache
 import click
-from mapreduce.utils import listen_message
+from mapreduce.utils import listen_message, input_stream, Channel
+from mapreduce.worker.runner import TaskRunner
+from mapreduce.worker.partition import PARTITIONERS, partition_md5
+from mapreduce.worker.mapoutput import PartitionWriter, SortBuffer, \
+    read_blocks
 
 # 2. self.worker  is not inserted!
 # 3. I have infinite loop for the fault tolarance. WHY?
@@ -22,11 +24,22 @@ from mapreduce.utils import listen_message
 # Configure logging
 LOGGER = logging.getLogger(__name__)
 
+# Memory in MB each sort process may use, on Workers that advertise
+# their memory
+SORT_MEMORY = 256
+
 
 class Worker:
     """A class representing a Worker node in a MapReduce cluster."""
 
-    def __init__(self, host, port, manager_host, manager_port):
+    # Task message type to the name of the method that runs it
+    TASK_HANDLERS = {
+        "new_map_task": "mapper_worker",
+        "new_reduce_task": "reducer_worker",
+        "new_merge_task": "merger_worker",
+    }
+
+    def __init__(self, host, port, manager_host, manager_port, options=None):
         """Construct a Worker instance and start listening for messages."""
         LOGGER.info(
             "Starting worker host=%s port=%s pwd=%s",
@@ -39,17 +52,32 @@ class Worker:
 
         self.host = host
         self.port = port
-        self.manager_host = manager_host
-        self.manager_port = manager_port
-        self.signals = {"shutdown": False}
-        self.send_heartbeat = False
+        self.manager = (manager_host, manager_port)
+        # Task slots and memory in MB advertised to the Manager, the map
+        # sort buffer in MB, seconds between heartbeats, whether to talk
+        # over a persistent channel and the encoding wanted on it
+        self.options = {
+            "slots": 1,
+            "memory": None,
+            "sort_buffer": 0,
+            "heartbeat_interval": 2,
+            "persistent": False,
+            "encoding": "binary",
+            **(options or {}),
+        }
+        self.signals = {"shutdown": False, "heartbeat": False}
+        # The open channel to the Manager, if any
+        self.channel = None
+        # Runs tasks while the TCP thread keeps taking messages
+        self.runner = TaskRunner(self.options["slots"],
+                                 self.send_failed_message)
         thread_tcp_server = threading.Thread(target=self.worker_tcp_server)
         thread_tcp_server.name = "worker_thread"
         worker_udp_client = threading.Thread(target=self.worker_udp_client)
         thread_tcp_server.start()
         # while not self.signals["shutdown"]:
         while not self.signals["shutdown"]:
-            if self.send_heartbeat is True:
+            if self.signals["heartbeat"]:
                 worker_udp_client.start()
                 break
             time.sleep(0.1)
@@ -59,20 +87,24 @@ class Worker:
         if worker_udp_client.is_alive():
             worker_udp_client.join()
 
-    @lru_cache(maxsize=1024)
-    def hash_key(self, key):
-        """Cache and return the hash of the key."""
-        return int(hashlib.md5(key.encode("utf-8")).hexdigest(), base=16)
-
     def worker_tcp_server(self):
-        """Send a registration message to the Manager."""
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        """Accept messages, running tasks on the task runner's threads.
+
+        Tasks never run on this thread, so a shutdown or cancellation
+        arriving during a long task is acted on at once.
+        """
+        with self.runner, \
+                socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
             # Bind the socket to the server
             sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             sock.bind((self.host, self.port))
             sock.listen()
             sock.settimeout(1)
-            self.worker_tcp_ack()
+            channel_thread = threading.Thread(target=self.channel_loop)
+            if self.options["persistent"]:
+                channel_thread.start()
+            else:
+                self.worker_tcp_ack()
 
             while not self.signals["shutdown"]:
                 # Wait for a connection for 1s.
@@ -107,30 +139,64 @@ class Worker:
                     LOGGER.error("Failed to decode JSON message.")
                     continue
                 LOGGER.info(message_dict)
+                self.handle_message(message_dict)
+
+            if channel_thread.is_alive():
+                channel_thread.join()
 
-                if message_dict["message_type"] == "register_ack":
-                    # use a flag here
-                    self.send_heartbeat = True
-
-                elif message_dict["message_type"] == "shutdown":
-                    # if worker is busy, shutdown after running job
-                    print("Worker SHUTDOWN!")
-                    self.signals["shutdown"] = True
-                    break
-                #  else do work
-                elif message_dict["message_type"] == "new_map_task":
-                    self.mapper_worker(message_dict)
-                    self.send_finished_message(message_dict['task_id'])
-                elif message_dict["message_type"] == "new_reduce_task":
-                    self.reducer_worker(message_dict)
-                    self.send_finished_message(message_dict['task_id'])
+    def handle_message(self, message_dict):
+        """Act on a message from the Manager."""
+        if message_dict["message_type"] == "register_ack":
+            # use a flag here
+            self.signals["heartbeat"] = True
+            if self.channel is not None:
+                self.channel.encoding = message_dict.get("encoding", "json")
+
+        elif message_dict["message_type"] == "shutdown":
+            # Cancel running tasks and drop queued ones
+            print("Worker SHUTDOWN!")
+            self.signals["shutdown"] = True
+            self.runner.shutdown()
+        elif message_dict["message_type"] == "cancel_task":
+            self.runner.cancel(task_key(message_dict))
+        #  else do work
+        elif message_dict["message_type"] in self.TASK_HANDLERS:
+            self.runner.submit(task_key(message_dict), self.run_task,
+                               message_dict)
+
+    def channel_loop(self):
+        """Keep a channel to the Manager open, registering over each one."""
+        while not self.signals["shutdown"]:
+            try:
+                self.channel = Channel.connect(*self.manager)
+                self.channel.send({**self.register_message(),
+                                   "encoding": self.options["encoding"]})
+                LOGGER.info("Sent register message over a channel")
+            except OSError:
+                LOGGER.info("ConnectionRefusedError")
+                time.sleep(1)
+                continue
+            self.channel.serve(
+                lambda message, _: self.handle_message(message),
+                self.signals,
+            )
+            self.channel = None
+
+    def run_task(self, task):
+        """Run a task on a runner thread and report it finished."""
+        combined = getattr(self, self.TASK_HANDLERS[task["message_type"]])(
+            task
+        )
+        # A task cancelled as it ended reports nothing
+        self.runner.check()
+        self.send_finished_message(task, combined)
 
     def worker_udp_client(self):
-        """Send heartbeat every 2 seconds."""
+        """Send a heartbeat every heartbeat_interval seconds."""
         while not self.signals["shutdown"]:
             with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
                 # Connect to the UDP socket on server
-                sock.connect((self.manager_host, self.manager_port))
+                sock.connect(self.manager)
                 context = {
                         "message_type": "heartbeat",
                         "worker_host": self.host,
@@ -138,7 +204,8 @@ class Worker:
                 }
                 message = json.dumps(context)
                 sock.sendall(message.encode('utf-8'))
-                time.sleep(2)
+                # Wake at once on shutdown
+                self.runner.stopping.wait(self.options["heartbeat_interval"])
 
     def mapper_worker(self, map_task):
         """Send a registration message to the Manager."""
@@ -149,71 +216,174 @@ class Worker:
         # num_partitions = map_task['num_partitions']
         # create directory local to worker
         # prefix = f"mapreduce-local-task{task_id:05d}-"
-        partition_files = []
         with tempfile.TemporaryDirectory(
             prefix=f"mapreduce-local-task{map_task['task_id']:05d}-"
         ) as tmpdir, ExitStack() as stack:
             LOGGER.info("Created local tmpdir %s", tmpdir)
-            # partition_files = {}  # Track file descriptors
-            # run executable on each file
-            for i in range(map_task['num_partitions']):
-                partition_path = os.path.join(
-                                tmpdir,
-                                f"maptask{map_task['task_id']:05d}-part{i:05d}"
+            partition_paths = [
+                os.path.join(tmpdir,
+                             f"maptask{map_task['task_id']:05d}-part{i:05d}")
+                for i in range(map_task['num_partitions'])
+            ]
+            writer = self.partition_writer(map_task, partition_paths, stack)
+            # Wall time at the start and end of each phase
+            times = [time.perf_counter()]
+            # one mapper process per group of inputs
+            for group in self.input_groups(map_task):
+                self.runner.check()
+                with input_stream(group) as infile:
+                    self.map_input(map_task, infile, writer)
+            times.append(time.perf_counter())
+            writer.finish()
+
+            # Sort partitions side by side, then move them to the shared
+            # directory
+            if not self.options["sort_buffer"]:
+                self.runner.run_processes(
+                    [sort_command(path, self.options["memory"])
+                     for path in partition_paths],
+                    sort_processes(self.options),
                 )
-                partition_files.append(stack.enter_context
-                                       (open(partition_path,
-                                             'w', encoding="utf-8")))
-            for input_path in map_task['input_paths']:
-                # infile = stack.enter_context(
-                #     open(input_path, 'r', encoding='utf-8')
-                # )
-                with stack.enter_context(open(input_path, 'r',
-                                              encoding='utf-8')) as infile:
-                    with subprocess.Popen(
-                        [map_task['executable']],
-                        stdin=infile,
-                        stdout=subprocess.PIPE,
-                        text=True
-                    ) as process:  # TIME ISSUE
-                        for line in process.stdout:
-                            # partition
-                            # key = line.partition("\t")[0]
-                            partition_number = self.hash_key(
-                                line.partition("\t")[0]) % \
-                                    map_task['num_partitions']
-                            # partition_number = keyhash % map_task['num_part
-                            partition_files[partition_number].write(line)
-
-            for f in partition_files:
-                f.close()
-                # Sort and move files to shared directory
-            for partitionfiles in os.listdir(tmpdir):
-                file_path = os.path.join(tmpdir, partitionfiles)
-                # Sort file
-                subprocess.run(
-                    ['sort', '-o', file_path, file_path], check=True
+            times.append(time.perf_counter())
+            combined = None
+            if map_task.get("combiner_executable"):
+                combined = self.combine_partitions(
+                    map_task["combiner_executable"], partition_paths,
+                    writer.records,
                 )
-                # Move to shared directory
-                shutil.move(file_path, map_task['output_directory'])
-                # os.path.join(shared_dir, partitionfiles
+            times.append(time.perf_counter())
+            for file_path in partition_paths:
+                self.move_output(file_path, map_task['output_directory'])
+            times.append(time.perf_counter())
 
         LOGGER.info("Cleaned up tmpdir %s", tmpdir)
+        LOGGER.info("Map task %s took %.3f s: map %.3f s, sort %.3f s, "
+                    "combine %.3f s, move %.3f s", map_task['task_id'],
+                    times[4] - times[0], times[1] - times[0],
+                    times[2] - times[1], times[3] - times[2],
+                    times[4] - times[3])
+        return combined
 
-    def send_finished_message(self, task_id):
-        """Send a registration message to the Manager."""
+    def combine_partitions(self, combiner, paths, records):
+        """Run the combiner over each sorted partition file, in place.
+
+        Empty partitions are left alone.  Return the records and bytes
+        of the partitions before and after combining.
+        """
+        paths = [path for path in paths if os.path.getsize(path)]
+        combined = {
+            "records_in": records,
+            "bytes_in": sum(map(os.path.getsize, paths)),
+        }
+        self.runner.run_processes(combine_commands(combiner, paths),
+                                  sort_processes(self.options))
+        for path in paths:
+            os.replace(f"{path}.combined", path)
+        combined["records_out"] = sum(map(count_lines, paths))
+        combined["bytes_out"] = sum(map(os.path.getsize, paths))
+        LOGGER.info("Combined %d records, %d bytes into %d records, "
+                    "%d bytes", combined["records_in"], combined["bytes_in"],
+                    combined["records_out"], combined["bytes_out"])
+        return combined
+
+    def partition_writer(self, map_task, paths, stack):
+        """Return the writer of a map task's partitions to paths.
+
+        With a sort buffer, partitions are sorted in memory as they are
+        written, else they are written as they come for the sort command.
+        """
+        partition = PARTITIONERS.get(map_task.get("partitioner", "md5"),
+                                     partition_md5)
+        if self.options["sort_buffer"]:
+            return SortBuffer(paths, partition,
+                              self.options["sort_buffer"] << 20)
+        return PartitionWriter(
+            [stack.enter_context(open(path, 'wb')) for path in paths],
+            partition,
+        )
+
+    @staticmethod
+    def input_groups(map_task):
+        """Return the inputs of a map task grouped by mapper process."""
+        if "input_groups" in map_task:
+            return map_task["input_groups"]
+        if "input_splits" in map_task:
+            return [[split] for split in map_task["input_splits"]]
+        return [[[path, 0, None]] for path in map_task['input_paths']]
+
+    def map_input(self, map_task, infile, writer):
+        """Run the mapper on one input and partition its output.
+
+        The output is read as bytes, a block at a time, and never decoded.
+        """
+        with self.runner.popen(
+            [map_task['executable']],
+            stdin=infile,
+            stdout=subprocess.PIPE,
+        ) as process:
+            for lines in self.runner.watch(read_blocks(process.stdout)):
+                writer.write_lines(lines)
+
+    def send_finished_message(self, task, combined=None):
+        """Send a finished message for a task to the Manager.
+
+        A map task that ran a combiner reports its combined record and
+        byte counts.
+        """
+        finished_message = {
+            "message_type": "finished",
+            "task_id": task["task_id"],
+            "worker_host": self.host,
+            "worker_port": self.port,
+        }
+        # Multi-slot Workers tell tasks of different jobs apart
+        for key in ("job_id", "stage"):
+            if key in task:
+                finished_message[key] = task[key]
+        if combined is not None:
+            finished_message["combined"] = combined
+        self.send_task_message(finished_message)
+
+    def send_failed_message(self, key):
+        """Tell the Manager a task failed, so that it runs it again."""
+        job_id, stage, task_id = key
+        failed_message = {
+            "message_type": "failed",
+            "task_id": task_id,
+            "worker_host": self.host,
+            "worker_port": self.port,
+        }
+        if job_id is not None:
+            failed_message.update(job_id=job_id, stage=stage)
+        try:
+            self.send_task_message(failed_message)
+        except OSError as error:
+            LOGGER.error("Cannot report task %s failed: %s", key, error)
+
+    def send_task_message(self, message):
+        """Send a finished or failed message to the Manager.
+
+        The message goes over the channel if one is open, else over a
+        connection of its own.
+        """
+        message_type = message["message_type"]
+        channel = self.channel
+        if channel is not None:
+            try:
+                channel.send(message)
+                LOGGER.info("Sent '%s' message for task %s.", message_type,
+                            message["task_id"])
+                return
+            except OSError:
+                LOGGER.info("Channel lost, connecting to send '%s'",
+                            message_type)
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
             # Establish connection to the Manager's main socket
-            sock.connect((self.manager_host, self.manager_port))
-            finished_message = {
-                "message_type": "finished",
-                "task_id": task_id,
-                "worker_host": self.host,
-                "worker_port": self.port,
-            }
-            message_str = json.dumps(finished_message)
+            sock.connect(self.manager)
+            message_str = json.dumps(message)
             sock.sendall(message_str.encode('utf-8'))
-        LOGGER.info("Sent 'finished' message for task %s.", task_id)
+        LOGGER.info("Sent '%s' message for task %s.", message_type,
+                    message["task_id"])
 
     def reducer_worker(self, reduce_task):
         """Send a registration message to the Manager."""
@@ -234,39 +404,127 @@ class Worker:
                         open(file, encoding='utf-8')
                     )
                 )
-            part_num = input_paths[0][-5:]
-            output_path = os.path.join(tmpdir, f"part-{part_num}")
+            output_path = os.path.join(tmpdir, f"part-{task_id:05d}")
             with stack.enter_context(open(output_path, 'w',
                                           encoding="utf-8")) as output_file:
-                with subprocess.Popen(
+                with self.runner.popen(
                         [reduce_executable],
                         text=True,
                         stdin=subprocess.PIPE,
                         stdout=output_file
                 ) as reduce_process:  # TIME ISSUE
                     # Pipe input to reduce_process
-                    for line in heapq.merge(*input_files):
+                    for line in self.runner.watch(heapq.merge(*input_files)):
                         reduce_process.stdin.write(line)
-            shutil.move(output_path, reduce_task['output_directory'])
+            self.move_output(output_path, reduce_task['output_directory'])
 
         LOGGER.info("Cleaned up tmpdir %s", tmpdir)
 
+    def merger_worker(self, merge_task):
+        """Merge sorted partition files into one sorted run."""
+        task_id = merge_task["task_id"]
+        prefix = f"mapreduce-local-task{task_id:05d}-"
+        with tempfile.TemporaryDirectory(
+            prefix=prefix
+        ) as tmpdir, ExitStack() as stack:
+            LOGGER.info("Created local tmpdir %s", tmpdir)
+            input_files = [
+                stack.enter_context(open(file, encoding="utf-8"))
+                for file in merge_task["input_paths"]
+            ]
+            output_path = os.path.join(tmpdir, f"premerge-part{task_id:05d}")
+            with open(output_path, "w", encoding="utf-8") as output_file:
+                output_file.writelines(
+                    self.runner.watch(heapq.merge(*input_files))
+                )
+            self.move_output(output_path, merge_task["output_directory"])
+
+        LOGGER.info("Cleaned up tmpdir %s", tmpdir)
+
+    @staticmethod
+    def move_output(path, output_directory):
+        """Move a task output file into an existing output directory."""
+        if not os.path.isdir(output_directory):
+            # The Manager already dropped this merge or backup attempt
+            LOGGER.info("Discarded %s", path)
+            return
+        # Replace the output of an earlier run, e.g. before a Manager restart
+        shutil.move(path, os.path.join(output_directory,
+                                       os.path.basename(path)))
+
+    def register_message(self):
+        """Return the registration message of this Worker."""
+        message = {
+            "message_type": "register",
+            "worker_host": self.host,
+            "worker_port": self.port
+        }
+        if self.options["slots"] != 1:
+            message["slots"] = self.options["slots"]
+        if self.options["memory"]:
+            message["memory"] = self.options["memory"]
+        return message
+
     def worker_tcp_ack(self):
         """Send a registration message to the Manager."""
         try:
             with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-                sock.connect((self.manager_host, self.manager_port))
-                message = json.dumps({
-                    "message_type": "register",
-                    "worker_host": self.host,
-                    "worker_port": self.port
-                })
-                sock.sendall(message.encode('utf-8'))
+                sock.connect(self.manager)
+                message = self.register_message()
+                sock.sendall(json.dumps(message).encode('utf-8'))
                 LOGGER.info("Sent register message to Manager")
         except ConnectionRefusedError:
             LOGGER.info("ConnectionRefusedError")
 
 
+def sort_command(path, memory=None):
+    """Return the command sorting a partition file in place."""
+    if memory:
+        return ['sort', '-S', f'{SORT_MEMORY}M', '-o', path, path]
+    return ['sort', '-o', path, path]
+
+
+def combine_commands(combiner, paths):
+    """Yield the Popen arguments of the combiner over each partition file.
+
+    Each partition is combined into a new file next to it.  Both files
+    are closed once the next command is asked for, when the combiner
+    has its own copies.
+    """
+    for path in paths:
+        with open(path, "rb") as infile, \
+                open(f"{path}.combined", "wb") as outfile:
+            yield {"args": [combiner], "stdin": infile, "stdout": outfile}
+
+
+def count_lines(path):
+    """Return the number of lines in a file."""
+    with open(path, "rb") as infile:
+        return sum(block.count(b"\n")
+                   for block in iter(lambda: infile.read(1 << 20), b""))
+
+
+def sort_processes(options):
+    """Return how many sort processes a map task runs at once.
+
+    A Worker's cores, and its memory at SORT_MEMORY MB a sort if it
+    advertises its memory, are shared between its task slots.
+    """
+    processes = os.cpu_count() or 1
+    if options["memory"]:
+        processes = min(processes, options["memory"] // SORT_MEMORY)
+    return max(1, processes // options["slots"])
+
+
+def task_key(message_dict):
+    """Return the (job id, stage, task id) of a task or cancel message.
+
+    Single-slot Workers get neither job ids nor stages, which are None.
+    """
+    return (message_dict.get("job_id"), message_dict.get("stage"),
+            message_dict["task_id"])
+
+
 @click.command()
 @click.option("--host", "host", default="localhost")
 @click.option("--port", "port", default=6001)
@@ -274,7 +532,25 @@ class Worker:
 @click.option("--manager-port", "manager_port", default=6000)
 @click.option("--logfile", "logfile", default=None)
 @click.option("--loglevel", "loglevel", default="info")
-def main(host, port, manager_host, manager_port, logfile, loglevel):
+@click.option("--slots", "slots", default=1,
+              help="Number of tasks to run at once")
+@click.option("--memory", "memory", default=None, type=int,
+              help="Memory in MB to advertise to the Manager, which "
+              "also bounds the sort processes run at once")
+@click.option("--sort-buffer", "sort_buffer", default=0,
+              help="Sort map output in memory within this many MB per "
+              "task, spilling sorted runs past it, default=0 (sort "
+              "each partition with the sort command)")
+@click.option("--heartbeat-interval", "heartbeat_interval", default=2.0,
+              help="Seconds between heartbeats to the Manager")
+@click.option("--persistent", "persistent", is_flag=True,
+              help="Talk to the Manager over one persistent channel, "
+              "which needs a Manager started with --persistent")
+@click.option("--encoding", "encoding", default="binary",
+              type=click.Choice(["binary", "json"]),
+              help="Encoding of channel messages, json for debugging")
+def main(host, port, manager_host, manager_port, logfile, loglevel,
+         **options):
     """Run Worker."""
     if logfile:
         handler = logging.FileHandler(logfile)
@@ -285,7 +561,7 @@ def main(host, port, manager_host, manager_port, logfile, loglevel):
     root_logger = logging.getLogger()
     root_logger.addHandler(handler)
     root_logger.setLevel(loglevel.upper())
-    Worker(host, port, manager_host, manager_port)
+    Worker(host, port, manager_host, manager_port, options)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,190 @@
+"""MapReduce framework Worker map output.
+
+Mapper output stays bytes from the pipe to the partition files.  It is
+read in large blocks, split into lines and keys a block at a time, and
+appended to one buffer per partition, which is written out in a few
+large writes, or sorted in memory first.
+"""
+import os
+import heapq
+import itertools
+import collections
+from contextlib import ExitStack
+
+# Bytes read from a mapper's stdout at once
+BLOCK_SIZE = 1 << 15
+
+# Bytes buffered over all partitions before they are written out
+FLUSH_SIZE = 1 << 16
+
+# Bytes of lines whose partition a writer remembers, overhead included
+LINE_CACHE_SIZE = 1 << 22
+
+# Bytes a remembered line costs beyond its own, for the bytes object
+# and its dict entry
+CACHED_LINE_OVERHEAD = 85
+
+# Bytes a line costs in a sort buffer beyond its own, for the bytes
+# object and the list slot holding it
+LINE_OVERHEAD = 41
+
+# Lines joined into one write of sorted output
+WRITE_LINES = 4096
+
+
+def read_blocks(stream, block_size=BLOCK_SIZE):
+    """Yield the lines of a binary stream in lists, without newlines.
+
+    Each list holds the complete lines of one block.  A last line
+    without a newline is yielded on its own at the end.
+    """
+    tail = b""
+    while block := stream.read(block_size):
+        lines = (tail + block).split(b"\n")
+        tail = lines.pop()
+        if lines:
+            yield lines
+    if tail:
+        yield [tail]
+
+
+class PartitionWriter:
+    """Append lines to per-partition buffers and write them out in bulk."""
+
+    def __init__(self, files, partition):
+        """Construct a writer to binary files, one per partition.
+
+        partition is a batch partitioner from mapreduce.worker.partition.
+        """
+        self.files = files
+        self.partition = partition
+        self.buffers = [bytearray() for _ in files]
+        self.buffered = 0
+        self.records = 0
+        # Lines of the current block by partition
+        self.groups = [[] for _ in files]
+        # Group of each line seen lately, emptied when full, and the
+        # bytes they take.  Lines rather than keys, so a repeated line
+        # is not split again.
+        self.cache = {"groups": {}, "size": 0}
+
+    def write_lines(self, lines):
+        """Partition lines by their key, the text before the first tab."""
+        for buffer, group in zip(self.buffers, self.group(lines)):
+            if group:
+                start = len(buffer)
+                buffer += b"\n".join(group)
+                buffer += b"\n"
+                self.buffered += len(buffer) - start
+        if self.buffered >= FLUSH_SIZE:
+            self.flush()
+
+    def group(self, lines):
+        """Return the lines of each partition, in order.
+
+        The lists are the writer's own, refilled by the next call.
+        """
+        self.records += len(lines)
+        if len(self.files) == 1:
+            return [lines]
+        for group in self.groups:
+            group.clear()
+        self.learn(lines)
+        # Append each line to its group without a Python loop per line
+        collections.deque(map(list.append,
+                              map(self.cache["groups"].__getitem__, lines),
+                              lines), maxlen=0)
+        return self.groups
+
+    def learn(self, lines):
+        """Partition the lines not seen lately, in one batch."""
+        missing = set(itertools.filterfalse(
+            self.cache["groups"].__contains__, lines
+        ))
+        size = sum(map(len, missing)) + CACHED_LINE_OVERHEAD * len(missing)
+        if self.cache["size"] + size > LINE_CACHE_SIZE:
+            self.cache["groups"].clear()
+            self.cache["size"] = 0
+            missing = set(lines)
+            size = sum(map(len, missing)) + \
+                CACHED_LINE_OVERHEAD * len(missing)
+        self.cache["size"] += size
+        self.cache["groups"].update(zip(missing, map(
+            self.groups.__getitem__,
+            self.partition([line.partition(b"\t")[0] for line in missing],
+                           len(self.files)),
+        )))
+
+    def flush(self):
+        """Write out and empty every buffer."""
+        for outfile, buffer in zip(self.files, self.buffers):
+            outfile.write(buffer)
+            buffer.clear()
+        self.buffered = 0
+
+    def finish(self):
+        """Write out every buffer and close the files."""
+        self.flush()
+        for outfile in self.files:
+            outfile.close()
+
+
+class SortBuffer(PartitionWriter):
+    """Sort partitioned lines in memory, spilling sorted runs past a budget.
+
+    Each partition's lines stay in memory while all of them fit in the
+    budget, and finish() sorts and writes them once.  Past the budget,
+    every partition's lines are sorted and spilled as a run next to its
+    output, and finish() merges the runs.
+    """
+
+    def __init__(self, paths, partition, budget):
+        """Construct a buffer of budget bytes sorting into paths."""
+        super().__init__(paths, partition)
+        self.buffers = [[] for _ in paths]
+        self.budget = budget
+        # Spilled run paths of each partition
+        self.runs = [[] for _ in paths]
+
+    def write_lines(self, lines):
+        """Partition lines by their key, spilling if over budget."""
+        for buffer, group in zip(self.buffers, self.group(lines)):
+            buffer.extend(group)
+            self.buffered += sum(map(len, group)) + \
+                LINE_OVERHEAD * len(group)
+        if self.buffered >= self.budget:
+            self.flush()
+
+    def flush(self):
+        """Spill the lines of each partition as a sorted run."""
+        for path, buffer, runs in zip(self.files, self.buffers, self.runs):
+            if buffer:
+                runs.append(f"{path}.run{len(runs):05d}")
+                write_sorted(runs[-1], buffer)
+                buffer.clear()
+        self.buffered = 0
+
+    def finish(self):
+        """Write the sorted output of every partition."""
+        if not any(self.runs):
+            for path, buffer in zip(self.files, self.buffers):
+                write_sorted(path, buffer)
+                buffer.clear()
+            return
+        self.flush()
+        for path, runs in zip(self.files, self.runs):
+            with ExitStack() as stack, open(path, "wb") as outfile:
+                outfile.writelines(heapq.merge(*[
+                    stack.enter_context(open(run, "rb")) for run in runs
+                ]))
+            for run in runs:
+                os.remove(run)
+
+
+def write_sorted(path, lines):
+    """Sort lines in place and write them to a new file at path."""
+    lines.sort()
+    with open(path, "wb") as outfile:
+        for start in range(0, len(lines), WRITE_LINES):
+            outfile.write(b"\n".join(lines[start:start + WRITE_LINES]))
+            outfile.write(b"\n")
@@ -0,0 +1,71 @@
+"""MapReduce framework Worker partitioners.
+
+A partitioner takes a batch of keys, as bytes, and a partition count
+and returns the partition of each key.  Every mapper of a job must use the same
+partitioner, or one key would reach several reducers.
+"""
+import zlib
+import hashlib
+from functools import lru_cache
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Signs an integer key may start with
+SIGNS = (b"-", b"+")
+
+
+@lru_cache(maxsize=1024)
+def md5_hash(key):
+    """Cache and return the MD5 digest of a key as an integer.
+
+    The cache is keyed on the key alone and shared by every task, so
+    common keys such as frequent words are hashed once.
+    """
+    return int.from_bytes(hashlib.md5(key).digest(), "big")
+
+
+def partition_md5(keys, num_partitions):
+    """Partition by the MD5 digest of each key, the original scheme."""
+    return [md5_hash(key) % num_partitions for key in keys]
+
+
+def partition_crc32(keys, num_partitions):
+    """Partition by the CRC-32 of each key, cheaper than a digest."""
+    return [zlib.crc32(key) % num_partitions for key in keys]
+
+
+def partition_modulo(keys, num_partitions):
+    """Partition integer keys by their value modulo the partition count.
+
+    Adjacent integer keys spread evenly over the reducers.  Keys that
+    are not integers fall back to MD5.  Each key is told apart on its
+    own, never by the rest of its batch, so it has a single partition.
+    With NumPy, a batch of integer keys is partitioned in one
+    vectorised operation.
+    """
+    # Decimal digits with an optional sign, and nothing else int() or
+    # NumPy would also take, e.g. spaces, underscores or trailing NULs
+    integers = [
+        key.isdigit() or (key[1:].isdigit() and key[:1] in SIGNS)
+        for key in keys
+    ]
+    if numpy is not None and keys and all(integers):
+        try:
+            return (numpy.array(keys).astype(numpy.int64)
+                    % num_partitions).tolist()
+        except OverflowError:
+            pass
+    return [
+        (int(key) if integer else md5_hash(key)) % num_partitions
+        for key, integer in zip(keys, integers)
+    ]
+
+
+PARTITIONERS = {
+    "md5": partition_md5,
+    "crc32": partition_crc32,
+    "modulo": partition_modulo,
+}
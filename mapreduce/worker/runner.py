@@ -0,0 +1,193 @@
+"""MapReduce framework Worker task runner."""
+import os
+import signal
+import logging
+import threading
+import subprocess
+import contextlib
+import collections
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Configure logging
+LOGGER = logging.getLogger(__name__)
+
+# Items a task handles between checks for cancellation
+CHECK_EVERY = 4096
+
+
+class TaskCancelled(Exception):
+    """Raised in a task's thread once the task is cancelled."""
+
+
+class TaskRunner:
+    """Run tasks on a pool of one thread per slot and cancel them on request.
+
+    Tasks start their processes through the runner, which kills them
+    when the task is cancelled.  The task's thread then stops at its
+    next check, so even a long map task is dropped in milliseconds.
+    A task that fails otherwise is logged and passed to on_failure.
+    On exit, as a context manager, the runner cancels every task and
+    waits for their threads.
+    """
+
+    def __init__(self, slots, on_failure=None):
+        """Construct a runner of slots tasks at once.
+
+        on_failure, if given, is called with the key of each failed task.
+        """
+        self.executor = ThreadPoolExecutor(max_workers=slots,
+                                           thread_name_prefix="worker_task")
+        self.lock = threading.Lock()
+        # Queued and running tasks by key: their processes and whether
+        # they are cancelled
+        self.tasks = {}
+        # Task running on the current thread.  A new task may reuse its
+        # key once it is cancelled, so the thread holds the task itself.
+        self.local = threading.local()
+        # Set once the runner stops taking tasks
+        self.stopping = threading.Event()
+        self.on_failure = on_failure
+
+    def __enter__(self):
+        """Return the runner."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Cancel every task and wait for their threads."""
+        self.shutdown()
+        self.executor.shutdown(wait=True)
+
+    def submit(self, key, function, *args):
+        """Queue function(*args) as the task key, unless stopping."""
+        if self.stopping.is_set():
+            return
+        task = {"processes": [], "cancelled": False}
+        with self.lock:
+            self.tasks[key] = task
+        # Forget the task once it ran or was dropped from the queue
+        self.executor.submit(self.run, key, task, function, args) \
+            .add_done_callback(lambda future: self.done(key, task, future))
+
+    def run(self, key, task, function, args):
+        """Run a task on a pool thread unless it was cancelled first."""
+        self.local.task = task
+        try:
+            self.check()
+            function(*args)
+        except (TaskCancelled, OSError, ValueError,
+                subprocess.SubprocessError):
+            # A killed process or closed pipe is how most tasks notice
+            if not self.cancelled():
+                raise
+            LOGGER.info("Cancelled task %s", key)
+        finally:
+            self.local.task = None
+
+    def done(self, key, task, future):
+        """Drop a task that is done, unless its key was reused since.
+
+        Nobody else reads the task's future, so a failure is reported
+        here, before the task is dropped, or not at all.
+        """
+        try:
+            error = None if future.cancelled() else future.exception()
+            if error is not None:
+                LOGGER.error("Task %s failed", key, exc_info=error)
+                if self.on_failure is not None:
+                    self.on_failure(key)
+        finally:
+            with self.lock:
+                if self.tasks.get(key) is task:
+                    del self.tasks[key]
+
+    def cancelled(self):
+        """Return True if the task on the current thread is cancelled."""
+        task = getattr(self.local, "task", None)
+        with self.lock:
+            return task is not None and task["cancelled"]
+
+    def check(self):
+        """Raise TaskCancelled if the task on this thread is cancelled."""
+        if self.cancelled():
+            raise TaskCancelled()
+
+    def watch(self, iterable):
+        """Yield the items of iterable, checking for cancellation."""
+        for count, item in enumerate(iterable):
+            if count % CHECK_EVERY == 0:
+                self.check()
+            yield item
+
+    @contextlib.contextmanager
+    def popen(self, *args, **kwargs):
+        """Run a process of the current task, killed if it is cancelled.
+
+        The process leads a session of its own, so a cancelled task's
+        executable is killed together with any children it started,
+        which would otherwise hold its output pipe open.
+        """
+        with subprocess.Popen(*args, start_new_session=True,
+                              **kwargs) as process:
+            task = getattr(self.local, "task", None)
+            with self.lock:
+                if task is not None:
+                    task["processes"].append(process)
+                    if task["cancelled"]:
+                        kill(process)
+            yield process
+
+    def run_processes(self, commands, limit=1):
+        """Run processes of the current task, limit at once, in order.
+
+        Each command is the args of a process, or a dict of its Popen
+        keyword arguments.  Raise CalledProcessError if one fails, once
+        the others are done.
+        """
+        running = collections.deque()
+        with contextlib.ExitStack() as stack:
+            for command in commands:
+                if len(running) >= limit:
+                    wait_checked(running.popleft())
+                running.append(stack.enter_context(
+                    self.popen(**command) if isinstance(command, dict)
+                    else self.popen(command)
+                ))
+            for process in running:
+                wait_checked(process)
+
+    def cancel(self, key):
+        """Cancel a queued or running task, returning False if unknown."""
+        with self.lock:
+            task = self.tasks.get(key)
+            if task is None:
+                return False
+            task["cancelled"] = True
+            for process in task["processes"]:
+                kill(process)
+        LOGGER.info("Cancelling task %s", key)
+        return True
+
+    def shutdown(self):
+        """Cancel every task and stop taking new ones."""
+        self.stopping.set()
+        with self.lock:
+            keys = list(self.tasks)
+        for key in keys:
+            self.cancel(key)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def wait_checked(process):
+    """Wait for a process, raising CalledProcessError if it failed."""
+    if process.wait():
+        raise subprocess.CalledProcessError(process.returncode, process.args)
+
+
+def kill(process):
+    """Kill a running process and the rest of its process group."""
+    if process.poll() is None:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
@@ -38,6 +38,35 @@ MapReduceClient = collections.namedtuple("MapReduceClient", [
 @pytest.fixture(name='mapreduce_client')
 def setup_teardown_mapreduce_client():
     """Start a MapReduce Manager and Worker Servers in separate processes."""
+    yield from mapreduce_servers()
+
+
+@pytest.fixture(name='mapreduce_client_persistent')
+def setup_teardown_mapreduce_client_persistent():
+    """Start a Manager and Workers talking over persistent channels."""
+    yield from mapreduce_servers("--persistent")
+
+
+@pytest.fixture(name='mapreduce_client_asyncio',
+                params=[(), ("--persistent",)], ids=["one-shot", "persistent"])
+def setup_teardown_mapreduce_client_asyncio(request):
+    """Start a Manager running on an event loop, and Workers."""
+    yield from mapreduce_servers(*request.param,
+                                 manager_options=("--asyncio",))
+
+
+@pytest.fixture(name='mapreduce_client_sort_buffer')
+def setup_teardown_mapreduce_client_sort_buffer():
+    """Start a Manager and Workers sorting map output in memory."""
+    yield from mapreduce_servers(worker_options=("--sort-buffer", "1"))
+
+
+def mapreduce_servers(*options, manager_options=(), worker_options=()):
+    """Run a Manager and Workers with options, yielding a client.
+
+    The Manager alone also gets manager_options, and the Workers alone
+    worker_options.
+    """
     LOGGER.info("Setup test fixture 'mapreduce_client'")
 
     # Acquire open ports
@@ -60,6 +89,8 @@ def setup_teardown_mapreduce_client():
             shutil.which("mapreduce-manager"),
             "--port", str(manager_port),
             "--loglevel", loglevel,
+            *options,
+            *manager_options,
         ]))
         processes.append(process)
         wait_for_server_ready(process, manager_port)
@@ -72,6 +103,8 @@ def setup_teardown_mapreduce_client():
                 "--port", str(worker_port),
                 "--manager-port", str(manager_port),
                 "--loglevel", loglevel,
+                *options,
+                *worker_options,
             ]))
             processes.append(process)
             wait_for_server_ready(process, worker_port)
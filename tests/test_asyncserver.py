@@ -0,0 +1,124 @@
+"""Unit and integration tests for the Manager's event loop."""
+
+import json
+import types
+import asyncio
+import threading
+from pathlib import Path
+import utils
+from utils import TESTDATA_DIR
+from mapreduce.manager.asyncserver import AsyncServer, Connection
+
+
+def test_connection_order():
+    """Verify one-shot messages arrive in order and failures are reported."""
+    received = []
+    failures = []
+
+    async def receive(reader, writer):
+        received.append(json.loads(await reader.read()))
+        writer.close()
+
+    async def run():
+        server = await asyncio.start_server(receive, "localhost", 0)
+        port = server.sockets[0].getsockname()[1]
+        connection = Connection(
+            ("localhost", port), lambda *args: failures.append(args)
+        )
+        for task_id in range(3):
+            connection.send({"message_type": "new_map_task",
+                             "task_id": task_id})
+        await connection.finish()
+        while len(received) < 3:
+            await asyncio.sleep(0.01)
+        server.close()
+        await server.wait_closed()
+
+        # Nothing listens on the port any more
+        connection.send({"message_type": "shutdown"})
+        await connection.finish()
+        return connection
+
+    connection = asyncio.run(run())
+    assert [message["task_id"] for message in received] == [0, 1, 2]
+    assert len(failures) == 1
+    assert failures[0][:2] == (connection.worker_id, connection)
+
+
+def test_dispatch_yields():
+    """Verify a dispatch round that starts nothing lets the loop run.
+
+    The Manager claims work, e.g. a straggler its only free Worker may
+    not back up, but no round assigns any.
+    """
+    rounds = []
+    manager = types.SimpleNamespace(
+        signals={"shutdown": False},
+        event=threading.Condition(),
+        jobs={"running": {}},
+        has_work=lambda: True,
+        next_job=lambda: None,
+    )
+
+    def dispatch():
+        rounds.append(None)
+        # Give up on a dispatcher that never yields
+        if len(rounds) >= 1000:
+            manager.signals["shutdown"] = True
+        return []
+
+    manager.dispatch = dispatch
+    server = AsyncServer(manager)
+
+    async def run():
+        server.events = {"dispatch": asyncio.Event()}
+        dispatcher = asyncio.create_task(server.dispatch())
+        await asyncio.sleep(0.1)
+        manager.signals["shutdown"] = True
+        server.events["dispatch"].set()
+        await dispatcher
+
+    asyncio.run(run())
+    assert len(rounds) == 1
+
+
+def test_wordcount_asyncio(mapreduce_client_asyncio, tmp_path):
+    """Run a word count job while an unreachable Worker registers.
+
+    Note: 'mapreduce_client_asyncio' is a fixture function that starts a
+    fresh Manager on an event loop and Workers, over one-shot connections
+    and over persistent channels.  It is implemented in conftest.py.
+
+    Note: 'tmp_path' is a fixture provided by the pytest-mock package.  This
+    fixture creates a temporary directory for use within this test.  See
+    https://docs.pytest.org/en/6.2.x/tmpdir.html for more info.
+
+    """
+    # Nothing listens on this port, so the acknowledgment fails without
+    # holding up the other messages.
+    utils.send_message({
+        "message_type": "register",
+        "worker_host": "localhost",
+        "worker_port": utils.get_open_port(),
+    }, port=mapreduce_client_asyncio.manager_port)
+    utils.send_message({
+        "message_type": "new_manager_job",
+        "input_directory": TESTDATA_DIR/"input",
+        "output_directory": tmp_path,
+        "mapper_executable": TESTDATA_DIR/"exec/wc_map.sh",
+        "reducer_executable": TESTDATA_DIR/"exec/wc_reduce.sh",
+        "num_mappers": 4,
+        "num_reducers": 1,
+    }, port=mapreduce_client_asyncio.manager_port)
+
+    # Wait for output to be created
+    utils.wait_for_exists(f"{tmp_path}/part-00000")
+
+    # Verify final output file contents
+    outfile00 = Path(f"{tmp_path}/part-00000")
+    word_count_correct = Path(TESTDATA_DIR/"correct/word_count_correct.txt")
+    with outfile00.open(encoding="utf-8") as infile:
+        actual = sorted(infile.readlines())
+    with word_count_correct.open(encoding="utf-8") as infile:
+        correct = sorted(infile.readlines())
+    assert actual == correct
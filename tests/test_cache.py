@@ -0,0 +1,134 @@
+"""Unit tests for the Manager map output cache."""
+
+import os
+from mapreduce.manager.job import Job
+from mapreduce.manager.cache import MapCache, file_digest, task_key
+import utils
+
+
+def job_spec(job_id, input_directory, output_directory):
+    """Return the spec of a cached word count job."""
+    return utils.job_spec(job_id, output_directory,
+                          input_directory=str(input_directory),
+                          output_directory=str(output_directory),
+                          num_reducers=2, cache=True)
+
+
+def run_map_tasks(job):
+    """Finish every pending map task of a job with fake output."""
+    while (task := job.start_task()) is not None:
+        stage, task_id, attempt = task
+        for partition in range(2):
+            path = os.path.join(
+                job.tmpdir, f"maptask{task_id:05d}-part{partition:05d}"
+            )
+            with open(path, "w", encoding="utf-8") as outfile:
+                outfile.write(f"task{task_id}\t1\n")
+        job.finish(stage, task_id, attempt)
+
+
+def test_store_fetch_evict(tmp_path):
+    """Verify entries are linked in and out and evicted LRU first."""
+    tmpdir = tmp_path/"shared"
+    tmpdir.mkdir()
+    for task_id in range(3):
+        (tmpdir/f"maptask{task_id:05d}-part00000").write_text("x" * 10)
+
+    cache = MapCache(str(tmp_path/"cache"), budget=25)
+    cache.store("a", str(tmpdir), 0)
+    cache.store("b", str(tmpdir), 1)
+    assert cache.fetch("a", str(tmp_path), 7)
+    assert (tmp_path/"maptask00007-part00000").read_text() == "x" * 10
+
+    # "b" is least recently used now
+    cache.store("c", str(tmpdir), 2)
+    assert list(cache.entries) == ["a", "c"]
+    assert not cache.fetch("b", str(tmp_path), 8)
+    assert not (tmp_path/"cache"/"b").exists()
+
+    # A new Manager finds the entries left behind
+    assert list(MapCache(str(tmp_path/"cache"), budget=25).entries) == \
+        ["a", "c"]
+
+
+def test_task_key(tmp_path):
+    """Verify the key changes when an input file changes."""
+    path = tmp_path/"file01"
+    path.write_text("hello\n")
+    spec = job_spec(0, tmp_path, tmp_path/"output")
+    digest = file_digest(spec["mapper_executable"])
+    groups = [[(str(path), 0, 6)]]
+    key = task_key(spec, groups, digest)
+    assert task_key(spec, groups, digest) == key
+
+    os.utime(path, ns=(0, 0))
+    assert task_key(spec, groups, digest) != key
+    assert task_key({**spec, "num_reducers": 3}, groups, digest) != key
+
+
+def test_job_cache(tmp_path):
+    """Verify a rerun skips the map tasks of unchanged inputs."""
+    input_directory = tmp_path/"input"
+    input_directory.mkdir()
+    for name in ("file01", "file02"):
+        (input_directory/name).write_text(f"{name}\n")
+    cache = MapCache(str(tmp_path/"cache"), budget=1 << 20)
+
+    job = Job(job_spec(0, input_directory, tmp_path/"output0"), cache=cache)
+    job.start()
+    assert job.cache["misses"] == 2
+    run_map_tasks(job)
+    job.update()
+    assert job.stage == "reducing"
+    job.cleanup()
+
+    job = Job(job_spec(1, input_directory, tmp_path/"output1"), cache=cache)
+    job.start()
+    assert (job.cache["hits"], job.cache["misses"]) == (2, 0)
+    job.update()
+    assert job.stage == "reducing"
+    assert [
+        open(path, encoding="utf-8").read() for path in job.tasks.payload(1)
+    ] == ["task0\t1\n", "task1\t1\n"]
+    job.cleanup()
+
+    # Touching one input reruns only its map task
+    os.utime(input_directory/"file02", ns=(0, 0))
+    job = Job(job_spec(2, input_directory, tmp_path/"output2"), cache=cache)
+    job.start()
+    assert (job.cache["hits"], job.cache["misses"]) == (1, 1)
+    assert job.start_task() == ("mapping", 1, 1)
+    job.cleanup()
+
+
+def test_resume_cached(tmp_path):
+    """Verify a resumed job caches the map tasks it still had to run."""
+    input_directory = tmp_path/"input"
+    input_directory.mkdir()
+    for name in ("file01", "file02"):
+        (input_directory/name).write_text(f"{name}\n")
+    cache = MapCache(str(tmp_path/"cache"), budget=1 << 20)
+    job = Job(job_spec(0, input_directory, tmp_path/"output0"), cache=cache)
+    job.start()
+    run_map_tasks(job)
+    job.cleanup()
+
+    # The Manager dies while a changed input's map task runs
+    os.utime(input_directory/"file02", ns=(0, 0))
+    spec = job_spec(1, input_directory, tmp_path/"output1")
+    job = Job(spec, durable=True, cache=cache)
+    job.start()
+    assert job.start_task() == ("mapping", 1, 1)
+
+    # The resumed job still hits task 0 and runs task 1 again
+    resumed = Job(spec, durable=True, cache=cache)
+    resumed.resume(job.tmpdir, [])
+    assert (resumed.cache["hits"], resumed.cache["misses"]) == (1, 1)
+    run_map_tasks(resumed)
+    resumed.cleanup()
+
+    # Its output is cached, too
+    job = Job(job_spec(2, input_directory, tmp_path/"output2"), cache=cache)
+    job.start()
+    assert (job.cache["hits"], job.cache["misses"]) == (2, 0)
+    job.cleanup()
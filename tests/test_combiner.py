@@ -0,0 +1,73 @@
+"""Unit tests for the Worker's map-side combiner, and a job using one."""
+
+from pathlib import Path
+import utils
+from utils import TESTDATA_DIR
+from mapreduce.worker.runner import TaskRunner
+from mapreduce.worker.__main__ import combine_commands, count_lines
+
+
+def test_combine_commands(tmp_path):
+    """Verify each sorted partition is combined into a file next to it."""
+    partitions = [b"a\t1\na\t1\nb\t1\n", b"c\t1\nc\t2\nc\t1\n"]
+    paths = []
+    for index, data in enumerate(partitions):
+        paths.append(tmp_path/f"part{index}")
+        paths[-1].write_bytes(data)
+    with TaskRunner(1) as runner:
+        runner.run_processes(
+            combine_commands(TESTDATA_DIR/"exec/wc_sum.sh", paths), 2
+        )
+    assert [Path(f"{path}.combined").read_bytes() for path in paths] == \
+        [b"a\t2\nb\t1\n", b"c\t4\n"]
+    assert [count_lines(path) for path in paths] == [3, 3]
+
+
+def test_wordcount_combiner(mapreduce_client, tmp_path):
+    """Run a word count job combining map output before the shuffle.
+
+    Note: 'mapreduce_client' is a fixture function that starts a fresh Manager
+    and Workers.  It is implemented in conftest.py and reused by many tests.
+    Docs: https://docs.pytest.org/en/latest/fixture.html
+
+    Note: 'tmp_path' is a fixture provided by the pytest-mock package.  This
+    fixture creates a temporary directory for use within this test.  See
+    https://docs.pytest.org/en/6.2.x/tmpdir.html for more info.
+
+    """
+    # A combiner that leaves a mark of each run
+    combiner = tmp_path/"combine.sh"
+    combiner.write_text(
+        f"#!/bin/bash\necho >> {tmp_path/'runs'}\n"
+        f"exec {TESTDATA_DIR/'exec/wc_sum.sh'}\n",
+        encoding="utf-8",
+    )
+    combiner.chmod(0o755)
+    output_dir = tmp_path/"output"
+    utils.send_message({
+        "message_type": "new_manager_job",
+        "input_directory": TESTDATA_DIR/"input",
+        "output_directory": output_dir,
+        "mapper_executable": TESTDATA_DIR/"exec/wc_map.sh",
+        "reducer_executable": TESTDATA_DIR/"exec/wc_sum.sh",
+        "combiner_executable": combiner,
+        "num_mappers": 2,
+        "num_reducers": 2,
+    }, port=mapreduce_client.manager_port)
+
+    # Wait for output to be created
+    utils.wait_for_exists(
+        f"{output_dir}/part-00000",
+        f"{output_dir}/part-00001",
+    )
+    assert (tmp_path/"runs").exists()
+
+    # Verify final output file contents: counts of several mappers sum up
+    actual = []
+    for outfile in sorted(output_dir.iterdir()):
+        with outfile.open(encoding="utf-8") as infile:
+            actual.extend(infile.readlines())
+    word_count_correct = Path(TESTDATA_DIR/"correct/word_count_correct.txt")
+    with word_count_correct.open(encoding="utf-8") as infile:
+        correct = sorted(infile.readlines())
+    assert sorted(actual) == correct
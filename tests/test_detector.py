@@ -0,0 +1,52 @@
+"""Unit tests for the Manager failure detector."""
+
+from mapreduce.manager.detector import FailureDetector
+
+
+def test_expiry():
+    """Verify a Worker expires exactly one timeout after its last ping."""
+    detector = FailureDetector(10)
+    for worker_id, now in [("a", 0), ("b", 3)]:
+        detector.heartbeat(worker_id, now)
+        detector.watch(worker_id)
+        detector.watch(worker_id)
+    assert detector.wait_time(0) == 10
+
+    # Worker a pinged, so its entry is pushed again without waking later
+    detector.heartbeat("a", 8)
+    assert detector.expired(10) == []
+    assert detector.wait_time(10) == 3
+    assert detector.expired(13) == ["b"]
+    assert detector.expired(17.9) == []
+    assert detector.expired(18) == ["a"]
+    assert detector.wait_time(18) is None
+
+    # An expired Worker is watched again once it comes back
+    detector.heartbeat("b", 20)
+    detector.watch("b")
+    assert len(detector.expiries) == 1
+    assert detector.expired(30) == ["b"]
+
+
+def test_phi_accrual():
+    """Verify suspicion follows the learned heartbeat intervals."""
+    detector = FailureDetector(10, threshold=8)
+    now = 0
+    detector.heartbeat("a", now)
+    detector.watch("a")
+    assert detector.expiry("a") == 10
+
+    # Heartbeats every second, give or take 100ms
+    for interval in [1.1, 0.9] * 5:
+        now += interval
+        detector.heartbeat("a", now)
+    assert now + 1.1 < detector.expiry("a") < now + 2
+
+    # Learning moved the next check up from the fixed timeout
+    assert detector.wait_time(now) < 2
+    assert detector.expired(now + 1.2) == []
+    assert detector.expired(now + 2) == ["a"]
+
+    # A long outage is not an interval
+    detector.heartbeat("a", now + 60)
+    assert len(detector.intervals["a"]) == 10
@@ -0,0 +1,82 @@
+"""Unit tests for incremental jobs."""
+
+import os
+from mapreduce.manager.job import Job
+from mapreduce.manager.cache import MapCache
+import utils
+from utils import TESTDATA_DIR
+
+
+def job_spec(job_id, tmp_path):
+    """Return the spec of an incremental word count job."""
+    return utils.job_spec(job_id, tmp_path,
+                          input_directory=str(tmp_path/"input"),
+                          output_directory=str(tmp_path/"output"),
+                          incremental=True)
+
+
+def run_job(job):
+    """Start a job and finish its tasks, returning the reduce inputs.
+
+    Each map task writes the names of the files it read.
+    """
+    job.start()
+    map_tasks = []
+    while (task := job.start_task()) is not None:
+        stage, task_id, attempt = task
+        names = sorted(os.path.basename(path) for path in
+                       job.map_message(task_id,
+                                       job.tasks.payload(task_id))[
+                                           "input_paths"])
+        map_tasks.append(names)
+        path = os.path.join(job.tmpdir, f"maptask{task_id:05d}-part00000")
+        with open(path, "w", encoding="utf-8") as outfile:
+            outfile.writelines(f"{name}\n" for name in names)
+        job.finish(stage, task_id, attempt)
+    job.update()
+    assert job.stage == "reducing"
+    inputs = sorted(
+        line.strip() for path in job.tasks.payload(0)
+        for line in open(path, encoding="utf-8")
+    )
+    job.finish(*job.start_task())
+    job.update()
+    assert job.stage == "done"
+    return map_tasks, inputs
+
+
+def test_incremental(tmp_path):
+    """Verify a rerun maps only new, changed and affected files."""
+    (tmp_path/"input").mkdir()
+    for name in ("file01", "file02", "file03"):
+        (tmp_path/"input"/name).write_text(f"{name}\n")
+    cache = MapCache(str(tmp_path/"cache"), budget=1 << 20)
+    everything = ["file01", "file02", "file03"]
+
+    def rerun(job_id):
+        return run_job(Job(job_spec(job_id, tmp_path), cache=cache))
+
+    assert rerun(0) == ([["file01", "file03"], ["file02"]], everything)
+    assert rerun(1) == ([], everything)
+
+    # A new and a changed file are mapped, the rest is retained
+    (tmp_path/"input"/"file04").write_text("file04\n")
+    os.utime(tmp_path/"input"/"file02", ns=(0, 0))
+    assert rerun(2) == ([["file02"], ["file04"]], everything + ["file04"])
+
+    # Removing a file remaps the other files of its run
+    (tmp_path/"input"/"file01").unlink()
+    assert rerun(3) == ([["file03"]], ["file02", "file03", "file04"])
+    assert rerun(4) == ([], ["file02", "file03", "file04"])
+    runs = os.listdir(tmp_path/"cache"/".incremental")
+    assert len(runs) == 1
+    assert sorted(os.listdir(tmp_path/"cache"/".incremental"/runs[0])) == [
+        "manifest.json", "run00002-part00000", "run00003-part00000",
+        "run00004-part00000",
+    ]
+
+    # A new mapper discards the retained runs
+    spec = {**job_spec(5, tmp_path),
+            "mapper_executable": str(TESTDATA_DIR/"exec/wc_reduce.sh")}
+    assert run_job(Job(spec, cache=cache)) == \
+        ([["file02", "file04"], ["file03"]], ["file02", "file03", "file04"])
@@ -0,0 +1,159 @@
+"""See unit test function docstring."""
+
+from pathlib import Path
+import utils
+from utils import TESTDATA_DIR
+
+
+def test_wordcount_splits(mapreduce_client, tmp_path):
+    """Run a word count job over balanced, line-aligned input splits.
+
+    Note: 'mapreduce_client' is a fixture function that starts a fresh Manager
+    and Workers.  It is implemented in conftest.py and reused by many tests.
+    Docs: https://docs.pytest.org/en/latest/fixture.html
+
+    Note: 'tmp_path' is a fixture provided by the pytest-mock package.  This
+    fixture creates a temporary directory for use within this test.  See
+    https://docs.pytest.org/en/6.2.x/tmpdir.html for more info.
+
+    """
+    utils.send_message({
+        "message_type": "new_manager_job",
+        "input_directory": TESTDATA_DIR/"input",
+        "output_directory": tmp_path,
+        "mapper_executable": TESTDATA_DIR/"exec/wc_map.sh",
+        "reducer_executable": TESTDATA_DIR/"exec/wc_reduce.sh",
+        "num_mappers": 4,
+        "num_reducers": 2,
+        "planner": "balanced",
+        "split_size": 200,
+    }, port=mapreduce_client.manager_port)
+
+    # Wait for output to be created
+    utils.wait_for_exists(
+        f"{tmp_path}/part-00000",
+        f"{tmp_path}/part-00001",
+    )
+
+    # Verify final output file contents
+    actual = []
+    for outfile in sorted(tmp_path.iterdir()):
+        with outfile.open(encoding="utf-8") as infile:
+            actual.extend(infile.readlines())
+    word_count_correct = Path(TESTDATA_DIR/"correct/word_count_correct.txt")
+    with word_count_correct.open(encoding="utf-8") as infile:
+        correct = sorted(infile.readlines())
+    assert sorted(actual) == correct
+
+
+def test_wordcount_combined(mapreduce_client, tmp_path):
+    """Run a word count job with small input files packed together.
+
+    Note: 'mapreduce_client' is a fixture function that starts a fresh Manager
+    and Workers.  It is implemented in conftest.py and reused by many tests.
+    Docs: https://docs.pytest.org/en/latest/fixture.html
+
+    Note: 'tmp_path' is a fixture provided by the pytest-mock package.  This
+    fixture creates a temporary directory for use within this test.  See
+    https://docs.pytest.org/en/6.2.x/tmpdir.html for more info.
+
+    """
+    utils.send_message({
+        "message_type": "new_manager_job",
+        "input_directory": TESTDATA_DIR/"input",
+        "output_directory": tmp_path,
+        "mapper_executable": TESTDATA_DIR/"exec/wc_map.sh",
+        "reducer_executable": TESTDATA_DIR/"exec/wc_reduce.sh",
+        "num_mappers": 2,
+        "num_reducers": 1,
+        "combine_size": 1000,
+    }, port=mapreduce_client.manager_port)
+
+    # Wait for output to be created
+    utils.wait_for_exists(f"{tmp_path}/part-00000")
+
+    # Verify final output file contents
+    outfile00 = Path(f"{tmp_path}/part-00000")
+    word_count_correct = Path(TESTDATA_DIR/"correct/word_count_correct.txt")
+    with outfile00.open(encoding="utf-8") as infile:
+        actual = sorted(infile.readlines())
+    with word_count_correct.open(encoding="utf-8") as infile:
+        correct = sorted(infile.readlines())
+    assert actual == correct
+
+
+def test_wordcount_slow_start(mapreduce_client, tmp_path):
+    """Run a word count job that pre-merges map outputs while mapping.
+
+    Note: 'mapreduce_client' is a fixture function that starts a fresh Manager
+    and Workers.  It is implemented in conftest.py and reused by many tests.
+    Docs: https://docs.pytest.org/en/latest/fixture.html
+
+    Note: 'tmp_path' is a fixture provided by the pytest-mock package.  This
+    fixture creates a temporary directory for use within this test.  See
+    https://docs.pytest.org/en/6.2.x/tmpdir.html for more info.
+
+    """
+    utils.send_message({
+        "message_type": "new_manager_job",
+        "input_directory": TESTDATA_DIR/"input",
+        "output_directory": tmp_path,
+        "mapper_executable": TESTDATA_DIR/"exec/wc_map.sh",
+        "reducer_executable": TESTDATA_DIR/"exec/wc_reduce.sh",
+        "num_mappers": 8,
+        "num_reducers": 1,
+        "split_size": 100,
+        "slow_start": 0.25,
+    }, port=mapreduce_client.manager_port)
+
+    # Wait for output to be created
+    utils.wait_for_exists(f"{tmp_path}/part-00000")
+
+    # Verify final output file contents
+    outfile00 = Path(f"{tmp_path}/part-00000")
+    word_count_correct = Path(TESTDATA_DIR/"correct/word_count_correct.txt")
+    with outfile00.open(encoding="utf-8") as infile:
+        actual = sorted(infile.readlines())
+    with word_count_correct.open(encoding="utf-8") as infile:
+        correct = sorted(infile.readlines())
+    assert actual == correct
+
+
+def test_wordcount_speculation(mapreduce_client, tmp_path):
+    """Run a word count job that backs up every task still running.
+
+    Note: 'mapreduce_client' is a fixture function that starts a fresh Manager
+    and Workers.  It is implemented in conftest.py and reused by many tests.
+    Docs: https://docs.pytest.org/en/latest/fixture.html
+
+    Note: 'tmp_path' is a fixture provided by the pytest-mock package.  This
+    fixture creates a temporary directory for use within this test.  See
+    https://docs.pytest.org/en/6.2.x/tmpdir.html for more info.
+
+    """
+    utils.send_message({
+        "message_type": "new_manager_job",
+        "input_directory": TESTDATA_DIR/"input",
+        "output_directory": tmp_path,
+        "mapper_executable": TESTDATA_DIR/"exec/wc_map.sh",
+        "reducer_executable": TESTDATA_DIR/"exec/wc_reduce.sh",
+        "num_mappers": 4,
+        "num_reducers": 2,
+        "speculation": 0.001,
+    }, port=mapreduce_client.manager_port)
+
+    # Wait for output to be created
+    utils.wait_for_exists(
+        f"{tmp_path}/part-00000",
+        f"{tmp_path}/part-00001",
+    )
+
+    # Verify final output file contents, with no output of losing attempts
+    actual = []
+    for outfile in sorted(tmp_path.iterdir()):
+        with outfile.open(encoding="utf-8") as infile:
+            actual.extend(infile.readlines())
+    word_count_correct = Path(TESTDATA_DIR/"correct/word_count_correct.txt")
+    with word_count_correct.open(encoding="utf-8") as infile:
+        correct = sorted(infile.readlines())
+    assert sorted(actual) == correct
@@ -0,0 +1,59 @@
+"""Unit tests for the Manager job."""
+
+import os
+from mapreduce.manager.job import Job
+from utils import job_spec
+
+
+def write_map_output(job, task_id):
+    """Write the partition file of a map task."""
+    path = os.path.join(job.tmpdir, f"maptask{task_id:05d}-part00000")
+    with open(path, "w", encoding="utf-8") as outfile:
+        outfile.write(f"task{task_id}\t1\n")
+    return path
+
+
+def test_slow_start_done_tasks(tmp_path):
+    """Verify pre-merges read the output of finished map tasks alone.
+
+    A running map task's file may be in the tmpdir already, only partly
+    moved in.  The reducer must still read it in full.
+    """
+    job = Job(job_spec(0, tmp_path, num_mappers=3, slow_start=0.5))
+    job.start()
+    attempts = [job.start_task() for _ in range(3)]
+    paths = [write_map_output(job, task_id) for task_id in range(2)]
+    for attempt in attempts[:2]:
+        job.finish(*attempt)
+    unfinished = write_map_output(job, 2)
+
+    # Slow start merges tasks 0 and 1, not task 2
+    job.update()
+    assert job.tables["merging"].payload(0) == paths
+    merge = job.start_task()
+    assert merge[0] == "merging"
+    job.finish(*merge)
+
+    # The reducer reads task 2's file next to the merged run
+    job.finish(*attempts[2])
+    job.update()
+    assert job.stage == "reducing"
+    assert job.tasks.payload(0) == [
+        os.path.join(job.tmpdir, "premerge", "premerge-part00000"),
+        unfinished,
+    ]
+    job.cleanup()
+
+
+def test_resume_speculative(tmp_path):
+    """Verify a resumed job reuses the attempt numbers of its old run."""
+    job = Job(job_spec(0, tmp_path, speculation=1.5), durable=True)
+    job.start()
+    message = job.message(*job.start_task())
+    assert os.path.isdir(message["output_directory"])
+
+    # The Manager dies, leaving the attempt's directory behind
+    resumed = Job(job.spec, durable=True)
+    resumed.resume(job.tmpdir, [])
+    assert resumed.message(*resumed.start_task()) == message
+    resumed.cleanup()
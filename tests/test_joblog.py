@@ -0,0 +1,59 @@
+"""Unit tests for the Manager job log and job recovery."""
+
+from mapreduce.manager.job import Job
+from mapreduce.manager.joblog import JobLog
+from utils import job_spec
+
+
+def test_recover(tmp_path):
+    """Verify replay restores Workers, queued and running jobs."""
+    log = JobLog(tmp_path/"state")
+    log.append("register", worker_id=["localhost", 3001], slots=1,
+               memory=None)
+    for job_id in range(3):
+        log.append("submit", job_id=job_id, spec=job_spec(job_id, tmp_path))
+    log.append("start", job_id=0, tmpdir="/tmp/job0")
+    log.append("start", job_id=2, tmpdir="/tmp/job2")
+    log.append("finish", job_id=0, stage="mapping", task_id=1)
+    log.append("done", job_id=2)
+    with open(log.path, "a", encoding="utf-8") as outfile:
+        outfile.write('{"event": "fin')
+
+    expected = {
+        "workers": {("localhost", 3001): {"slots": 1, "memory": None}},
+        "queued": [job_spec(1, tmp_path)],
+        "running": [(job_spec(0, tmp_path), "/tmp/job0", [("mapping", 1)])],
+        "count": 3,
+    }
+    assert log.recover() == expected
+
+    # The compacted log drops the finished job but keeps job ids unique
+    assert len(log.records()) == 6
+    assert log.recover() == expected
+
+
+def test_resume(tmp_path):
+    """Verify a resumed job skips the tasks that finished before."""
+    tmpdir = tmp_path/"shared"
+    tmpdir.mkdir()
+    for task_id in range(2):
+        (tmpdir/f"maptask{task_id:05d}-part00000").touch()
+
+    job = Job(job_spec(0, tmp_path), durable=True)
+    job.resume(str(tmpdir), [("mapping", 1)])
+    assert job.stage == "mapping"
+    assert job.start_task() == ("mapping", 0, 1)
+
+    job = Job(job_spec(0, tmp_path), durable=True)
+    job.resume(str(tmpdir), [("mapping", 1), ("mapping", 0)])
+    assert job.stage == "reducing"
+    assert job.tasks.payload(0) == [
+        f"{tmpdir}/maptask00000-part00000",
+        f"{tmpdir}/maptask00001-part00000",
+    ]
+
+    job = Job(job_spec(0, tmp_path), durable=True)
+    job.resume(str(tmpdir), [("mapping", 1), ("mapping", 0),
+                             ("reducing", 0)])
+    assert job.stage == "done"
+    assert not tmpdir.exists()
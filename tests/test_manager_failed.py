@@ -0,0 +1,230 @@
+"""See unit test function docstring."""
+
+import json
+import tempfile
+import threading
+import mapreduce
+from mapreduce.manager.__main__ import TASK_ATTEMPTS
+from mapreduce.manager.joblog import JobLog
+import utils
+from utils import TESTDATA_DIR
+
+
+def worker_message_generator(mock_sendall, tmp_path):
+    """Fake Worker messages."""
+    # Worker register
+    yield json.dumps({
+        "message_type": "register",
+        "worker_host": "localhost",
+        "worker_port": 3001,
+    }).encode("utf-8")
+    yield None
+
+    # User submits new job
+    yield json.dumps({
+        "message_type": "new_manager_job",
+        "input_directory": TESTDATA_DIR/"input",
+        "output_directory": tmp_path,
+        "mapper_executable": TESTDATA_DIR/"exec/wc_map.sh",
+        "reducer_executable": TESTDATA_DIR/"exec/wc_reduce.sh",
+        "num_mappers": 1,
+        "num_reducers": 1
+    }, cls=utils.PathJSONEncoder).encode("utf-8")
+    yield None
+
+    # The map task fails, so it comes back to the Worker, which finishes
+    # it the second time
+    for num, message_type in ((1, "failed"), (2, "finished")):
+        for _ in utils.wait_for_map_messages(mock_sendall, num=num):
+            yield None
+        yield json.dumps({
+            "message_type": message_type,
+            "task_id": 0,
+            "worker_host": "localhost",
+            "worker_port": 3001,
+        }).encode("utf-8")
+        yield None
+
+    # Wait for Manager to send reduce message
+    for _ in utils.wait_for_reduce_messages(mock_sendall, num=1):
+        yield None
+
+    # Shutdown
+    yield json.dumps({
+        "message_type": "shutdown",
+    }).encode("utf-8")
+    yield None
+
+
+def test_failed_task(mocker, tmp_path):
+    """Verify Manager runs a task again once a Worker reports it failed.
+
+    Note: 'mocker' is a fixture function provided by the pytest-mock package.
+    This fixture lets us override a library function with a temporary fake
+    function that returns a hardcoded value while testing.
+
+    See https://github.com/pytest-dev/pytest-mock/ for more info.
+
+    Note: 'tmp_path' is a fixture provided by the pytest-mock package.
+    This fixture creates a temporary directory for use within this test.
+
+    See https://docs.pytest.org/en/6.2.x/tmpdir.html for more info.
+    """
+    # Mock the socket library socket class
+    mock_socket = mocker.patch("socket.socket")
+
+    # sendall() records messages
+    mock_sendall = mock_socket.return_value.__enter__.return_value.sendall
+
+    # accept() returns a mock client socket
+    mock_clientsocket = mocker.MagicMock()
+    mock_accept = mock_socket.return_value.__enter__.return_value.accept
+    mock_accept.return_value = (mock_clientsocket, ("127.0.0.1", 10000))
+
+    # TCP recv() returns values generated by worker_message_generator()
+    mock_recv = mock_clientsocket.recv
+    mock_recv.side_effect = worker_message_generator(mock_sendall, tmp_path)
+
+    # UDP recv() returns heartbeat messages
+    mock_udp_recv = mock_socket.return_value.__enter__.return_value.recv
+    mock_udp_recv.side_effect = utils.worker_heartbeat_generator(3001)
+
+    # Set the location where the Manager's temporary directory
+    # will be created.
+    tempfile.tempdir = tmp_path
+
+    # Run student Manager code.  When student Manager calls recv(), it will
+    # return the faked responses configured above.
+    try:
+        mapreduce.manager.Manager("localhost", 6000)
+        assert threading.active_count() == 1, "Failed to shutdown threads"
+    except SystemExit as error:
+        assert error.code == 0
+
+    # The map task ran twice before the reduce task
+    messages = utils.filter_not_heartbeat_messages(
+        utils.get_messages(mock_sendall)
+    )
+    tasks = [
+        (message["message_type"], message["task_id"])
+        for message in messages
+        if utils.is_map_message(message) or utils.is_reduce_message(message)
+    ]
+    assert tasks == [
+        ("new_map_task", 0),
+        ("new_map_task", 0),
+        ("new_reduce_task", 0),
+    ]
+
+
+def failing_message_generator(mock_sendall, tmp_path):
+    """Fake Worker messages."""
+    # Worker register
+    yield json.dumps({
+        "message_type": "register",
+        "worker_host": "localhost",
+        "worker_port": 3001,
+    }).encode("utf-8")
+    yield None
+
+    # User submits two jobs, the second waits for the first
+    for job_id in range(2):
+        yield json.dumps({
+            "message_type": "new_manager_job",
+            "input_directory": TESTDATA_DIR/"input",
+            "output_directory": tmp_path/f"output{job_id}",
+            "mapper_executable": TESTDATA_DIR/"exec/wc_map.sh",
+            "reducer_executable": TESTDATA_DIR/"exec/wc_reduce.sh",
+            "num_mappers": 1,
+            "num_reducers": 1
+        }, cls=utils.PathJSONEncoder).encode("utf-8")
+        yield None
+
+    # The first job's map task fails every time
+    for num in range(1, TASK_ATTEMPTS + 1):
+        for _ in utils.wait_for_map_messages(mock_sendall, num=num):
+            yield None
+        yield json.dumps({
+            "message_type": "failed",
+            "task_id": 0,
+            "worker_host": "localhost",
+            "worker_port": 3001,
+        }).encode("utf-8")
+        yield None
+
+    # The second job starts
+    for _ in utils.wait_for_map_messages(mock_sendall,
+                                         num=TASK_ATTEMPTS + 1):
+        yield None
+
+    # Shutdown
+    yield json.dumps({
+        "message_type": "shutdown",
+    }).encode("utf-8")
+    yield None
+
+
+def test_failed_job(mocker, tmp_path):
+    """Verify a task failing too often fails its job, and the next runs.
+
+    Note: 'mocker' is a fixture function provided by the pytest-mock package.
+    This fixture lets us override a library function with a temporary fake
+    function that returns a hardcoded value while testing.
+
+    See https://github.com/pytest-dev/pytest-mock/ for more info.
+
+    Note: 'tmp_path' is a fixture provided by the pytest-mock package.
+    This fixture creates a temporary directory for use within this test.
+
+    See https://docs.pytest.org/en/6.2.x/tmpdir.html for more info.
+    """
+    # Mock the socket library socket class
+    mock_socket = mocker.patch("socket.socket")
+
+    # sendall() records messages
+    mock_sendall = mock_socket.return_value.__enter__.return_value.sendall
+
+    # accept() returns a mock client socket
+    mock_clientsocket = mocker.MagicMock()
+    mock_accept = mock_socket.return_value.__enter__.return_value.accept
+    mock_accept.return_value = (mock_clientsocket, ("127.0.0.1", 10000))
+
+    # TCP recv() returns values generated by failing_message_generator()
+    mock_recv = mock_clientsocket.recv
+    mock_recv.side_effect = failing_message_generator(mock_sendall, tmp_path)
+
+    # UDP recv() returns heartbeat messages
+    mock_udp_recv = mock_socket.return_value.__enter__.return_value.recv
+    mock_udp_recv.side_effect = utils.worker_heartbeat_generator(3001)
+
+    # Set the location where the Manager's temporary directory
+    # will be created.
+    tempfile.tempdir = tmp_path
+
+    # Run student Manager code.  When student Manager calls recv(), it will
+    # return the faked responses configured above.
+    try:
+        mapreduce.manager.Manager("localhost", 6000, {
+            "state_dir": str(tmp_path/"state"),
+        })
+        assert threading.active_count() == 1, "Failed to shutdown threads"
+    except SystemExit as error:
+        assert error.code == 0
+
+    # The first job's map task ran TASK_ATTEMPTS times, then the second
+    # job's map task ran in a tmpdir of its own
+    messages = utils.filter_not_heartbeat_messages(
+        utils.get_messages(mock_sendall)
+    )
+    tmpdirs = [
+        message["output_directory"]
+        for message in messages if utils.is_map_message(message)
+    ]
+    assert len(tmpdirs) == TASK_ATTEMPTS + 1
+    assert len(set(tmpdirs[:TASK_ATTEMPTS])) == 1
+    assert tmpdirs[-1] != tmpdirs[0]
+
+    # The first job's tmpdir is gone, and its failure is in the job log
+    assert not (tmp_path/tmpdirs[0]).exists()
+    assert {"event": "failed", "job_id": 0} in \
+        JobLog(tmp_path/"state").records()
@@ -0,0 +1,138 @@
+"""See unit test function docstring."""
+
+import json
+import tempfile
+import threading
+import mapreduce
+import utils
+from utils import TESTDATA_DIR
+
+
+def worker_message_generator(mock_sendall, tmp_path):
+    """Fake Worker messages."""
+    # Worker register
+    yield json.dumps({
+        "message_type": "register",
+        "worker_host": "localhost",
+        "worker_port": 3001,
+    }).encode("utf-8")
+    yield None
+
+    # User submits a low priority batch job
+    yield json.dumps({
+        "message_type": "new_manager_job",
+        "input_directory": TESTDATA_DIR/"input",
+        "output_directory": tmp_path/"output0",
+        "mapper_executable": TESTDATA_DIR/"exec/wc_map.sh",
+        "reducer_executable": TESTDATA_DIR/"exec/wc_reduce.sh",
+        "num_mappers": 2,
+        "num_reducers": 1,
+    }, cls=utils.PathJSONEncoder).encode("utf-8")
+    yield None
+
+    # Wait for Manager to send first map message
+    for _ in utils.wait_for_map_messages(mock_sendall, num=1):
+        yield None
+
+    # User submits two high priority jobs while the only Worker is busy
+    for job_id in (1, 2):
+        yield json.dumps({
+            "message_type": "new_manager_job",
+            "input_directory": TESTDATA_DIR/"input",
+            "output_directory": tmp_path/f"output{job_id}",
+            "mapper_executable": TESTDATA_DIR/"exec/wc_map.sh",
+            "reducer_executable": TESTDATA_DIR/"exec/wc_reduce.sh",
+            "num_mappers": 1,
+            "num_reducers": 1,
+            "priority": 5,
+        }, cls=utils.PathJSONEncoder).encode("utf-8")
+        yield None
+
+    # Status finished message from first map task
+    yield json.dumps({
+        "message_type": "finished",
+        "task_id": 0,
+        "worker_host": "localhost",
+        "worker_port": 3001,
+    }).encode("utf-8")
+    yield None
+
+    # The freed Worker gets the high priority job, not the next batch task
+    for _ in utils.wait_for_map_messages(mock_sendall, num=2):
+        yield None
+
+    # Shutdown
+    yield json.dumps({
+        "message_type": "shutdown",
+    }).encode("utf-8")
+    yield None
+
+
+def test_priority_preempt(mocker, tmp_path):
+    """Verify a high priority job overtakes the queued tasks of a batch job.
+
+    Note: 'mocker' is a fixture function provided by the pytest-mock package.
+    This fixture lets us override a library function with a temporary fake
+    function that returns a hardcoded value while testing.
+
+    See https://github.com/pytest-dev/pytest-mock/ for more info.
+
+    Note: 'tmp_path' is a fixture provided by the pytest-mock package.
+    This fixture creates a temporary directory for use within this test.
+
+    See https://docs.pytest.org/en/6.2.x/tmpdir.html for more info.
+    """
+    # Mock the socket library socket class
+    mock_socket = mocker.patch("socket.socket")
+
+    # sendall() records messages
+    mock_sendall = mock_socket.return_value.__enter__.return_value.sendall
+
+    # connect() records message destinations
+    mock_connect = mock_socket.return_value.__enter__.return_value.connect
+
+    # accept() returns a mock client socket
+    mock_clientsocket = mocker.MagicMock()
+    mock_accept = mock_socket.return_value.__enter__.return_value.accept
+    mock_accept.return_value = (mock_clientsocket, ("127.0.0.1", 10000))
+
+    # TCP recv() returns values generated by worker_message_generator()
+    mock_recv = mock_clientsocket.recv
+    mock_recv.side_effect = worker_message_generator(mock_sendall, tmp_path)
+
+    # UDP recv() returns heartbeat messages
+    mock_udp_recv = mock_socket.return_value.__enter__.return_value.recv
+    mock_udp_recv.side_effect = utils.worker_heartbeat_generator(3001)
+
+    # Set the location where the Manager's temporary directory
+    # will be created.
+    tempfile.tempdir = tmp_path
+
+    # Spy on tempfile.TemporaryDirectory so that we can determine the names
+    # of the directories that were created.
+    mock_tmpdir = mocker.spy(tempfile.TemporaryDirectory, "__init__")
+
+    # Run student Manager code.  When student Manager calls recv(), it will
+    # return the faked responses configured above.
+    try:
+        mapreduce.manager.Manager("localhost", 6000, {
+            "scheduler": "priority",
+            "preempt": True,
+        })
+        assert threading.active_count() == 1, "Failed to shutdown threads"
+    except SystemExit as error:
+        assert error.code == 0
+
+    # With max_jobs 1, preemption started the second job right away, and
+    # the third waits as the first job makes room for one job only
+    assert mock_tmpdir.call_count == 2
+    messages = utils.get_messages_with_destinations(mock_sendall, mock_connect)
+    map_messages = [
+        (message["task_id"], message["output_directory"])
+        for message, _ in messages
+        if utils.is_map_message(message)
+    ]
+    assert map_messages == [
+        (0, utils.get_tmpdir_name(mock_tmpdir, 0)),
+        (0, utils.get_tmpdir_name(mock_tmpdir, 1)),
+    ]
@@ -0,0 +1,186 @@
+"""See unit test function docstring."""
+
+import os
+import json
+import tempfile
+import threading
+import mapreduce
+from mapreduce.manager.joblog import JobLog
+from mapreduce.manager.incremental import Manifest
+import utils
+from utils import TESTDATA_DIR
+
+
+def is_task_message(message):
+    """Return True if message starts a map or reduce task."""
+    return utils.is_map_message(message) or utils.is_reduce_message(message)
+
+
+def worker_message_generator(mock_sendall):
+    """Fake Worker messages."""
+    # The Worker registered with the Manager before it restarted, so it
+    # only sends heartbeats.  Wait for the resumed job's first task.
+    for _ in utils.wait_for_messages(is_task_message, mock_sendall, num=1):
+        yield None
+
+    # Shutdown
+    yield json.dumps({
+        "message_type": "shutdown",
+    }).encode("utf-8")
+    yield None
+
+
+def restart_manager(mocker, tmp_path, options):
+    """Run a Manager over its job log, returning the tasks it sent.
+
+    Each task is a (message, destination) pair.
+    """
+    # Mock the socket library socket class
+    mock_socket = mocker.patch("socket.socket")
+
+    # sendall() records messages
+    mock_sendall = mock_socket.return_value.__enter__.return_value.sendall
+
+    # connect() records message destinations
+    mock_connect = mock_socket.return_value.__enter__.return_value.connect
+
+    # accept() returns a mock client socket
+    mock_clientsocket = mocker.MagicMock()
+    mock_accept = mock_socket.return_value.__enter__.return_value.accept
+    mock_accept.return_value = (mock_clientsocket, ("127.0.0.1", 10000))
+
+    # TCP recv() returns values generated by worker_message_generator()
+    mock_recv = mock_clientsocket.recv
+    mock_recv.side_effect = worker_message_generator(mock_sendall)
+
+    # UDP recv() returns heartbeat messages
+    mock_udp_recv = mock_socket.return_value.__enter__.return_value.recv
+    mock_udp_recv.side_effect = utils.worker_heartbeat_generator(3001)
+
+    # Set the location where the Manager's temporary directory
+    # will be created.
+    tempfile.tempdir = tmp_path
+
+    # Run student Manager code.  When student Manager calls recv(), it will
+    # return the faked responses configured above.
+    try:
+        mapreduce.manager.Manager("localhost", 6000, options)
+        assert threading.active_count() == 1, "Failed to shutdown threads"
+    except SystemExit as error:
+        assert error.code == 0
+
+    messages = utils.get_messages_with_destinations(mock_sendall, mock_connect)
+    return [
+        (message, destination["destination"])
+        for message, destination in messages
+        if is_task_message(message)
+    ]
+
+
+def test_recovery(mocker, tmp_path):
+    """Verify a restarted Manager resumes a job from its job log.
+
+    Note: 'mocker' is a fixture function provided by the pytest-mock package.
+    This fixture lets us override a library function with a temporary fake
+    function that returns a hardcoded value while testing.
+
+    See https://github.com/pytest-dev/pytest-mock/ for more info.
+
+    Note: 'tmp_path' is a fixture provided by the pytest-mock package.
+    This fixture creates a temporary directory for use within this test.
+
+    See https://docs.pytest.org/en/6.2.x/tmpdir.html for more info.
+    """
+    # Log of a Manager that died after both map tasks finished
+    tmpdir = tmp_path/"mapreduce-shared-job00000-abcdefgh"
+    tmpdir.mkdir()
+    for task_id in range(2):
+        (tmpdir/f"maptask{task_id:05d}-part00000").touch()
+    log = JobLog(tmp_path/"state")
+    log.append("register", worker_id=["localhost", 3001], slots=1,
+               memory=None)
+    log.append("submit", job_id=0, spec=utils.job_spec(
+        0, tmp_path, output_directory=str(tmp_path/"output")
+    ))
+    log.append("start", job_id=0, tmpdir=str(tmpdir))
+    for task_id in range(2):
+        log.append("finish", job_id=0, stage="mapping", task_id=task_id)
+
+    tasks = restart_manager(mocker, tmp_path, {
+        "state_dir": str(tmp_path/"state"),
+    })
+
+    # The Worker's heartbeat brought it back, and it got the reduce task
+    # without any map task running again
+    assert tasks == [({
+        "message_type": "new_reduce_task",
+        "task_id": 0,
+        "executable": str(TESTDATA_DIR/"exec/wc_reduce.sh"),
+        "input_paths": [
+            f"{tmpdir}/maptask00000-part00000",
+            f"{tmpdir}/maptask00001-part00000",
+        ],
+        "output_directory": str(tmp_path/"output"),
+    }, ("localhost", 3001))]
+
+
+def test_recovery_incremental(mocker, tmp_path):
+    """Verify a resumed incremental job maps only the files it did before.
+
+    Note: 'mocker' is a fixture function provided by the pytest-mock package.
+    This fixture lets us override a library function with a temporary fake
+    function that returns a hardcoded value while testing.
+
+    See https://github.com/pytest-dev/pytest-mock/ for more info.
+
+    Note: 'tmp_path' is a fixture provided by the pytest-mock package.
+    This fixture creates a temporary directory for use within this test.
+
+    See https://docs.pytest.org/en/6.2.x/tmpdir.html for more info.
+    """
+    (tmp_path/"input").mkdir()
+    for name in ("file01", "file02", "file03", "file04"):
+        (tmp_path/"input"/name).write_text(f"{name}\n")
+    incremental = str(tmp_path/"cache"/".incremental")
+
+    def job_spec(job_id):
+        return utils.job_spec(job_id, tmp_path,
+                              input_directory=str(tmp_path/"input"),
+                              output_directory=str(tmp_path/"output"),
+                              incremental=True)
+
+    def plan(job_id):
+        tmpdir = tmp_path/f"mapreduce-shared-job{job_id:05d}-abcdefgh"
+        tmpdir.mkdir()
+        manifest = Manifest(incremental, job_spec(job_id))
+        for task_id, _ in enumerate(manifest.plan(tmpdir)):
+            (tmpdir/f"maptask{task_id:05d}-part00000").touch()
+        return manifest, tmpdir
+
+    # The first run retained two runs of two files each
+    manifest, tmpdir = plan(0)
+    manifest.commit(tmpdir)
+
+    # A Manager died after the second run mapped the one new file
+    (tmp_path/"input"/"file05").write_text("file05\n")
+    _, tmpdir = plan(1)
+    log = JobLog(tmp_path/"state")
+    log.append("register", worker_id=["localhost", 3001], slots=1,
+               memory=None)
+    log.append("submit", job_id=1, spec=job_spec(1))
+    log.append("start", job_id=1, tmpdir=str(tmpdir))
+    log.append("finish", job_id=1, stage="mapping", task_id=0)
+
+    tasks = restart_manager(mocker, tmp_path, {
+        "state_dir": str(tmp_path/"state"),
+        "cache_dir": str(tmp_path/"cache"),
+    })
+
+    # The reducer reads the new file's output and the retained runs once
+    assert [message["input_paths"] for message, _ in tasks] == [[
+        os.path.join(tmpdir, name) for name in (
+            "maptask00000-part00000",
+            "retained00000-part00000",
+            "retained00001-part00000",
+        )
+    ]]
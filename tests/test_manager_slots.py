@@ -0,0 +1,121 @@
+"""See unit test function docstring."""
+
+import json
+import tempfile
+import threading
+import mapreduce
+import utils
+from utils import TESTDATA_DIR
+
+
+def worker_message_generator(mock_sendall, tmp_path):
+    """Fake Worker messages."""
+    # One Worker with two slots registers
+    yield json.dumps({
+        "message_type": "register",
+        "worker_host": "localhost",
+        "worker_port": 3001,
+        "slots": 2,
+    }).encode("utf-8")
+    yield None
+
+    # User submits new job
+    yield json.dumps({
+        "message_type": "new_manager_job",
+        "input_directory": TESTDATA_DIR/"input",
+        "output_directory": tmp_path,
+        "mapper_executable": TESTDATA_DIR/"exec/wc_map.sh",
+        "reducer_executable": TESTDATA_DIR/"exec/wc_reduce.sh",
+        "num_mappers": 2,
+        "num_reducers": 1
+    }, cls=utils.PathJSONEncoder).encode("utf-8")
+    yield None
+
+    # Both map tasks go to the same Worker before either one finishes
+    for _ in utils.wait_for_map_messages(mock_sendall, num=2):
+        yield None
+
+    # The Worker finishes its map tasks out of order
+    for task_id in (1, 0):
+        yield json.dumps({
+            "message_type": "finished",
+            "task_id": task_id,
+            "worker_host": "localhost",
+            "worker_port": 3001,
+            "job_id": 0,
+            "stage": "mapping",
+        }).encode("utf-8")
+        yield None
+
+    # Wait for Manager to send reduce message
+    for _ in utils.wait_for_reduce_messages(mock_sendall, num=1):
+        yield None
+
+    # Shutdown
+    yield json.dumps({
+        "message_type": "shutdown",
+    }).encode("utf-8")
+    yield None
+
+
+def test_worker_slots(mocker, tmp_path):
+    """Verify Manager fills every slot of a multi-slot Worker.
+
+    Note: 'mocker' is a fixture function provided by the pytest-mock package.
+    This fixture lets us override a library function with a temporary fake
+    function that returns a hardcoded value while testing.
+
+    See https://github.com/pytest-dev/pytest-mock/ for more info.
+
+    Note: 'tmp_path' is a fixture provided by the pytest-mock package.
+    This fixture creates a temporary directory for use within this test.
+
+    See https://docs.pytest.org/en/6.2.x/tmpdir.html for more info.
+    """
+    # Mock the socket library socket class
+    mock_socket = mocker.patch("socket.socket")
+
+    # sendall() records messages
+    mock_sendall = mock_socket.return_value.__enter__.return_value.sendall
+
+    # connect() records message destinations
+    mock_connect = mock_socket.return_value.__enter__.return_value.connect
+
+    # accept() returns a mock client socket
+    mock_clientsocket = mocker.MagicMock()
+    mock_accept = mock_socket.return_value.__enter__.return_value.accept
+    mock_accept.return_value = (mock_clientsocket, ("127.0.0.1", 10000))
+
+    # TCP recv() returns values generated by worker_message_generator()
+    mock_recv = mock_clientsocket.recv
+    mock_recv.side_effect = worker_message_generator(mock_sendall, tmp_path)
+
+    # UDP recv() returns heartbeat messages
+    mock_udp_recv = mock_socket.return_value.__enter__.return_value.recv
+    mock_udp_recv.side_effect = utils.worker_heartbeat_generator(3001)
+
+    # Set the location where the Manager's temporary directory
+    # will be created.
+    tempfile.tempdir = tmp_path
+
+    # Run student Manager code.  When student Manager calls recv(), it will
+    # return the faked responses configured above.
+    try:
+        mapreduce.manager.Manager("localhost", 6000)
+        assert threading.active_count() == 1, "Failed to shutdown threads"
+    except SystemExit as error:
+        assert error.code == 0
+
+    # Task messages to a multi-slot Worker name their job and stage
+    messages = utils.get_messages_with_destinations(mock_sendall, mock_connect)
+    tasks = [
+        (message["task_id"], message["job_id"], message["stage"],
+         destination["destination"])
+        for message, destination in messages
+        if utils.is_map_message(message) or utils.is_reduce_message(message)
+    ]
+    assert tasks == [
+        (0, 0, "mapping", ("localhost", 3001)),
+        (1, 0, "mapping", ("localhost", 3001)),
+        (0, 0, "reducing", ("localhost", 3001)),
+    ]
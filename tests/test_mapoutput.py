@@ -0,0 +1,106 @@
+"""Unit tests for the Worker's block-oriented map output."""
+
+import io
+from pathlib import Path
+import utils
+from utils import TESTDATA_DIR
+from mapreduce.worker import mapoutput
+from mapreduce.worker.mapoutput import PartitionWriter, SortBuffer, \
+    read_blocks
+from mapreduce.worker.partition import partition_md5
+
+
+def test_read_blocks():
+    """Verify lines are whole however blocks cut them."""
+    data = b"a\t1\nbb\t2\n\nccc\t3\nlast"
+    for block_size in (1, 2, 5, 64):
+        lines = [line for block in read_blocks(io.BytesIO(data), block_size)
+                 for line in block]
+        assert lines == [b"a\t1", b"bb\t2", b"", b"ccc\t3", b"last"]
+    assert not list(read_blocks(io.BytesIO(b"")))
+
+
+def test_partition_writer(monkeypatch):
+    """Verify lines go where the partitioner says, in order, in bulk."""
+    # Small enough that the line cache empties several times
+    monkeypatch.setattr(mapoutput, "LINE_CACHE_SIZE", 1024)
+    lines = [b"%d\tvalue" % (index % 37) for index in range(1000)]
+    files = [io.BytesIO() for _ in range(3)]
+    writer = PartitionWriter(files, partition_md5)
+    for start in range(0, len(lines), 100):
+        writer.write_lines(lines[start:start + 100])
+    writer.flush()
+
+    expected = [[] for _ in files]
+    for line, partition in zip(lines, partition_md5(
+        [line.partition(b"\t")[0] for line in lines], len(files)
+    )):
+        expected[partition].append(line + b"\n")
+    assert [outfile.getvalue() for outfile in files] == \
+        [b"".join(partition) for partition in expected]
+
+
+def sorted_partitions(tmp_path, budget):
+    """Return the outputs of a sort buffer of budget bytes, and its files."""
+    tmp_path.mkdir()
+    lines = [b"%d\tvalue%d" % (index * 7 % 101, index)
+             for index in range(500)]
+    paths = [tmp_path/f"part{index}" for index in range(3)]
+    writer = SortBuffer(paths, partition_md5, budget)
+    for start in range(0, len(lines), 50):
+        writer.write_lines(lines[start:start + 50])
+    writer.finish()
+    return [path.read_bytes() for path in paths], sorted(tmp_path.iterdir())
+
+
+def test_sort_buffer(tmp_path):
+    """Verify partitions come out sorted, in memory or through spills."""
+    in_memory, files = sorted_partitions(tmp_path/"memory", 1 << 20)
+    assert len(files) == 3
+    for output in in_memory:
+        lines = output.splitlines()
+        assert lines == sorted(lines)
+    assert sum(len(output.splitlines()) for output in in_memory) == 500
+
+    # Spilled runs merge into the same outputs and are removed
+    spilled, files = sorted_partitions(tmp_path/"spilled", 1000)
+    assert spilled == in_memory
+    assert len(files) == 3
+
+
+def test_wordcount_sort_buffer(mapreduce_client_sort_buffer, tmp_path):
+    """Run a word count job on Workers sorting map output in memory.
+
+    Note: 'mapreduce_client_sort_buffer' is a fixture function that starts
+    a fresh Manager and Workers.  It is implemented in conftest.py.
+
+    Note: 'tmp_path' is a fixture provided by the pytest-mock package.  This
+    fixture creates a temporary directory for use within this test.  See
+    https://docs.pytest.org/en/6.2.x/tmpdir.html for more info.
+
+    """
+    utils.send_message({
+        "message_type": "new_manager_job",
+        "input_directory": TESTDATA_DIR/"input",
+        "output_directory": tmp_path,
+        "mapper_executable": TESTDATA_DIR/"exec/wc_map.sh",
+        "reducer_executable": TESTDATA_DIR/"exec/wc_reduce.sh",
+        "num_mappers": 2,
+        "num_reducers": 2,
+    }, port=mapreduce_client_sort_buffer.manager_port)
+
+    # Wait for output to be created
+    utils.wait_for_exists(
+        f"{tmp_path}/part-00000",
+        f"{tmp_path}/part-00001",
+    )
+
+    # Verify final output file contents
+    actual = []
+    for outfile in sorted(tmp_path.iterdir()):
+        with outfile.open(encoding="utf-8") as infile:
+            actual.extend(infile.readlines())
+    word_count_correct = Path(TESTDATA_DIR/"correct/word_count_correct.txt")
+    with word_count_correct.open(encoding="utf-8") as infile:
+        correct = sorted(infile.readlines())
+    assert sorted(actual) == correct
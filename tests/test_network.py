@@ -0,0 +1,145 @@
+"""Unit and integration tests for persistent channels."""
+
+import json
+import socket
+import threading
+from pathlib import Path
+import utils
+from utils import TESTDATA_DIR
+from mapreduce.utils import Channel, accept_message, encode, decode
+from mapreduce.utils.network import CHANNEL_MAGIC
+
+
+def test_codec():
+    """Verify binary messages decode to what was sent."""
+    reduce_task = {
+        "message_type": "new_reduce_task",
+        "task_id": 1,
+        "executable": "wc_reduce.sh",
+        "input_paths": [f"/tmp/shared/maptask{task_id:05d}-part00001"
+                        for task_id in range(100)],
+        "output_directory": "/tmp/output",
+        "job_id": 2,
+        "stage": "reducing",
+    }
+    map_task = {
+        "message_type": "new_map_task",
+        "task_id": 0,
+        "input_paths": ["/input/file01", "/other/file02", "file03"],
+        "executable": "wc_map.sh",
+        "output_directory": "/tmp/shared",
+        "num_partitions": 2,
+        "input_splits": [["/input/file01", 0, 100]],
+    }
+    finished = {
+        "message_type": "finished",
+        "task_id": 0,
+        "worker_host": "localhost",
+        "worker_port": 6001,
+        "combined": {"records_in": 10, "bytes_in": 60,
+                     "records_out": 2, "bytes_out": 12},
+    }
+    for message in (reduce_task, map_task, {"message_type": "shutdown"},
+                    {**reduce_task, "input_paths": []},
+                    {**map_task, "combiner_executable": "wc_sum.sh"},
+                    finished):
+        payload = encode(message, "binary")
+        assert payload[0] == 1
+        assert decode(payload) == message
+    assert len(encode(reduce_task, "binary")) < \
+        len(encode(reduce_task)) / 1.5
+
+    # Messages without a binary form fall back to JSON
+    for message in ({"message_type": "heartbeat", "worker_port": 6001},
+                    {**map_task, "task_id": True},
+                    {**map_task, "unknown": 1},
+                    {"message_type": "register", "memory": None}):
+        assert encode(message, "binary") == encode(message)
+        assert decode(encode(message, "binary")) == message
+
+
+def test_channel_frames():
+    """Verify many messages share a connection, whatever the chunking."""
+    left, right = socket.socketpair()
+    sender = Channel(left)
+    receiver = Channel(right)
+    right.settimeout(0.1)
+    messages = [{"message_type": "finished", "task_id": task_id}
+                for task_id in range(100)]
+    for message in messages:
+        sender.send(message)
+        sender.encoding = "binary" if sender.encoding == "json" else "json"
+    assert [receiver.receive() for _ in messages] == messages
+    assert receiver.receive() is None
+
+    # A frame split across reads is put back together
+    payload = json.dumps(messages[0]).encode("utf-8")
+    left.sendall(len(payload).to_bytes(4, "big") + payload[:5])
+    assert receiver.receive() is None
+    left.sendall(payload[5:])
+    assert receiver.receive() == messages[0]
+
+    sender.close()
+    try:
+        receiver.receive()
+    except ConnectionError:
+        pass
+    else:
+        raise AssertionError("Closed channel did not raise")
+    receiver.close()
+
+
+def test_accept_message():
+    """Verify one-shot messages and channels are told apart."""
+    left, right = socket.socketpair()
+    left.sendall(b'{"message_type": "shutdown"}')
+    left.close()
+    assert accept_message(right) == ('{"message_type": "shutdown"}', None)
+
+    left, right = socket.socketpair()
+    left.sendall(CHANNEL_MAGIC)
+    Channel(left).send({"message_type": "register"})
+    message_str, channel = accept_message(right)
+    assert message_str is None
+    received = []
+    thread = threading.Thread(target=channel.serve, args=(
+        lambda message, _: received.append(message), {"shutdown": False}
+    ))
+    thread.start()
+    left.close()
+    thread.join()
+    assert received == [{"message_type": "register"}]
+
+
+def test_wordcount_persistent(mapreduce_client_persistent, tmp_path):
+    """Run a word count job with Workers on persistent channels.
+
+    Note: 'mapreduce_client_persistent' is a fixture function that starts a
+    fresh Manager and Workers.  It is implemented in conftest.py.
+
+    Note: 'tmp_path' is a fixture provided by the pytest-mock package.  This
+    fixture creates a temporary directory for use within this test.  See
+    https://docs.pytest.org/en/6.2.x/tmpdir.html for more info.
+
+    """
+    utils.send_message({
+        "message_type": "new_manager_job",
+        "input_directory": TESTDATA_DIR/"input",
+        "output_directory": tmp_path,
+        "mapper_executable": TESTDATA_DIR/"exec/wc_map.sh",
+        "reducer_executable": TESTDATA_DIR/"exec/wc_reduce.sh",
+        "num_mappers": 4,
+        "num_reducers": 1,
+    }, port=mapreduce_client_persistent.manager_port)
+
+    # Wait for output to be created
+    utils.wait_for_exists(f"{tmp_path}/part-00000")
+
+    # Verify final output file contents
+    outfile00 = Path(f"{tmp_path}/part-00000")
+    word_count_correct = Path(TESTDATA_DIR/"correct/word_count_correct.txt")
+    with outfile00.open(encoding="utf-8") as infile:
+        actual = sorted(infile.readlines())
+    with word_count_correct.open(encoding="utf-8") as infile:
+        correct = sorted(infile.readlines())
+    assert actual == correct
@@ -0,0 +1,101 @@
+"""Unit tests for the Worker partitioners, and a job with another one."""
+
+import hashlib
+from pathlib import Path
+import pytest
+import utils
+from utils import TESTDATA_DIR
+from mapreduce.worker import partition
+from mapreduce.worker.partition import PARTITIONERS, partition_modulo
+
+KEYS = [b"the", b"", b"Anna", b"7", b"-3", b"12345678901234567890", b"a b",
+        "é".encode("utf-8")]
+
+
+def test_md5_compatible():
+    """Verify the default matches the original per-key MD5 scheme."""
+    assert PARTITIONERS["md5"](KEYS, 7) == [
+        int(hashlib.md5(key).hexdigest(), base=16) % 7
+        for key in KEYS
+    ]
+
+
+def test_partitions_in_range():
+    """Verify every partitioner keeps keys within the partition count."""
+    for partitioner in PARTITIONERS.values():
+        partitions = partitioner(KEYS * 10, 3)
+        assert len(partitions) == len(KEYS) * 10
+        assert set(partitions) <= {0, 1, 2}
+        assert partitioner([], 3) == []
+
+
+def test_modulo(monkeypatch):
+    """Verify integer keys go by value, and alike with or without NumPy."""
+    assert partition_modulo([b"0", b"1", b"2", b"3", b"-1"], 3) == \
+        [0, 1, 2, 0, 2]
+    mixed = partition_modulo(KEYS, 5)
+    assert mixed[3:5] == [2, 2]
+    assert mixed[0] == PARTITIONERS["md5"]([b"the"], 5)[0]
+
+    # A key's partition must not depend on the rest of its batch
+    monkeypatch.setattr(partition, "numpy", None)
+    assert partition_modulo(KEYS, 5) == mixed
+    assert partition_modulo([b"10", b"11"], 5) == [0, 1]
+
+
+def test_modulo_consistent(monkeypatch):
+    """Verify a key's partition is the same in any batch, with NumPy too.
+
+    These keys look like integers to int() or to NumPy, not to the
+    partitioner, except the last three.
+    """
+    pytest.importorskip("numpy")
+    keys = [b"5\x00", b" 5", b"1_0", b"5 ", b"0x10", b"+5", b"-3", b"007"]
+    expected = partition_modulo(keys + [b"abc"], 7)[:-1]
+    for key, key_partition in zip(keys, expected):
+        for batch in ([key], [key, b"1"], [key, b"abc"],
+                      [key, b"99999999999999999999"]):
+            assert partition_modulo(batch, 7)[0] == key_partition
+    assert expected[5:] == [5, 4, 0]
+    monkeypatch.setattr(partition, "numpy", None)
+    assert partition_modulo(keys, 7) == expected
+
+
+def test_wordcount_crc32(mapreduce_client, tmp_path):
+    """Run a word count job partitioned by CRC-32.
+
+    Note: 'mapreduce_client' is a fixture function that starts a fresh Manager
+    and Workers.  It is implemented in conftest.py and reused by many tests.
+    Docs: https://docs.pytest.org/en/latest/fixture.html
+
+    Note: 'tmp_path' is a fixture provided by the pytest-mock package.  This
+    fixture creates a temporary directory for use within this test.  See
+    https://docs.pytest.org/en/6.2.x/tmpdir.html for more info.
+
+    """
+    utils.send_message({
+        "message_type": "new_manager_job",
+        "input_directory": TESTDATA_DIR/"input",
+        "output_directory": tmp_path,
+        "mapper_executable": TESTDATA_DIR/"exec/wc_map.sh",
+        "reducer_executable": TESTDATA_DIR/"exec/wc_reduce.sh",
+        "num_mappers": 2,
+        "num_reducers": 2,
+        "partitioner": "crc32",
+    }, port=mapreduce_client.manager_port)
+
+    # Wait for output to be created
+    utils.wait_for_exists(
+        f"{tmp_path}/part-00000",
+        f"{tmp_path}/part-00001",
+    )
+
+    # Verify final output file contents: each word counted once, in full
+    actual = []
+    for outfile in sorted(tmp_path.iterdir()):
+        with outfile.open(encoding="utf-8") as infile:
+            actual.extend(infile.readlines())
+    word_count_correct = Path(TESTDATA_DIR/"correct/word_count_correct.txt")
+    with word_count_correct.open(encoding="utf-8") as infile:
+        correct = sorted(infile.readlines())
+    assert sorted(actual) == correct
@@ -0,0 +1,100 @@
+"""Unit tests for the Manager input planners."""
+
+import shutil
+import subprocess
+from mapreduce.manager.planner import (
+    combine_splits, input_files, input_splits, line_aligned_splits,
+    plan_balanced, plan_round_robin
+)
+from mapreduce.utils import input_stream
+from utils import TESTDATA_DIR
+
+
+def file_names(plan):
+    """Return the input file names of each map task in a plan."""
+    return [
+        [path.rsplit("/", 1)[1] for group in task for path, _, _ in group]
+        for task in plan
+    ]
+
+
+def test_round_robin():
+    """Verify round-robin assignment by sorted filename."""
+    groups = combine_splits(input_splits(TESTDATA_DIR/"input"))
+    assert file_names(plan_round_robin(groups, 2)) == [
+        ["file01", "file03", "file05", "file07"],
+        ["file02", "file04", "file06", "file08"],
+    ]
+
+
+def test_balanced(tmp_path):
+    """Verify bytes are balanced and the heaviest task comes first."""
+    for name, size in [("a", 4096), ("b", 1), ("c", 2048), ("d", 2048),
+                       ("e", 3), ("f", 1)]:
+        (tmp_path/name).write_bytes(b"x" * size)
+    (tmp_path/"subdir").mkdir()
+
+    assert input_files(tmp_path) == ["a", "b", "c", "d", "e", "f"]
+    groups = combine_splits(input_splits(tmp_path))
+    assert file_names(plan_balanced(groups, 2)) == [
+        ["a", "e"],             # 4099 bytes
+        ["b", "c", "d", "f"],   # 4098 bytes
+    ]
+
+
+def test_balanced_more_tasks_than_files(tmp_path):
+    """Verify every map task exists even when some get no files."""
+    assert plan_balanced([[("a", 0, 1)]], 3) == [[[("a", 0, 1)]], [], []]
+
+
+def test_combine_splits():
+    """Verify small splits are packed in order up to the target size."""
+    splits = [("a", 0, 3), ("b", 0, 4), ("c", 0, 10), ("d", 0, 1),
+              ("e", 0, 2), ("f", 0, 8)]
+    assert combine_splits(splits, 8) == [
+        [("a", 0, 3), ("b", 0, 4)],
+        [("c", 0, 10)],
+        [("d", 0, 1), ("e", 0, 2)],
+        [("f", 0, 8)],
+    ]
+    assert combine_splits(splits) == [[split] for split in splits]
+
+
+def test_line_aligned_splits(tmp_path):
+    """Verify splits cover the file exactly and end on newlines."""
+    path = tmp_path/"input"
+    path.write_bytes(b"aaaa\nbb\ncccccccc\nd\n\neeeee")
+    ranges = line_aligned_splits(path, 4)
+    assert ranges == [(0, 5), (5, 12), (17, 8)]
+
+    data = path.read_bytes()
+    for offset, length in ranges[:-1]:
+        assert data[offset + length - 1:offset + length] == b"\n"
+
+
+def test_input_range(tmp_path):
+    """Verify a mapper reads exactly the bytes of its split."""
+    path = tmp_path/"input"
+    shutil.copyfile(TESTDATA_DIR/"input_large/file01", path)
+    data = path.read_bytes()
+
+    output = b""
+    for offset, length in line_aligned_splits(path, 100_000):
+        with input_stream([(path, offset, length)]) as infile:
+            output += subprocess.run(
+                ["cat"], stdin=infile, stdout=subprocess.PIPE, check=True,
+            ).stdout
+    assert output == data
+
+
+def test_input_stream_group(tmp_path):
+    """Verify a group of files streams through one mapper, line by line."""
+    (tmp_path/"a").write_bytes(b"hello\nworld")
+    (tmp_path/"b").write_bytes(b"")
+    (tmp_path/"c").write_bytes(b"bye\n")
+    group = [(tmp_path/name, 0, None) for name in ["a", "b", "c"]]
+    with input_stream(group) as infile:
+        output = subprocess.run(
+            ["cat"], stdin=infile, stdout=subprocess.PIPE, check=True,
+        ).stdout
+    assert output == b"hello\nworld\nbye\n"
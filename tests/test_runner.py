@@ -0,0 +1,209 @@
+"""Unit tests for the Worker task runner, and a Worker shut down mid-task."""
+
+import json
+import time
+import threading
+import subprocess
+import pytest
+import mapreduce
+import utils
+from utils import TESTDATA_DIR
+from mapreduce.manager.__main__ import drop_attempts
+from mapreduce.worker.__main__ import sort_processes
+from mapreduce.worker.runner import TaskRunner
+
+
+def test_cancel_running_and_queued():
+    """Verify cancelling kills a running task's process and drops queued."""
+    ran = []
+
+    def task(name):
+        with runner.popen(["sleep", "600"]) as process:
+            pass
+        runner.check()
+        ran.append((name, process.returncode))
+
+    with TaskRunner(1) as runner:
+        runner.submit("slow", task, "slow")
+        runner.submit("queued", task, "queued")
+        while not runner.tasks["slow"]["processes"]:
+            time.sleep(0.01)
+        start = time.time()
+        assert runner.cancel("slow")
+        assert runner.cancel("queued")
+        assert not runner.cancel("unknown")
+    assert time.time() - start < 5
+    assert not ran
+    assert not runner.tasks
+
+
+def test_shutdown_during_task():
+    """Verify shutdown stops a long task in well under its runtime."""
+    finished = []
+
+    def task():
+        with runner.popen(["sleep", "600"]):
+            pass
+        runner.check()
+        finished.append(True)
+
+    runner = TaskRunner(2)
+    with runner:
+        runner.submit(0, task)
+        time.sleep(0.5)
+        start = time.time()
+    assert time.time() - start < 5
+    assert not finished
+    # A stopped runner takes no new tasks
+    runner.submit(1, task)
+    assert not runner.tasks
+
+
+def test_failed_task(caplog):
+    """Verify a task that fails uncancelled is logged and reported."""
+    failed = []
+
+    def task():
+        with open("/nonexistent/input", encoding="utf-8"):
+            pass
+
+    with TaskRunner(1, failed.append) as runner:
+        runner.submit("missing", task)
+        runner.submit("fine", lambda: None)
+        # Leaving the runner would cancel the tasks
+        while runner.tasks:
+            time.sleep(0.01)
+    assert failed == ["missing"]
+    assert "Task missing failed" in caplog.text
+    assert "FileNotFoundError" in caplog.text
+    assert not runner.tasks
+
+
+def test_cancel_reused_key():
+    """Verify a cancelled task stops even once a new task has its key."""
+    log = []
+    release = threading.Event()
+
+    def old():
+        release.wait()
+        runner.check()
+        log.append("old task reported finished")
+
+    with TaskRunner(1) as runner:
+        runner.submit((None, None, 3), old)
+        assert runner.cancel((None, None, 3))
+        runner.submit((None, None, 3), lambda: log.append("new task ran"))
+        release.set()
+        while runner.tasks:
+            time.sleep(0.01)
+    assert log == ["new task ran"]
+
+
+def test_run_processes():
+    """Verify processes run limit at a time and failures are raised."""
+    elapsed = {}
+    with TaskRunner(1) as runner:
+        for limit in (1, 4):
+            start = time.time()
+            runner.run_processes([["sleep", "0.2"]] * 4, limit)
+            elapsed[limit] = time.time() - start
+        with pytest.raises(subprocess.CalledProcessError):
+            runner.run_processes([["true"], ["false"], ["true"]], 2)
+    assert elapsed[1] >= 0.8
+    assert elapsed[4] < 0.6
+
+
+def test_sort_processes(mocker):
+    """Verify sorts are bounded by cores and memory, shared by slots."""
+    mocker.patch("os.cpu_count", return_value=8)
+    assert sort_processes({"memory": None, "slots": 1}) == 8
+    assert sort_processes({"memory": None, "slots": 3}) == 2
+    assert sort_processes({"memory": 1024, "slots": 1}) == 4
+    assert sort_processes({"memory": 100, "slots": 2}) == 1
+
+
+def test_drop_attempts():
+    """Verify the Manager cancels only the other live attempts of a task."""
+    key = (0, "mapping", 3)
+    workers = {
+        ("localhost", 1): {"status": "busy", "slots": 1, "tasks": {key: 2}},
+        ("localhost", 2): {"status": "busy", "slots": 2,
+                           "tasks": {key: 3, (0, "mapping", 4): 1}},
+        ("localhost", 3): {"status": "dead", "slots": 1, "tasks": {key: 4}},
+        ("localhost", 4): {"status": "busy", "slots": 1,
+                           "tasks": {(0, "mapping", 5): 1}},
+    }
+    ready = []
+    assert drop_attempts(workers, key, ready) == [
+        (("localhost", 1), {"message_type": "cancel_task", "task_id": 3}),
+        (("localhost", 2), {"message_type": "cancel_task", "task_id": 3,
+                            "job_id": 0, "stage": "mapping"}),
+    ]
+    assert ready == [("localhost", 1), ("localhost", 2)]
+    assert workers[("localhost", 2)]["tasks"] == {(0, "mapping", 4): 1}
+    assert workers[("localhost", 2)]["status"] == "ready"
+
+
+def manager_message_generator(mock_sendall, tmp_path):
+    """Fake Manager messages: a map task that never ends, then shutdown."""
+    for _ in utils.wait_for_register_messages(mock_sendall):
+        yield None
+
+    yield json.dumps({
+        "message_type": "register_ack",
+    }).encode("utf-8")
+    yield None
+
+    executable = tmp_path/"slow_map.sh"
+    executable.write_text("#!/bin/sh\nsleep 600\n", encoding="utf-8")
+    executable.chmod(0o755)
+    yield json.dumps({
+        "message_type": "new_map_task",
+        "task_id": 0,
+        "executable": executable,
+        "input_paths": [TESTDATA_DIR/"input/file01"],
+        "output_directory": tmp_path,
+        "num_partitions": 1,
+    }, cls=utils.PathJSONEncoder).encode("utf-8")
+    yield None
+
+    # Give the map task time to start its process
+    time.sleep(0.5)
+    yield json.dumps({
+        "message_type": "shutdown",
+    }).encode("utf-8")
+    yield None
+
+
+def test_worker_shutdown_mid_task(mocker, tmp_path):
+    """Verify a Worker shuts down while a long map task runs."""
+    mock_socket = mocker.patch("socket.socket")
+    mock_sendall = mock_socket.return_value.__enter__.return_value.sendall
+    mock_clientsocket = mocker.MagicMock()
+    mock_accept = mock_socket.return_value.__enter__.return_value.accept
+    mock_accept.return_value = (mock_clientsocket, ("127.0.0.1", 10000))
+    mock_clientsocket.recv.side_effect = \
+        manager_message_generator(mock_sendall, tmp_path)
+
+    start = time.time()
+    try:
+        mapreduce.worker.Worker(
+            host="localhost",
+            port=6001,
+            manager_host="localhost",
+            manager_port=6000,
+        )
+        assert threading.active_count() == 1, "Failed to shutdown threads"
+    except SystemExit as error:
+        assert error.code == 0
+    assert time.time() - start < 10
+
+    # The cancelled task reports nothing
+    messages = utils.filter_not_heartbeat_messages(
+        utils.get_messages(mock_sendall)
+    )
+    assert messages == [{
+        "message_type": "register",
+        "worker_host": "localhost",
+        "worker_port": 6001,
+    }]
@@ -0,0 +1,38 @@
+"""Unit tests for the Manager scheduling policies."""
+
+from mapreduce.manager.scheduler import SCHEDULERS, queue_shares
+
+
+SPECS = [
+    {"job_id": 0, "queue": "batch", "priority": 0, "deadline": None},
+    {"job_id": 1, "queue": "batch", "priority": 1, "deadline": 300.0},
+    {"job_id": 2, "queue": "adhoc", "priority": 5, "deadline": 100.0},
+    {"job_id": 3, "queue": "adhoc", "priority": 1, "deadline": None},
+]
+
+
+def order(name, shares=None):
+    """Return the job ids of SPECS in the order a policy serves them."""
+    return [
+        spec["job_id"] for spec in sorted(
+            SPECS, key=lambda spec: SCHEDULERS[name](spec, shares or {})
+        )
+    ]
+
+
+def test_policies():
+    """Verify each policy orders jobs as documented."""
+    assert order("fifo") == [0, 1, 2, 3]
+    assert order("priority") == [2, 1, 3, 0]
+    assert order("deadline") == [2, 1, 0, 3]
+
+
+def test_fair_share():
+    """Verify the queue using the least of its weight goes first."""
+    shares = queue_shares({"batch": 8, "adhoc": 2}, {})
+    assert order("fair", shares) == [2, 3, 0, 1]
+
+    # Weight 8 lets the batch queue run four times the adhoc tasks
+    shares = queue_shares({"batch": 8, "adhoc": 2}, {"batch": 8})
+    assert shares == {"batch": 1, "adhoc": 2}
+    assert order("fair", shares) == [0, 1, 2, 3]
@@ -0,0 +1,117 @@
+"""Unit and integration tests for streaming jobs."""
+
+import os
+import shutil
+import threading
+from pathlib import Path
+import pytest
+import utils
+from utils import TESTDATA_DIR
+from mapreduce.manager.stream import Stream, publish_snapshot
+from mapreduce.manager.watcher import DirectoryWatcher
+
+
+@pytest.mark.parametrize("use_inotify", [True, False])
+def test_watcher(tmp_path, use_inotify):
+    """Verify written, renamed and removed files are reported."""
+    (tmp_path/"old").write_text("old\n")
+    with DirectoryWatcher(str(tmp_path), use_inotify) as watcher:
+        assert watcher.poll(0.1) == set()
+        (tmp_path/"new").write_text("new\n")
+        (tmp_path/"tmp").write_text("renamed\n")
+        os.rename(tmp_path/"tmp", tmp_path/"renamed")
+        (tmp_path/"old").unlink()
+        changed = watcher.poll(0.1)
+        # A file written then renamed away may be reported by inotify
+        changed.discard("tmp")
+        assert changed == {"new", "renamed", "old"}
+        assert watcher.poll(0.1) == set()
+
+
+def test_stream_batches(mocker, tmp_path):
+    """Verify batches wait for the previous snapshot to be published."""
+    (tmp_path/"input").mkdir()
+    (tmp_path/"input"/"file01").write_text("hello\n")
+    signals = {"shutdown": False}
+    submit = mocker.MagicMock()
+    stream = Stream({
+        "message_type": "new_streaming_job",
+        "input_directory": str(tmp_path/"input"),
+        "output_directory": str(tmp_path/"output"),
+        "interval": 0,
+        "keep_snapshots": 1,
+    }, submit, signals)
+    thread = threading.Thread(target=stream.run)
+    thread.start()
+    try:
+        for _ in utils.wait_for_call_count(submit, 1):
+            pass
+        submitted = [call.args[0] for call in submit.call_args_list]
+        assert submitted[0]["message_type"] == "new_manager_job"
+        assert submitted[0]["output_directory"] == \
+            str(tmp_path/"output"/"snapshot00000")
+        assert submitted[0]["stream"] == {
+            "directory": str(tmp_path/"output"), "keep": 1,
+        }
+
+        # The next batch waits for the first one to be published
+        (tmp_path/"input"/"file02").write_text("world\n")
+        os.makedirs(submitted[0]["output_directory"])
+        assert not stream.is_due({"file02"}, 0)
+        publish_snapshot(submitted[0]["output_directory"], 1)
+        for _ in utils.wait_for_call_count(submit, 2):
+            pass
+        submitted = [call.args[0] for call in submit.call_args_list]
+        assert submitted[1]["output_directory"] == \
+            str(tmp_path/"output"/"snapshot00001")
+
+        os.makedirs(submitted[1]["output_directory"])
+        publish_snapshot(submitted[1]["output_directory"], 1)
+        assert sorted(os.listdir(tmp_path/"output")) == \
+            ["latest", "snapshot00001"]
+    finally:
+        signals["shutdown"] = True
+        thread.join()
+
+
+def test_wordcount_stream(mapreduce_client, tmp_path):
+    """Run a streaming word count job over files arriving in two batches.
+
+    Note: 'mapreduce_client' is a fixture function that starts a fresh Manager
+    and Workers.  It is implemented in conftest.py and reused by many tests.
+    Docs: https://docs.pytest.org/en/latest/fixture.html
+
+    Note: 'tmp_path' is a fixture provided by the pytest-mock package.  This
+    fixture creates a temporary directory for use within this test.  See
+    https://docs.pytest.org/en/6.2.x/tmpdir.html for more info.
+
+    """
+    input_directory = tmp_path/"input"
+    input_directory.mkdir()
+    names = sorted(os.listdir(TESTDATA_DIR/"input"))
+    for name in names[:-1]:
+        shutil.copy(TESTDATA_DIR/"input"/name, input_directory)
+    utils.send_message({
+        "message_type": "new_streaming_job",
+        "input_directory": input_directory,
+        "output_directory": tmp_path/"output",
+        "mapper_executable": TESTDATA_DIR/"exec/wc_map.sh",
+        "reducer_executable": TESTDATA_DIR/"exec/wc_reduce.sh",
+        "num_mappers": 2,
+        "num_reducers": 1,
+        "interval": 0,
+    }, port=mapreduce_client.manager_port)
+    utils.wait_for_exists(f"{tmp_path}/output/latest/part-00000")
+
+    # The last file arrives and makes a second snapshot
+    shutil.copy(TESTDATA_DIR/"input"/names[-1], input_directory)
+    utils.wait_for_exists(f"{tmp_path}/output/snapshot00001/part-00000")
+
+    # Verify final output file contents
+    outfile00 = Path(f"{tmp_path}/output/snapshot00001/part-00000")
+    word_count_correct = Path(TESTDATA_DIR/"correct/word_count_correct.txt")
+    with outfile00.open(encoding="utf-8") as infile:
+        actual = sorted(infile.readlines())
+    with word_count_correct.open(encoding="utf-8") as infile:
+        correct = sorted(infile.readlines())
+    assert actual == correct
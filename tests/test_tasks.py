@@ -0,0 +1,62 @@
+"""Unit tests for the Manager task table."""
+
+from mapreduce.manager.tasks import TaskTable
+
+
+def test_straggler_backup(mocker):
+    """Verify a slow task gets one backup and the first attempt wins."""
+    clock = mocker.patch("time.time")
+    clock.return_value = 0
+    table = TaskTable()
+    for task_id in range(3):
+        table.add(task_id, None)
+    assert [table.start() for _ in range(3)] == [(0, 1), (1, 1), (2, 1)]
+
+    # No runtime to compare with yet
+    clock.return_value = 100
+    assert table.straggler(2) is None
+
+    # Tasks 1 and 2 take 10s, task 0 keeps running
+    clock.return_value = 10
+    assert table.finish(1, 1)
+    assert table.finish(2, 1)
+    assert table.straggler(2) is None
+    clock.return_value = 21
+    assert table.straggler(2) == 0
+    assert table.straggler(0) is None
+
+    # A task is backed up once, and only the first attempt to finish counts
+    assert table.start(0) == (0, 2)
+    assert table.straggler(2) is None
+    assert table.finish(0, 2)
+    assert not table.finish(0, 1)
+    assert table.is_complete()
+
+
+def test_failed_attempt():
+    """Verify a task is requeued only once all its attempts failed."""
+    table = TaskTable()
+    table.add(0, None)
+    table.start()
+    table.start(0)
+    table.requeue(0, 1)
+    assert not table.has_pending()
+    table.requeue(0, 2)
+    assert table.has_pending()
+    assert table.start() == (0, 3)
+
+
+def test_give_up():
+    """Verify a task that keeps failing runs limit attempts, then stops."""
+    table = TaskTable()
+    table.add(0, None)
+    for attempt in (1, 2):
+        assert table.start() == (0, attempt)
+        assert table.fail(0, attempt, 3)
+    assert table.start() == (0, 3)
+    # A backup still running keeps the task alive
+    assert table.start(0) == (0, 4)
+    assert table.fail(0, 3, 3)
+    assert not table.fail(0, 4, 3)
+    assert not table.has_pending()
+    assert table.straggler(1) is None
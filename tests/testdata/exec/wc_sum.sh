@@ -0,0 +1,21 @@
+#!/bin/bash
+#
+# Word count combiner and reducer.
+#
+# Input: <word><tab><count>, sorted
+# Output: <word><tab><total>
+#
+# Unlike wc_reduce.sh, counts may be more than 1, so this also works as
+# a combiner whose output is reduced again.
+
+# Stop on errors
+set -Eeuo pipefail
+
+# Sum the counts of each run of lines sharing a word.  Words compare as
+# strings, else "0" and "00" would be one word.
+awk -F '\t' '
+  { key = $1 "" }
+  NR > 1 && key != word { print word "\t" total; total = 0 }
+  { word = key; total += $2 }
+  END { if (NR > 0) print word "\t" total }
+'
@@ -8,6 +8,7 @@ import json
 import time
 import socket
 import glob
+from mapreduce.manager.job import JOB_DEFAULTS
 from utils.memory import MemoryProfiler
 
 
@@ -57,6 +58,25 @@ class PathJSONEncoder(json.JSONEncoder):
         return super().default(o)
 
 
+def job_spec(job_id, tmp_path, **fields):
+    """Return the spec of a word count job, with fields overridden.
+
+    Its output goes to tmp_path/outputN, and every optional field not
+    in fields has the default the Manager gives it.
+    """
+    return {
+        **JOB_DEFAULTS,
+        "job_id": job_id,
+        "input_directory": str(TESTDATA_DIR/"input"),
+        "output_directory": str(tmp_path/f"output{job_id}"),
+        "mapper_executable": str(TESTDATA_DIR/"exec/wc_map.sh"),
+        "reducer_executable": str(TESTDATA_DIR/"exec/wc_reduce.sh"),
+        "num_mappers": 2,
+        "num_reducers": 1,
+        **fields,
+    }
+
+
 def worker_heartbeat_generator(*ports):
     """Fake Worker heartbeat messages."""
     while True: